@@ -1,341 +1,885 @@
-from rich import print
-from rich.table import Table
-from rich.console import Console
-import os
-import glob
-import pandas as pd
-from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Alignment, Border, Side
-import warnings
-import re
-
-console = Console()
-
-def sort_key_func(row):
-    """
-    Función que devuelve una clave de orden para las filas.
-    """
-    file_name = row[-1]
-    order = ["Primer", "Segundo", "Tercer", "Cuarto"]
-    match = re.match(r"(\w+ Trimestre)(_?(\d)?)", file_name)
-    if match:
-        name, _, number = match.groups()
-        return (order.index(name.split(' ')[0]), int(number) if number else 0)
-    return (0, 0)
-
-def sorted_files(files):
-    """
-    Función que ordena los archivos según su orden de trimestre y número.
-    """
-    return sorted(files, key=sort_key_func)
-
-def log_message(message, add_space=False):
-    """
-    Función que registra los mensajes tanto en la consola como en un archivo log.
-    """
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_entry = f"[{timestamp}] {message}"
-    with open("log.txt", "a") as log_file:
-        if add_space:
-            log_file.write("\n")
-        log_file.write(log_entry + "\n")
-
-def create_info_table():
-    """
-    Función que genera y muestra una tabla con información general del programa.
-    """
-    log_message("Creando tabla de información del programa.")
-    table = Table(show_header=True, header_style="bold magenta")
-    table.add_column("Versión del script", style="dim", width=20)
-    table.add_column("Descripción", style="dim", width=50)
-    table.add_column("Nombre del programa", style="dim", width=30)
-    table.add_column("Datos propietarios", style="dim", width=30)
-    table.add_row("1.1", "Analizador para Organización del Trabajo y Eficiencia en Judicatura", "AnalizadorEstadisticoJudicial", "Consejo Seccional de la Judicatura de Sucre")
-    console.print(table)
-
-def create_or_update_readme():
-    """
-    Función que crea o actualiza el archivo README.md con información sobre el programa y su desarrollador.
-    """
-    log_message("Creando o actualizando el archivo README.md.")
-    contenido_readme = """
-# AnalizadorEstadisticoJudicial
-
-## Propósito
-
-Este programa está diseñado para analizar archivos Excel relacionados con la organización del trabajo y la eficiencia en la Judicatura. Automáticamente procesa los datos y genera un consolidado, facilitando la tarea de análisis y presentación de informes.
-
-## ¿Qué hace?
-
-El programa busca archivos Excel con nombres específicos (por ejemplo, 'Primer Trimestre.xls', 'Segundo Trimestre.xls', etc.), incluidos aquellos que tienen un sufijo numérico, como 'Tercer Trimestre_1.xls', en caso de que haya múltiples archivos para un trimestre específico. Procesa cada hoja de estos archivos y finalmente genera un archivo consolidado con los resultados.
-
-## ¿Cómo lo hace?
-
-1. Lee cada archivo Excel.
-2. Procesa cada hoja dentro de los archivos.
-3. Genera un archivo de resultados por cada archivo Excel.
-4. Crea un archivo consolidado con todos los resultados.
-
-## Instrucciones de Uso
-
-1. Asegúrese de que todos los archivos Excel que desea analizar se encuentren en la misma carpeta que este programa.
-2. Ejecute el programa.
-3. Revise la carpeta 'Consolidado' que se creará automáticamente; allí encontrará los resultados.
-
-Nota: Si ejecuta el programa en la raíz donde están los documentos, se creará automáticamente una carpeta 'Consolidado' con los archivos de resultados.
-
-## Desarrollador
-
-Desarrollado por Alexander Oviedo Fadul, Profesional Universitario Grado 11 del Consejo Seccional de la Judicatura de Sucre.
-
-## Funcionalidades Potenciales
-
-- Integración Directa con SIERJU: Si se obtiene acceso a la API o a alguna interfaz de programación de SIERJU, podríamos adaptar el programa para enviar directamente las estadísticas.
-- Análisis Avanzado: Incorporar herramientas de análisis estadístico más avanzadas para obtener insights más detallados de los datos.
-- Visualización de Datos: Incorporar gráficos y tableros de mando para una visualización más intuitiva de las estadísticas.
-
-## Adaptabilidad
-
-Es importante que cualquier desarrollo software, especialmente en contextos institucionales, sea fácilmente adaptable a cambios futuros. Esto no solo incluye cambios en la estructura de los datos, sino también en las necesidades del usuario y en el contexto legal y regulatorio.
-    """
-    with open("README.md", "w") as readme:
-        readme.write(contenido_readme)
-
-def create_folder_structure():
-    log_message("Creando estructura de carpetas para guardar resultados.")
-    if not os.path.exists('Consolidado'):
-        os.makedirs('Consolidado')
-    subfolder = 'Consolidado/' + datetime.now().strftime('%Y-%m-%d_%H-%M-%S') + '/'
-    os.makedirs(subfolder)
-    return subfolder
-
-def process_excel_files(excel_files, subfolder):
-    log_message("Procesando archivos Excel.")
-    all_sheets_data = {}
-
-    # Ordena los archivos por nombre para asegurar que se procesan en el orden correcto
-    excel_files.sort()
-
-    for file in excel_files:
-        if file not in glob.glob('*Trimestre*.xls*'):
-            continue
-        log_message(f"Procesando archivo: {file}")
-        try:
-            xls = pd.ExcelFile(file)
-        except Exception as e:
-            log_message(f"Error al leer el archivo {file}: {str(e)}")
-            console.print(f"[red]Error al leer el archivo {file}: {str(e)}[/red]")
-            continue
-
-        result_file = subfolder + file.replace('.xls', '') + '_results.xlsx'
-        writer = Workbook()
-        writer.remove(writer.active)
-
-        file_table = Table(show_header=True, header_style="bold magenta")
-        file_table.add_column("Archivo", style="dim", width=30)
-        file_table.add_column("Hoja", style="dim", width=30)
-        file_table.add_column("Resultado", style="dim", width=40)
-
-        process_sheets(xls, file, all_sheets_data, writer, file_table)
-
-        try:
-            writer.save(result_file)
-            log_message(f"Archivo de resultados guardado: {result_file}")
-            file_table.add_row(file, "-", f"Archivo de resultados guardado: {result_file}")
-        except Exception as e:
-            log_message(f"Error al guardar el archivo de resultados: {str(e)}")
-            file_table.add_row(file, "-", f"Error al guardar el archivo de resultados: {str(e)}")
-
-        console.print(file_table)
-
-    return all_sheets_data
-
-def process_sheets(xls, file, all_sheets_data, writer, file_table):
-    log_message(f"Procesando hojas del archivo: {file}")
-    for i, sheet in enumerate(xls.sheet_names):
-        log_message(f"Procesando hoja: {sheet}")
-        try:
-            data = pd.read_excel(file, sheet_name=sheet, header=None)
-        except Exception as e:
-            log_message(f"Error al leer la hoja {sheet} del archivo {file}: {str(e)}")
-            file_table.add_row(file, sheet, f"Error al leer la hoja: {str(e)}")
-            continue
-
-        if len(data) >= 20 and 'Total' in data[0].values:
-            process_rows(data, file, all_sheets_data, writer, sheet, file_table)
-        else:
-            log_message(f"La hoja {sheet} del archivo {file} no cumple con las condiciones necesarias")
-            file_table.add_row(file, sheet, "La hoja no cumple con las condiciones necesarias")
-
-def process_rows(data, file, all_sheets_data, writer, sheet, file_table):
-    log_message(f"Procesando datos de la hoja {sheet} del archivo {file}")
-    header_rows = data.iloc[:19].values.tolist()
-    row_20_titles = [''] + data.iloc[19, 1:].tolist()
-    total_row_index = data[data[0] == 'Total'].index[0]
-    total_row_values = ['Total'] + data.iloc[total_row_index, 1:].tolist()
-
-    try:
-        # last_column_index = next(i for i, s in enumerate(row_20_titles) if
-        #                          "INVENTARIO" in s and ("FINALIZAR" in s or "FINAL" in s)) + 1
-        last_column_index = len(row_20_titles)
-    except StopIteration:
-        last_column_index = len(row_20_titles)
-
-    header_rows = [row[:last_column_index] for row in header_rows]
-    row_20_titles = row_20_titles[:last_column_index]
-    total_row_values = total_row_values[:last_column_index]
-
-    results_df = pd.DataFrame(header_rows + [row_20_titles, total_row_values])
-
-    ws = writer.create_sheet(title=sheet)
-    for row in dataframe_to_rows(results_df, index=False, header=False):
-        ws.append(row)
-
-    # Ajustar el texto para los títulos de la fila 19
-    for cell in ws[19]:
-        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-        cell.border = Border(left=Side(style='thin'),
-                             right=Side(style='thin'),
-                             top=Side(style='thin'),
-                             bottom=Side(style='thin'))
-
-    # Ajustar el texto para las celdas desde la fila 20 hasta el final
-    for row in ws.iter_rows(min_row=20, max_row=ws.max_row):
-        for cell in row:
-            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            cell.border = Border(left=Side(style='thin'),
-                                 right=Side(style='thin'),
-                                 top=Side(style='thin'),
-                                 bottom=Side(style='thin'))
-
-    # Combinar celdas contiguas con el mismo valor en la fila 19
-    prev_val = ws.cell(row=19, column=1).value
-    merge_start = None
-    for col in range(2, ws.max_column + 1):
-        current_val = ws.cell(row=19, column=col).value
-        if current_val == prev_val:
-            if not merge_start:
-                merge_start = col - 1
-            if col == ws.max_column:
-                ws.merge_cells(start_row=19, start_column=merge_start, end_row=19, end_column=col)
-        else:
-            if merge_start:
-                ws.merge_cells(start_row=19, start_column=merge_start, end_row=19, end_column=col - 1)
-                merge_start = None
-        prev_val = current_val
-
-    if sheet not in all_sheets_data:
-        all_sheets_data[sheet] = [row_20_titles]
-    all_sheets_data[sheet].append(total_row_values + [file.replace('.xls', '')])
-
-    file_table.add_row(file, sheet, "La hoja ha sido procesada exitosamente")
-
-def consolidate_data(data):
-    consolidated_data = [data[0]]  # Títulos
-    trimesters = ["Primer Trimestre", "Segundo Trimestre", "Tercer Trimestre", "Cuarto Trimestre"]
-
-    for trimester in trimesters:
-        rows = [row for row in data[1:] if trimester in row[-1]]
-        if rows:
-            consolidated_row = ['Total'] + [sum(row[i] for row in rows) for i in range(1, len(rows[0]) - 1)] + [trimester]
-            consolidated_data.append(consolidated_row)
-
-    return consolidated_data
-
-def create_consolidated_file(all_sheets_data, subfolder):
-    log_message("Iniciando la creación del archivo consolidado.")
-    consolidated_writer = Workbook()
-    consolidated_writer.remove(consolidated_writer.active)
-
-    border = Border(left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin'))
-
-    for sheet, data in all_sheets_data.items():
-        ws = consolidated_writer.create_sheet(title=sheet)
-
-        # Añadir el título (los encabezados de columna)
-        column_titles = data[0]  # Esta línea toma la fila de títulos
-        ws.append(column_titles)
-
-        # Verificar si necesitamos una segunda tabla
-        has_multiple_parts = any("_" in item[-1] for item in data[1:])
-
-        # Primera tabla con datos individuales
-        for row in sorted(data[1:], key=sort_key_func):
-            ws.append(row)
-
-        # Si hay múltiples partes, agregamos la segunda tabla
-        if has_multiple_parts:
-            # Agregar un espacio entre las dos tablas
-            ws.append([])
-
-            # Segunda tabla
-            consolidated_data = consolidate_data(data)
-            for row in consolidated_data:
-                ws.append(row)
-
-        for row in ws.rows:
-            for cell in row:
-                cell.alignment = Alignment(wrap_text=True)
-                cell.border = border
-
-    consolidated_file = subfolder + 'Consolidado.xlsx'
-    try:
-        consolidated_writer.save(consolidated_file)
-        log_message("Archivo consolidado creado exitosamente en {}.".format(consolidated_file))
-        status = "Éxito"
-        location = consolidated_file
-    except Exception as e:
-        log_message("Error al guardar el archivo consolidado: {}.".format(str(e)))
-        status = "Error"
-        location = "N/A"
-
-    # Mostrar tabla con resultados
-    table = Table(show_header=True, header_style="bold magenta")
-    table.add_column("Estado", style="dim", width=20)
-    table.add_column("Ubicación", style="dim", width=60)
-    table.add_row(status, location)
-    console.print(table)
-
-def main():
-    try:
-        warnings.filterwarnings('ignore', category=UserWarning, module='xlrd')
-
-        # Verifica si existe log.txt, si no, lo crea
-        if not os.path.exists("log.txt"):
-            with open("log.txt", "w") as log_file:
-                log_file.write("Registro para AnalizadorEstadisticoJudicial\n\n")
-
-        # Verifica si existe README.md, si no, lo crea
-        if not os.path.exists("README.md"):
-            create_or_update_readme()
-
-        create_info_table()
-
-        log_message("Iniciando el procesamiento de los archivos Excel.", add_space=True)
-
-        subfolder = create_folder_structure()
-
-        # Obtenemos una lista de todos los archivos .xls en el directorio actual
-        all_files = glob.glob('* Trimestre*.xls')
-
-        # Ordenamos los archivos antes de procesarlos
-        excel_files = sorted_files(all_files)
-
-        all_sheets_data = process_excel_files(excel_files, subfolder)
-        create_consolidated_file(all_sheets_data, subfolder)
-
-        log_message("Procesamiento finalizado.", add_space=True)
-
-        input("\nPresiona cualquier tecla para salir...")
-    except Exception as e:
-        log_message(f"Error inesperado: {str(e)}")
-        console.print(
-            f"[red]Error inesperado: {str(e)}. Por favor, consulte el archivo log.txt para obtener más detalles.[/red]")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+from rich import print
+from rich.table import Table
+from rich.console import Console
+import os
+import sys
+import json
+from datetime import datetime
+import warnings
+import re
+import logging
+from collections import namedtuple
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import partial
+from multiprocessing import freeze_support
+from excel_reader import open_workbook, release_sheet, extract_sheet
+from parse_cache import ParseCache, file_digest
+from dataset import SheetData, merge_datasets, compact_dataset, consolidate_data, consolidation_rows, is_input_file
+from xlsx_writer import create_workbook, write_sheet, CENTERED_STYLE, WRAPPED_STYLE
+from run_log import LOG_FILE, log_message, start_logging, log_queue, init_worker_logging
+from run_report import RunReport, MemoryBudget, MemoryBudgetExceeded
+from district import find_shards, map_shards, reduce_shards, write_district_workbook
+from snapshot import SNAPSHOT_FILE, snapshot_available, save_snapshot, load_snapshot
+from history import HISTORY_FILE, HistoryStore, year_from_path
+from catalog import FileCatalog
+from ingest import ordered_map
+
+console = Console()
+
+# Modos de generación de los archivos <archivo>_results.xlsx
+RESULTS_INLINE = 'inline'
+RESULTS_DEFERRED = 'deferred'
+RESULTS_SKIP = 'skip'
+RESULTS_MODES = (RESULTS_INLINE, RESULTS_DEFERRED, RESULTS_SKIP)
+
+# Códigos de salida del modo por lotes (2 lo usa argparse para errores de uso)
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NO_FILES = 3
+EXIT_FILE_ERRORS = 4
+EXIT_DUPLICATE_NAMES = 5
+
+# Resultado de `process_file`; `timings` son las mediciones de `RunReport` del archivo
+FileResult = namedtuple('FileResult', ['sheets_data', 'rows', 'error', 'cache_hit', 'deferred', 'timings',
+                                       'digest', 'extracts'])
+
+def sort_key_func(row):
+    """
+    Función que devuelve una clave de orden para las filas.
+    """
+    file_name = row[-1]
+    order = ["Primer", "Segundo", "Tercer", "Cuarto"]
+    match = re.match(r"(\w+ Trimestre)(_?(\d)?)", file_name)
+    if match:
+        name, _, number = match.groups()
+        return (order.index(name.split(' ')[0]), int(number) if number else 0)
+    return (0, 0)
+
+def sorted_files(files):
+    """
+    Función que ordena los archivos según su orden de trimestre y número.
+    """
+    return sorted(files, key=lambda file: sort_key_func([os.path.basename(file)]))
+
+def create_info_table():
+    """
+    Función que genera y muestra una tabla con información general del programa.
+    """
+    log_message("Creando tabla de información del programa.")
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Versión del script", style="dim", width=20)
+    table.add_column("Descripción", style="dim", width=50)
+    table.add_column("Nombre del programa", style="dim", width=30)
+    table.add_column("Datos propietarios", style="dim", width=30)
+    table.add_row("1.1", "Analizador para Organización del Trabajo y Eficiencia en Judicatura", "AnalizadorEstadisticoJudicial", "Consejo Seccional de la Judicatura de Sucre")
+    console.print(table)
+
+def create_or_update_readme():
+    """
+    Función que crea o actualiza el archivo README.md con información sobre el programa y su desarrollador.
+    """
+    log_message("Creando o actualizando el archivo README.md.")
+    contenido_readme = """
+# AnalizadorEstadisticoJudicial
+
+## Propósito
+
+Este programa está diseñado para analizar archivos Excel relacionados con la organización del trabajo y la eficiencia en la Judicatura. Automáticamente procesa los datos y genera un consolidado, facilitando la tarea de análisis y presentación de informes.
+
+## ¿Qué hace?
+
+El programa busca archivos Excel con nombres específicos (por ejemplo, 'Primer Trimestre.xls', 'Segundo Trimestre.xls', etc.), incluidos aquellos que tienen un sufijo numérico, como 'Tercer Trimestre_1.xls', en caso de que haya múltiples archivos para un trimestre específico. Procesa cada hoja de estos archivos y finalmente genera un archivo consolidado con los resultados.
+
+## ¿Cómo lo hace?
+
+1. Lee cada archivo Excel.
+2. Procesa cada hoja dentro de los archivos.
+3. Genera un archivo de resultados por cada archivo Excel.
+4. Crea un archivo consolidado con todos los resultados.
+
+## Instrucciones de Uso
+
+1. Asegúrese de que todos los archivos Excel que desea analizar se encuentren en la misma carpeta que este programa.
+2. Ejecute el programa.
+3. Revise la carpeta 'Consolidado' que se creará automáticamente; allí encontrará los resultados.
+
+Nota: Si ejecuta el programa en la raíz donde están los documentos, se creará automáticamente una carpeta 'Consolidado' con los archivos de resultados.
+
+## Desarrollador
+
+Desarrollado por Alexander Oviedo Fadul, Profesional Universitario Grado 11 del Consejo Seccional de la Judicatura de Sucre.
+
+## Funcionalidades Potenciales
+
+- Integración Directa con SIERJU: Si se obtiene acceso a la API o a alguna interfaz de programación de SIERJU, podríamos adaptar el programa para enviar directamente las estadísticas.
+- Análisis Avanzado: Incorporar herramientas de análisis estadístico más avanzadas para obtener insights más detallados de los datos.
+- Visualización de Datos: Incorporar gráficos y tableros de mando para una visualización más intuitiva de las estadísticas.
+
+## Adaptabilidad
+
+Es importante que cualquier desarrollo software, especialmente en contextos institucionales, sea fácilmente adaptable a cambios futuros. Esto no solo incluye cambios en la estructura de los datos, sino también en las necesidades del usuario y en el contexto legal y regulatorio.
+    """
+    with open("README.md", "w") as readme:
+        readme.write(contenido_readme)
+
+def create_folder_structure(output_dir='Consolidado'):
+    log_message("Creando estructura de carpetas para guardar resultados.")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    subfolder = os.path.join(output_dir, datetime.now().strftime('%Y-%m-%d_%H-%M-%S')) + '/'
+    os.makedirs(subfolder)
+    return subfolder
+
+def find_input_files(directories, recursive=False):
+    """
+    Función que busca los archivos trimestrales de las carpetas indicadas (y de sus
+    subcarpetas si `recursive` es verdadero) y los devuelve ordenados por trimestre y parte.
+    """
+    return FileCatalog.scan(directories, recursive).paths()
+
+class TableRows:
+    """
+    Clase que acumula las filas de la tabla de resultados de un archivo para poder
+    devolverlas desde un proceso trabajador y mostrarlas después con rich.
+    """
+    def __init__(self):
+        self.rows = []
+
+    def add_row(self, *cells):
+        self.rows.append(cells)
+
+def create_file_table(rows):
+    file_table = Table(show_header=True, header_style="bold magenta")
+    file_table.add_column("Archivo", style="dim", width=30)
+    file_table.add_column("Hoja", style="dim", width=30)
+    file_table.add_column("Resultado", style="dim", width=40)
+    for row in rows:
+        file_table.add_row(*row)
+    return file_table
+
+def process_file(file, subfolder, cache=None, results_mode=RESULTS_INLINE, keep_extracts=False):
+    """
+    Función que procesa un archivo completo y, en el modo 'inline', guarda su archivo de
+    resultados. Devuelve un `FileResult` con la porción de `all_sheets_data` del archivo,
+    las filas de su tabla de resultados, el mensaje de error si no se pudo leer, si sus
+    extractos se tomaron de la caché, en el modo 'deferred' los extractos para generar
+    después el archivo de resultados, y el tiempo de cada etapa. Si `keep_extracts` es
+    verdadero se devuelven además el SHA-256 del archivo y sus extractos. Puede ejecutarse
+    en otro proceso.
+    """
+    log_message(f"Procesando archivo: {file}", file=file, stage="lectura")
+    sheets_data = {}
+    file_table = TableRows()
+    report = RunReport()
+    writer = create_workbook() if results_mode == RESULTS_INLINE else None
+
+    digest = None
+    sheet_results = None
+    if cache is not None:
+        try:
+            with report.stage("cache", file=file):
+                digest = file_digest(file)
+                sheet_results = cache.get(digest)
+        except OSError as e:
+            log_message(f"No se pudo consultar la caché para {file}: {str(e)}", logging.WARNING,
+                        file=file, stage="cache")
+
+    cache_hit = sheet_results is not None
+    if cache_hit:
+        log_message(f"Extractos del archivo {file} tomados de la caché", file=file, stage="cache")
+        for sheet, extract, error in sheet_results:
+            process_sheet_result(sheet, extract, error, file, sheets_data, writer, file_table, report)
+    else:
+        try:
+            with report.stage("apertura", file=file):
+                xls = open_workbook(file)
+        except Exception as e:
+            log_message(f"Error al leer el archivo {file}: {str(e)}", logging.ERROR, file=file, stage="lectura")
+            return FileResult(sheets_data, file_table.rows, f"Error al leer el archivo {file}: {str(e)}",
+                              False, None, report.timings, digest, None)
+
+        try:
+            sheet_results = process_sheets(xls, file, sheets_data, writer, file_table, report)
+        finally:
+            xls.close()
+
+        if digest is not None:
+            try:
+                cache.put(digest, sheet_results)
+            except OSError as e:
+                log_message(f"No se pudo guardar en la caché el archivo {file}: {str(e)}", logging.WARNING,
+                            file=file, stage="cache")
+
+    if writer is not None:
+        with report.stage("guardado_resultados", file=file):
+            save_results_file(writer, file, subfolder, file_table)
+
+    if keep_extracts and digest is None:
+        digest = file_digest(file)
+    deferred = sheet_results if results_mode == RESULTS_DEFERRED else None
+    extracts = sheet_results if keep_extracts else None
+    return FileResult(sheets_data, file_table.rows, None, cache_hit, deferred, report.timings, digest, extracts)
+
+def results_file_path(file, subfolder):
+    return subfolder + os.path.basename(file).replace('.xls', '') + '_results.xlsx'
+
+def save_results_file(writer, file, subfolder, file_table):
+    result_file = results_file_path(file, subfolder)
+    try:
+        writer.save(result_file)
+        log_message(f"Archivo de resultados guardado: {result_file}", file=file, stage="resultados")
+        file_table.add_row(file, "-", f"Archivo de resultados guardado: {result_file}")
+    except Exception as e:
+        log_message(f"Error al guardar el archivo de resultados: {str(e)}", logging.ERROR,
+                    file=file, stage="resultados")
+        file_table.add_row(file, "-", f"Error al guardar el archivo de resultados: {str(e)}")
+
+def write_results_file(file, subfolder, sheet_results):
+    """
+    Función que genera el archivo de resultados de un archivo a partir de sus extractos ya
+    leídos, sin volver a abrirlo. Devuelve las filas de su tabla de resultados y el tiempo
+    de cada etapa. Puede ejecutarse en otro proceso.
+    """
+    file_table = TableRows()
+    report = RunReport()
+    writer = create_workbook()
+    for sheet, extract, error in sheet_results:
+        if extract is not None and not error:
+            with report.stage("escritura_hoja", file=file, sheet=sheet):
+                write_results_sheet(writer, sheet, trim_extract(extract))
+    with report.stage("guardado_resultados", file=file):
+        save_results_file(writer, file, subfolder, file_table)
+    return file_table.rows, report.timings
+
+def start_deferred_results(pending_results, subfolder, workers=1):
+    """
+    Función que inicia en segundo plano, en un pool de procesos, la generación de los
+    archivos de resultados aplazados. Devuelve el pool y las tareas en el orden de los archivos.
+    """
+    log_message(f"Generando {len(pending_results)} archivos de resultados en segundo plano.", stage="resultados")
+    executor = ProcessPoolExecutor(max_workers=max(1, workers), initializer=init_worker_logging,
+                                   initargs=(log_queue(),))
+    futures = [executor.submit(write_results_file, file, subfolder, sheet_results)
+               for file, sheet_results in pending_results]
+    return executor, futures
+
+def finish_deferred_results(executor, futures, report=None):
+    """
+    Función que espera a que terminen los archivos de resultados aplazados y muestra su tabla.
+    """
+    rows = []
+    try:
+        for future in futures:
+            try:
+                file_rows, timings = future.result()
+                rows += file_rows
+                if report is not None:
+                    report.extend(timings)
+            except Exception as e:
+                log_message(f"Error al generar un archivo de resultados: {str(e)}", logging.ERROR,
+                            stage="resultados")
+                rows.append(("-", "-", f"Error al generar el archivo de resultados: {str(e)}"))
+    finally:
+        executor.shutdown(wait=True)
+    if rows:
+        console.print(create_file_table(rows))
+    return rows
+
+def iter_excel_files(excel_files, subfolder, workers=1, cache=None, results_mode=RESULTS_INLINE,
+                     keep_extracts=False, cancel=None, budget=None, relieve=None):
+    """
+    Función que procesa los archivos trimestrales indicados (ya filtrados y ordenados) y
+    entrega, a medida que terminan y en el mismo orden, tuplas (archivo, FileResult). Con
+    `workers` > 1 los archivos se procesan en paralelo en un pool de procesos, con un número
+    acotado de archivos en curso. El procesamiento se detiene en cuanto `cancel` (un
+    `threading.Event`) está activo o se cierra el generador. Si se indica `budget` (un
+    `MemoryBudget`), antes de leer cada archivo se comprueba que su lectura cabe en el
+    límite según su tamaño (ver `MemoryBudget.guard`), liberando memoria con `relieve`.
+    """
+    process = partial(process_file, subfolder=subfolder, cache=cache, results_mode=results_mode,
+                      keep_extracts=keep_extracts)
+    workers = workers if len(excel_files) > 1 else 1
+    initargs = (log_queue(),) if workers > 1 else ()
+    items = excel_files if budget is None else budget.guard(excel_files, os.path.getsize, relieve)
+    results = ordered_map(process, items, workers, cancel,
+                          initializer=init_worker_logging if workers > 1 else None, initargs=initargs)
+    with closing(results):
+        for file, result, error in results:
+            if error is not None:
+                log_message(f"Error al procesar el archivo {file}: {str(error)}", logging.ERROR,
+                            file=file, stage="lectura")
+                result = FileResult({}, [], f"Error al procesar el archivo {file}: {str(error)}",
+                                    False, None, [], None, None)
+            yield file, result
+
+def process_excel_files(excel_files, subfolder, workers=1, cache=None, results_mode=RESULTS_INLINE,
+                        pending_results=None, report=None, errors=None, history=None, year=None, cancel=None,
+                        budget=None):
+    """
+    Función que procesa los archivos trimestrales y devuelve `all_sheets_data`. En el modo
+    'deferred' agrega a `pending_results` las tuplas (archivo, extractos) para generar los
+    archivos de resultados después del consolidado; en el modo 'skip' no se generan. Si se
+    indica `report`, se le agregan las mediciones de cada archivo, y si se indica `errors`,
+    las tuplas (archivo, error) de los archivos que no se pudieron leer. Si se indica
+    `history` (un `HistoryStore`), las filas 'Total' de cada archivo se guardan en el
+    historial con el año `year` o, si no se indica, el año que aparezca en su ruta.
+
+    Es una capa sobre `iter_excel_files`: cada archivo se incorpora y se muestra en cuanto
+    termina. Si `cancel` (un `threading.Event`) se activa, se devuelven los datos de los
+    archivos procesados hasta ese momento.
+
+    Si se indica `budget` (un `MemoryBudget`), antes de leer cada archivo se comprueba que la
+    memoria en uso más la estimada para leerlo no supera el límite, compactando los datos con
+    `compact_dataset` si hace falta, y se lanza `MemoryBudgetExceeded` si aun así no alcanza.
+    Los datos también se compactan al terminar.
+    """
+    log_message("Procesando archivos Excel.", stage="lectura")
+    all_sheets_data = {}
+
+    # Ordena los archivos por trimestre y parte para asegurar que se procesan en el orden correcto;
+    # un `FileCatalog` ya está filtrado y ordenado y trae el año de cada archivo
+    if isinstance(excel_files, FileCatalog):
+        years = {entry.path: entry.year for entry in excel_files}
+        excel_files = excel_files.paths()
+    else:
+        years = {}
+        excel_files = [file for file in sorted_files(excel_files) if is_input_file(file)]
+
+    cache_hits = 0
+    processed = 0
+    stream = iter_excel_files(excel_files, subfolder, workers, cache, results_mode, history is not None, cancel,
+                              budget, lambda: compact_dataset(all_sheets_data))
+    with closing(stream):
+        for file, (sheets_data, rows, error, cache_hit, deferred, timings, digest, extracts) in stream:
+            processed += 1
+            cache_hits += cache_hit
+            if report is not None:
+                report.extend(timings)
+            if error:
+                console.print(f"[red]{error}[/red]")
+                if errors is not None:
+                    errors.append((file, error))
+                continue
+            merge_datasets(all_sheets_data, sheets_data)
+            if history is not None:
+                record_history(history, file, digest, extracts, year if year is not None else years.get(file), report)
+            if deferred is not None and pending_results is not None:
+                pending_results.append((file, deferred))
+            console.print(create_file_table(rows))
+
+    if processed < len(excel_files):
+        log_message(f"Procesamiento cancelado: se procesaron {processed} de {len(excel_files)} archivos.",
+                    logging.WARNING, stage="lectura")
+
+    if cache is not None:
+        log_message(f"Caché de archivos: {cache_hits} aciertos, {processed - cache_hits} fallos",
+                    stage="cache")
+
+    if budget is not None:
+        compact_dataset(all_sheets_data)
+        budget.measure()
+
+    return all_sheets_data
+
+def record_history(history, file, digest, sheet_results, year=None, report=None):
+    """
+    Función que guarda en el historial las filas 'Total' de un archivo ya procesado. El
+    origen del archivo es su carpeta, de modo que una nueva versión del mismo archivo
+    reemplaza a la anterior.
+    """
+    report = report if report is not None else RunReport()
+    sheets = [(sheet, extract.row_20_titles, extract.total_row_values)
+              for sheet, extract, error in sheet_results if extract is not None]
+    try:
+        with report.stage("historial", file=file):
+            history.upsert_file(digest, os.path.basename(file), sheets,
+                                year=year if year is not None else year_from_path(file),
+                                origin=os.path.dirname(os.path.abspath(file)))
+    except Exception as e:
+        log_message(f"No se pudo guardar en el historial el archivo {file}: {str(e)}", logging.WARNING,
+                    file=file, stage="historial")
+
+def process_sheets(xls, file, all_sheets_data, writer, file_table, report=None):
+    """
+    Función que extrae y procesa cada hoja del libro abierto. Devuelve la lista de
+    resultados (hoja, extracto, error) para poder guardarla en la caché. Si se indica
+    `report`, se mide el tiempo de extracción y de escritura de cada hoja.
+    """
+    log_message(f"Procesando hojas del archivo: {file}", file=file, stage="hojas")
+    report = report if report is not None else RunReport()
+    sheet_results = []
+    for sheet in xls.sheet_names:
+        log_message(f"Procesando hoja: {sheet}", file=file, sheet=sheet, stage="hojas")
+        with report.stage("extraccion", file=file, sheet=sheet) as timing:
+            try:
+                # Solo se leen el encabezado, los títulos y la fila 'Total' desde el libro ya abierto
+                extract, error = extract_sheet(xls, sheet), None
+            except Exception as e:
+                extract, error = None, str(e)
+            finally:
+                release_sheet(xls, sheet)
+            if extract is not None:
+                timing['rows'] = len(extract.header_rows) + 2
+
+        sheet_results.append((sheet, extract, error))
+        process_sheet_result(sheet, extract, error, file, all_sheets_data, writer, file_table, report)
+    return sheet_results
+
+def process_sheet_result(sheet, extract, error, file, all_sheets_data, writer, file_table, report=None):
+    if error:
+        log_message(f"Error al leer la hoja {sheet} del archivo {file}: {error}", logging.ERROR,
+                    file=file, sheet=sheet, stage="hojas")
+        file_table.add_row(file, sheet, f"Error al leer la hoja: {error}")
+    elif extract is not None:
+        process_rows(extract, file, all_sheets_data, writer, sheet, file_table, report)
+    else:
+        log_message(f"La hoja {sheet} del archivo {file} no cumple con las condiciones necesarias",
+                    file=file, sheet=sheet, stage="hojas")
+        file_table.add_row(file, sheet, "La hoja no cumple con las condiciones necesarias")
+
+def trim_extract(extract):
+    """
+    Función que recorta el encabezado, los títulos y la fila 'Total' de una hoja hasta la
+    última columna utilizada.
+    """
+    header_rows, row_20_titles, total_row_values = extract
+
+    try:
+        # last_column_index = next(i for i, s in enumerate(row_20_titles) if
+        #                          "INVENTARIO" in s and ("FINALIZAR" in s or "FINAL" in s)) + 1
+        last_column_index = len(row_20_titles)
+    except StopIteration:
+        last_column_index = len(row_20_titles)
+
+    header_rows = [row[:last_column_index] for row in header_rows]
+    row_20_titles = row_20_titles[:last_column_index]
+    total_row_values = total_row_values[:last_column_index]
+    return header_rows, row_20_titles, total_row_values
+
+def write_results_sheet(writer, sheet, extract):
+    header_rows, row_20_titles, total_row_values = extract
+    # Fila 19 y siguientes centradas y con borde; las celdas contiguas iguales de la fila 19 se combinan
+    write_sheet(writer, sheet, header_rows + [row_20_titles, total_row_values],
+                style=CENTERED_STYLE, style_from_row=19, merge_row=19)
+
+def process_rows(extract, file, all_sheets_data, writer, sheet, file_table, report=None):
+    log_message(f"Procesando datos de la hoja {sheet} del archivo {file}", file=file, sheet=sheet, stage="hojas")
+    header_rows, row_20_titles, total_row_values = trim_extract(extract)
+
+    # Sin libro de resultados (modos 'deferred' y 'skip') solo se acumulan los datos
+    if writer is not None:
+        report = report if report is not None else RunReport()
+        with report.stage("escritura_hoja", file=file, sheet=sheet):
+            write_results_sheet(writer, sheet, (header_rows, row_20_titles, total_row_values))
+
+    # Los títulos del primer archivo que aporta la hoja se comparten con los demás; un archivo
+    # con más columnas ensancha la hoja con sus títulos
+    if sheet not in all_sheets_data:
+        all_sheets_data[sheet] = SheetData(row_20_titles)
+    all_sheets_data[sheet].add(total_row_values, os.path.basename(file).replace('.xls', ''), row_20_titles)
+
+    file_table.add_row(file, sheet, "La hoja ha sido procesada exitosamente")
+
+def create_consolidated_file(all_sheets_data, subfolder, report=None):
+    log_message("Iniciando la creación del archivo consolidado.", stage="consolidado")
+    report = report if report is not None else RunReport()
+    consolidated_writer = create_workbook()
+
+    for sheet, data in all_sheets_data.items():
+        with report.stage("consolidacion_hoja", sheet=sheet):
+            # Primera tabla: títulos y datos individuales, ordenados por trimestre y parte
+            rows = [data.titles] + data.rows(sort=True)
+
+            # Segunda tabla: totales por trimestre (sumando las partes), por semestre y anual
+            consolidated_rows = consolidation_rows(data)
+            if consolidated_rows:
+                # Agregar un espacio entre las dos tablas
+                rows += [[], data.titles] + consolidated_rows
+
+        with report.stage("escritura_consolidado", sheet=sheet):
+            write_sheet(consolidated_writer, sheet, rows, style=WRAPPED_STYLE)
+
+    consolidated_file = subfolder + 'Consolidado.xlsx'
+    try:
+        with report.stage("guardado_consolidado"):
+            consolidated_writer.save(consolidated_file)
+        log_message("Archivo consolidado creado exitosamente en {}.".format(consolidated_file), stage="consolidado")
+        status = "Éxito"
+        location = consolidated_file
+    except Exception as e:
+        log_message("Error al guardar el archivo consolidado: {}.".format(str(e)), logging.ERROR,
+                    stage="consolidado")
+        status = "Error"
+        location = "N/A"
+        consolidated_file = None
+
+    # Mostrar tabla con resultados
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Estado", style="dim", width=20)
+    table.add_column("Ubicación", style="dim", width=60)
+    table.add_row(status, location)
+    console.print(table)
+    return consolidated_file
+
+def save_run_report(report, subfolder):
+    """
+    Función que guarda el informe de ejecución en la subcarpeta de resultados y muestra el
+    tiempo de cada etapa.
+    """
+    try:
+        report_file, summary = report.save(subfolder)
+    except OSError as e:
+        log_message(f"Error al guardar el informe de ejecución: {str(e)}", logging.ERROR, stage="informe")
+        return None
+    log_message(f"Informe de ejecución guardado en {report_file}", stage="informe")
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Etapa", style="dim", width=30)
+    table.add_column("Segundos", style="dim", width=15, justify="right")
+    table.add_column("Mediciones", style="dim", width=15, justify="right")
+    for stage, totals in summary['stages'].items():
+        table.add_row(stage, f"{totals['seconds']:.3f}", str(totals['count']))
+    console.print(table)
+
+    details = [f"Filas extraídas: {summary['rows']}"]
+    if summary['rows_per_second']:
+        details.append(f"filas/s: {summary['rows_per_second']:.0f}")
+    if summary['peak_rss_bytes']:
+        details.append(f"pico de memoria: {summary['peak_rss_bytes'] / (1024 * 1024):.1f} MB")
+    budget = summary['memory_budget']
+    if budget and budget['peak_bytes']:
+        detail = f"pico medido: {budget['peak_bytes'] / (1024 * 1024):.1f} MB"
+        if budget['limit_bytes'] is not None:
+            detail += f" de {budget['limit_bytes'] / (1024 * 1024):.0f} MB permitidos"
+        details.append(detail)
+    console.print(", ".join(details) + f". Informe: {report_file}")
+    return report_file
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="AnalizadorEstadisticoJudicial",
+                                     description="Consolida los archivos trimestrales de SIERJU. Sin carpetas de "
+                                                 "entrada procesa la carpeta actual de forma interactiva.",
+                                     epilog=f"Códigos de salida: {EXIT_OK} éxito, {EXIT_ERROR} error inesperado o "
+                                            f"consolidado no guardado, 2 argumentos inválidos, {EXIT_NO_FILES} sin "
+                                            f"archivos trimestrales, {EXIT_FILE_ERRORS} algún archivo no se pudo leer, "
+                                            f"{EXIT_DUPLICATE_NAMES} archivos con el mismo nombre en distintas carpetas.")
+    parser.add_argument("inputs", nargs="*", metavar="CARPETA",
+                        help="Carpetas con los archivos trimestrales. Si se indican, se ejecuta en modo por lotes.")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Busca también en las subcarpetas de las carpetas de entrada.")
+    parser.add_argument("--district", action="store_true",
+                        help="Las carpetas de entrada son árboles <despacho>/<año>/ de todo el distrito: cada "
+                             "despacho y año se procesa por separado en paralelo y se genera un consolidado "
+                             "distrital con el desglose por despacho.")
+    parser.add_argument("--snapshot", metavar="ARCHIVO",
+                        help=f"Genera el consolidado a partir de una instantánea {SNAPSHOT_FILE} de una ejecución "
+                             "anterior, sin volver a leer los archivos de Excel (implica --batch).")
+    parser.add_argument("-o", "--output", default="Consolidado",
+                        help="Carpeta donde se crea la subcarpeta de resultados (por defecto Consolidado).")
+    parser.add_argument("--batch", action="store_true",
+                        help="No muestra la tabla informativa, no crea README.md ni espera una tecla al terminar.")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="No muestra tablas ni mensajes en la consola (implica --batch).")
+    parser.add_argument("--json", action="store_true",
+                        help="Al terminar imprime un resumen en JSON en la salida estándar (implica --batch).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de procesos para leer los archivos en paralelo (por defecto 1).")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Carpeta de la caché de archivos ya leídos (por defecto <salida>/.cache).")
+    parser.add_argument("--cache-max-mb", type=int, default=256,
+                        help="Tamaño máximo de la caché en MB (por defecto 256).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Vuelve a leer todos los archivos sin usar la caché.")
+    parser.add_argument("--history-db", default=None,
+                        help=f"Base de datos SQLite del historial de trimestres (por defecto <salida>/{HISTORY_FILE}).")
+    parser.add_argument("--no-history", action="store_true",
+                        help="No guarda las filas 'Total' de los archivos en el historial.")
+    parser.add_argument("--year", type=int, default=None,
+                        help="Año de los archivos para el historial (por defecto el año que aparezca en su ruta).")
+    parser.add_argument("--results", choices=RESULTS_MODES, default=RESULTS_INLINE,
+                        help="Archivos <archivo>_results.xlsx: 'inline' los genera mientras se procesa "
+                             "(por defecto), 'deferred' los genera en segundo plano después de guardar "
+                             "el consolidado y 'skip' no los genera.")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Modo de memoria reducida: lee los archivos en un solo proceso y guarda los datos "
+                             "con los tipos más pequeños que no pierden información.")
+    parser.add_argument("--memory-budget", type=int, default=None, metavar="MB",
+                        help="Límite de memoria residente en MB; antes de leer cada archivo se estima la memoria "
+                             "que necesitará según su tamaño y, si no cabe aun después de compactar los datos, el "
+                             "procesamiento se detiene con error (implica --low-memory).")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers debe ser al menos 1")
+    if args.memory_budget is not None and args.memory_budget < 1:
+        parser.error("--memory-budget debe ser al menos 1")
+    args.low_memory = args.low_memory or args.memory_budget is not None
+    if args.low_memory:
+        # Un solo proceso: los trabajadores duplicarían el intérprete y los datos en memoria
+        args.workers = 1
+    args.batch = args.batch or args.quiet or args.json or bool(args.inputs) or bool(args.snapshot)
+    if args.cache_dir is None:
+        args.cache_dir = os.path.join(args.output, ".cache")
+    if args.history_db is None:
+        args.history_db = os.path.join(args.output, HISTORY_FILE)
+    return args
+
+def run(args):
+    """
+    Función que ejecuta una consolidación completa con los argumentos de `parse_args` y
+    devuelve el código de salida y un resumen serializable en JSON.
+    """
+    if args.district:
+        return run_district(args)
+    if args.snapshot:
+        return run_snapshot(args)
+
+    summary = {'status': 'ok', 'output': None, 'consolidated': None, 'report': None, 'snapshot': None,
+               'history': None, 'files': [], 'errors': [], 'sheets': 0}
+
+    catalog = FileCatalog.scan(args.inputs or ['.'], args.recursive)
+    summary['files'] = catalog.paths()
+    if not catalog:
+        log_message("No se encontraron archivos trimestrales.", logging.WARNING, stage="inicio")
+        console.print("[yellow]No se encontraron archivos trimestrales.[/yellow]")
+        summary['status'] = 'no_files'
+        return EXIT_NO_FILES, summary
+
+    # Las filas de cada archivo se identifican por su nombre: dos archivos con el mismo nombre se
+    # sumarían como uno solo en el consolidado y compartirían el archivo de resultados
+    duplicates = catalog.duplicate_names()
+    if duplicates:
+        for name, paths in duplicates.items():
+            message = f"El archivo {name} aparece en varias carpetas: {', '.join(paths)}"
+            log_message(message, logging.ERROR, file=name, stage="inicio")
+            console.print(f"[red]{message}[/red]")
+            summary['errors'] += [{'file': path, 'error': message} for path in paths]
+        console.print("[red]Procese cada carpeta por separado o use --district para un distrito.[/red]")
+        summary['status'] = 'duplicate_names'
+        return EXIT_DUPLICATE_NAMES, summary
+
+    subfolder = create_folder_structure(args.output)
+    summary['output'] = subfolder
+
+    cache = None if args.no_cache else ParseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    history = None if args.no_history else HistoryStore(args.history_db)
+    report = RunReport()
+    if args.low_memory:
+        # Sin límite explícito se mide la memoria igualmente, pero no se detiene la ejecución
+        report.memory = MemoryBudget(args.memory_budget * 1024 * 1024 if args.memory_budget is not None else None)
+    pending_results = []
+    errors = []
+    start = time.perf_counter()
+    try:
+        all_sheets_data = process_excel_files(catalog, subfolder, workers=args.workers, cache=cache,
+                                              results_mode=args.results, pending_results=pending_results,
+                                              report=report, errors=errors, history=history, year=args.year,
+                                              budget=report.memory)
+    except MemoryBudgetExceeded as e:
+        log_message(str(e), logging.ERROR, stage="lectura")
+        console.print(f"[red]{str(e)}[/red]")
+        summary['status'] = 'error'
+        summary['errors'] = [{'file': None, 'error': str(e)}]
+        summary['report'] = save_run_report(report, subfolder)
+        return EXIT_ERROR, summary
+    finally:
+        if history is not None:
+            history.close()
+            summary['history'] = args.history_db
+    summary['consolidated'] = create_consolidated_file(all_sheets_data, subfolder, report)
+    summary['sheets'] = len(all_sheets_data)
+    summary['errors'] = [{'file': file, 'error': error} for file, error in errors]
+    elapsed = time.perf_counter() - start
+    report.record("hasta_consolidado", elapsed)
+    log_message(f"Consolidado generado en {elapsed:.2f} s "
+                f"(archivos de resultados: {args.results}).", stage="consolidado")
+    summary['snapshot'] = save_dataset_snapshot(all_sheets_data, subfolder, report)
+
+    if pending_results:
+        # El consolidado ya está guardado; los archivos de resultados quedan fuera de la ruta crítica
+        console.print("[green]Consolidado listo. Generando los archivos de resultados en segundo plano...[/green]")
+        start = time.perf_counter()
+        executor, futures = start_deferred_results(pending_results, subfolder, args.workers)
+        finish_deferred_results(executor, futures, report)
+        elapsed = time.perf_counter() - start
+        report.record("resultados_diferidos", elapsed)
+        log_message(f"Archivos de resultados generados en {elapsed:.2f} s.", stage="resultados")
+
+    summary['report'] = save_run_report(report, subfolder)
+
+    if summary['consolidated'] is None:
+        summary['status'] = 'error'
+        return EXIT_ERROR, summary
+    if errors:
+        summary['status'] = 'partial'
+        return EXIT_FILE_ERRORS, summary
+    return EXIT_OK, summary
+
+def save_dataset_snapshot(all_sheets_data, subfolder, report=None):
+    """
+    Función que guarda los datos procesados como instantánea Arrow junto al consolidado, para
+    poder volver a consolidarlos con --snapshot sin leer de nuevo los archivos de Excel.
+    Devuelve la ruta de la instantánea o None si no se guardó.
+    """
+    if not all_sheets_data:
+        return None
+    if not snapshot_available():
+        log_message("No se guardó la instantánea de los datos: pyarrow no está instalado.",
+                    logging.WARNING, stage="instantanea")
+        return None
+    if report is None:
+        report = RunReport()
+
+    snapshot_file = subfolder + SNAPSHOT_FILE
+    try:
+        with report.stage("guardado_instantanea"):
+            save_snapshot(all_sheets_data, snapshot_file)
+        log_message(f"Instantánea de los datos guardada en {snapshot_file}.", stage="instantanea")
+        return snapshot_file
+    except Exception as e:
+        log_message(f"Error al guardar la instantánea de los datos: {str(e)}", logging.ERROR, stage="instantanea")
+        console.print(f"[red]Error al guardar la instantánea de los datos: {str(e)}[/red]")
+        return None
+
+def run_snapshot(args):
+    """
+    Función que genera el consolidado a partir de una instantánea guardada por una ejecución
+    anterior. La instantánea se abre en memoria mapeada, por lo que no se vuelve a leer
+    ningún archivo de Excel. Devuelve el código de salida y el resumen.
+    """
+    summary = {'status': 'ok', 'output': None, 'consolidated': None, 'report': None,
+               'snapshot': args.snapshot, 'files': [], 'errors': [], 'sheets': 0}
+
+    report = RunReport()
+    try:
+        with report.stage("carga_instantanea", file=os.path.basename(args.snapshot)):
+            all_sheets_data = load_snapshot(args.snapshot)
+    except Exception as e:
+        log_message(f"Error al cargar la instantánea {args.snapshot}: {str(e)}", logging.ERROR,
+                    file=args.snapshot, stage="instantanea")
+        console.print(f"[red]Error al cargar la instantánea {args.snapshot}: {str(e)}[/red]")
+        summary['status'] = 'error'
+        summary['errors'] = [{'file': args.snapshot, 'error': str(e)}]
+        return EXIT_ERROR, summary
+
+    log_message(f"Instantánea {args.snapshot} cargada: {len(all_sheets_data)} hojas.", stage="instantanea")
+    subfolder = create_folder_structure(args.output)
+    summary['output'] = subfolder
+    summary['sheets'] = len(all_sheets_data)
+    summary['consolidated'] = create_consolidated_file(all_sheets_data, subfolder, report)
+    summary['report'] = save_run_report(report, subfolder)
+
+    if summary['consolidated'] is None:
+        summary['status'] = 'error'
+        return EXIT_ERROR, summary
+    return EXIT_OK, summary
+
+def run_district(args):
+    """
+    Función que consolida todos los despachos y años del distrito: cada carpeta
+    <despacho>/<año>/ se procesa como un fragmento independiente en un pool de procesos
+    (mapeo) y los resultados se combinan en un único conjunto (reducción) que se escribe en
+    Consolidado_Distrito.xlsx. Devuelve el código de salida y el resumen.
+    """
+    summary = {'status': 'ok', 'output': None, 'consolidated': None, 'report': None,
+               'shards': 0, 'files': 0, 'errors': [], 'sheets': 0}
+
+    shards = find_shards(args.inputs or ['.'])
+    summary['shards'] = len(shards)
+    summary['files'] = sum(len(shard.files) for shard in shards)
+    if not shards:
+        log_message("No se encontraron carpetas <despacho>/<año>/ con archivos trimestrales.",
+                    logging.WARNING, stage="inicio")
+        console.print("[yellow]No se encontraron carpetas <despacho>/<año>/ con archivos trimestrales.[/yellow]")
+        summary['status'] = 'no_files'
+        return EXIT_NO_FILES, summary
+
+    subfolder = create_folder_structure(args.output)
+    summary['output'] = subfolder
+    cache = None if args.no_cache else ParseCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    report = RunReport()
+
+    log_message(f"Consolidación distrital: {len(shards)} fragmentos, {summary['files']} archivos", stage="fragmento")
+    with report.stage("mapeo"):
+        shard_results = map_shards(shards, workers=args.workers, cache=cache)
+    with report.stage("reduccion"):
+        district = reduce_shards(shard_results)
+
+    errors = [(file, error) for result in shard_results for file, error in result.errors]
+    for file, error in errors:
+        console.print(f"[red]Error en {file}: {error}[/red]")
+    summary['errors'] = [{'file': file, 'error': error} for file, error in errors]
+    summary['sheets'] = len(district)
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Despacho", style="dim", width=30)
+    table.add_column("Año", style="dim", width=10)
+    table.add_column("Archivos", style="dim", width=10)
+    table.add_column("Hojas", style="dim", width=10)
+    table.add_column("Errores", style="dim", width=10)
+    for result in shard_results:
+        table.add_row(result.court, result.year, str(result.files), str(len(result.sheets)), str(len(result.errors)))
+    console.print(table)
+
+    district_file = subfolder + 'Consolidado_Distrito.xlsx'
+    try:
+        with report.stage("guardado_consolidado"):
+            write_district_workbook(district, district_file)
+        log_message(f"Consolidado distrital creado en {district_file}.", stage="consolidado")
+        console.print(f"[green]Consolidado distrital creado en {district_file}[/green]")
+        summary['consolidated'] = district_file
+    except Exception as e:
+        log_message(f"Error al guardar el consolidado distrital: {str(e)}", logging.ERROR, stage="consolidado")
+        console.print(f"[red]Error al guardar el consolidado distrital: {str(e)}[/red]")
+
+    summary['report'] = save_run_report(report, subfolder)
+
+    if summary['consolidated'] is None:
+        summary['status'] = 'error'
+        return EXIT_ERROR, summary
+    if errors:
+        summary['status'] = 'partial'
+        return EXIT_FILE_ERRORS, summary
+    return EXIT_OK, summary
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.quiet or args.json:
+        console.quiet = True
+
+    log_file = os.path.join(args.output, LOG_FILE)
+    try:
+        warnings.filterwarnings('ignore', category=UserWarning, module='xlrd')
+
+        # Registro en segundo plano en <salida>/log.txt (líneas JSON, con rotación por tamaño)
+        os.makedirs(args.output, exist_ok=True)
+        start_logging(log_file)
+
+        if not args.batch:
+            # Verifica si existe README.md, si no, lo crea
+            if not os.path.exists("README.md"):
+                create_or_update_readme()
+
+            create_info_table()
+
+        log_message("Iniciando el procesamiento de los archivos Excel.", stage="inicio")
+        exit_code, summary = run(args)
+        log_message("Procesamiento finalizado.", stage="fin")
+    except Exception as e:
+        log_message(f"Error inesperado: {str(e)}", logging.ERROR)
+        console.print(
+            f"[red]Error inesperado: {str(e)}. Por favor, consulte el archivo {log_file} para obtener más detalles.[/red]")
+        exit_code, summary = EXIT_ERROR, {'status': 'error', 'error': str(e)}
+
+    if args.json:
+        sys.stdout.write(json.dumps(summary, ensure_ascii=False) + "\n")
+    if not args.batch:
+        input("\nPresiona cualquier tecla para salir...")
+    return exit_code
+
+if __name__ == "__main__":
+    # Necesario para el pool de procesos en el ejecutable empaquetado de Windows
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Suite de rendimiento de los flujos de escritorio y web sobre libros SIERJU sintéticos:
+lectura, consolidación y escritura. Compara cada caso con una línea base guardada y marca
+las regresiones que superan el umbral. No necesita conexión a internet.
+
+Uso: python benchmarks/bench_pipeline.py [--parts N] [--sheets N] [--columns N] [--rows N]
+     [--format xls|xlsx] [--repeat N] [--baseline RUTA] [--save-baseline] [--threshold 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sierju_generator import generate_quarterly_files
+from excel_reader import extract_workbook
+from dataset import consolidation_rows
+from parse_cache import ParseCache
+from run_report import RunReport
+from xlsx_writer import create_workbook, write_sheet
+import AnalizadorEstadisticoJudicial as desktop
+import main as web
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def desktop_parse(context):
+    # La aplicación de escritorio busca los archivos en la carpeta actual
+    with contextlib.redirect_stdout(io.StringIO()), chdir(context['directory']):
+        context['desktop_data'] = desktop.process_excel_files(
+            context['names'], context['output'], results_mode=desktop.RESULTS_SKIP)
+
+
+def desktop_consolidate(context):
+    for data in context['desktop_data'].values():
+        data.rows(sort=True)
+        consolidation_rows(data)
+
+
+def desktop_write(context):
+    with contextlib.redirect_stdout(io.StringIO()), chdir(context['directory']):
+        desktop.create_consolidated_file(context['desktop_data'], context['output'])
+        for name, sheet_results in context['extracts']:
+            desktop.write_results_file(name, context['output'], sheet_results)
+
+
+def web_parse(context):
+    # La aplicación web lee los archivos cargados desde memoria; cada repetición usa una caché
+    # vacía, como la primera carga de los archivos
+    context['web_runs'] = context.get('web_runs', 0) + 1
+    cache = ParseCache(os.path.join(context['cache'], str(context['web_runs'])))
+    context['web_data'] = web.process_excel_files(context['uploads'], workers=1, cache=cache,
+                                                  report=RunReport())
+
+
+def web_consolidate(context):
+    for data in context['web_data'].values():
+        data.rows()
+        consolidation_rows(data)
+
+
+def web_write(context):
+    workbook = create_workbook()
+    for sheet, data in context['web_data'].items():
+        rows = (data.header_rows or []) + [data.titles] + data.rows()
+        rows += [[], data.titles] + consolidation_rows(data)
+        write_sheet(workbook, sheet, rows)
+    workbook.save(io.BytesIO())
+
+
+# Los casos se ejecutan en orden: la consolidación y la escritura usan el resultado de la lectura
+CASES = [
+    ('escritorio.lectura', desktop_parse),
+    ('escritorio.consolidacion', desktop_consolidate),
+    ('escritorio.escritura', desktop_write),
+    ('web.lectura', web_parse),
+    ('web.consolidacion', web_consolidate),
+    ('web.escritura', web_write),
+]
+
+
+@contextlib.contextmanager
+def chdir(path):
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+def run_cases(context, repeat):
+    """
+    Función que ejecuta cada caso `repeat` veces y devuelve el mejor tiempo de cada uno.
+    """
+    results = {}
+    for name, case in CASES:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case(context)
+            best = min(best, time.perf_counter() - start)
+        results[name] = best
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Función que compara los tiempos con la línea base. Devuelve filas (caso, tiempo, tiempo
+    base, variación, regresión); la variación es None si el caso no está en la línea base.
+    """
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        change = (seconds - base) / base if base else None
+        rows.append((name, seconds, base, change, change is not None and change > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--parts', type=int, default=2)
+    parser.add_argument('--sheets', type=int, default=20)
+    parser.add_argument('--columns', type=int, default=30)
+    parser.add_argument('--rows', type=int, default=40)
+    parser.add_argument('--format', choices=['xls', 'xlsx'], default='xlsx')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Guarda los tiempos obtenidos como nueva línea base.")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Aumento relativo a partir del cual un caso es una regresión (por defecto 0.2).")
+    args = parser.parse_args(argv)
+
+    parameters = {'parts': args.parts, 'sheets': args.sheets, 'columns': args.columns,
+                  'rows': args.rows, 'format': args.format}
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = os.path.join(temp_dir, 'entrada')
+        output = os.path.join(temp_dir, 'salida') + os.sep
+        os.makedirs(output)
+        paths = generate_quarterly_files(directory, args.parts, fmt=args.format, sheets=args.sheets,
+                                         columns=args.columns, detail_rows=args.rows, seed=args.seed)
+        names = [os.path.basename(path) for path in paths]
+        uploads = []
+        for name, path in zip(names, paths):
+            with open(path, 'rb') as f:
+                uploads.append((name, f.read()))
+        context = {'directory': directory, 'output': output, 'paths': paths, 'names': names,
+                   'uploads': uploads, 'cache': os.path.join(temp_dir, 'cache'),
+                   'extracts': [(name, extract_workbook(path)) for name, path in zip(names, paths)]}
+        results = run_cases(context, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get('parameters') == parameters:
+            baseline = saved['results']
+        else:
+            print(f"La línea base de {args.baseline} se tomó con otros parámetros; no se compara.")
+
+    print(f"Archivos: {len(names)}  Hojas: {args.sheets}  Columnas: {args.columns}  "
+          f"Filas: {args.rows}  Formato: {args.format}")
+    regressions = 0
+    for name, seconds, base, change, regression in compare(results, baseline, args.threshold):
+        line = f"{name:<26} {seconds:8.3f} s"
+        if change is not None:
+            line += f"  (base {base:.3f} s, {change:+.0%})"
+        if regression:
+            line += "  REGRESIÓN"
+            regressions += 1
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'parameters': parameters, 'results': results,
+                       'python': platform.python_version(), 'machine': platform.machine(),
+                       'saved': datetime.now().isoformat(timespec='seconds')}, f, indent=2)
+        print(f"Línea base guardada en {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Comparación del tiempo de lectura de un libro con muchas hojas: volviendo a analizar el
+archivo por cada hoja (comportamiento anterior), abriéndolo una sola vez y extrayendo solo
+el encabezado y la fila 'Total' de cada hoja.
+
+Uso: python benchmarks/bench_workbook_reader.py [--sheets N] [--rows N] [--cols N] [--format xls|xlsx]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from excel_reader import open_workbook, release_sheet, extract_sheet
+
+
+def build_workbook(path, sheets, rows, cols):
+    """
+    Función que genera un libro con varias hojas de estructura similar a los formularios SIERJU.
+    """
+    def sheet_rows():
+        for r in range(rows - 1):
+            yield [f"Fila {r}"] + [r * cols + c for c in range(1, cols)]
+        yield ['Total'] + [c for c in range(1, cols)]
+
+    if path.endswith('.xls'):
+        import xlwt
+        book = xlwt.Workbook()
+        for s in range(sheets):
+            ws = book.add_sheet(f"Hoja{s}")
+            for r, row in enumerate(sheet_rows()):
+                for c, value in enumerate(row):
+                    ws.write(r, c, value)
+        book.save(path)
+    else:
+        book = Workbook()
+        book.remove(book.active)
+        for s in range(sheets):
+            ws = book.create_sheet(f"Hoja{s}")
+            for row in sheet_rows():
+                ws.append(row)
+        book.save(path)
+
+
+def read_per_sheet(path):
+    xls = pd.ExcelFile(path)
+    for sheet in xls.sheet_names:
+        pd.read_excel(path, sheet_name=sheet, header=None)
+
+
+def read_once(path):
+    with open_workbook(path) as xls:
+        for sheet in xls.sheet_names:
+            pd.read_excel(xls, sheet_name=sheet, header=None)
+            release_sheet(xls, sheet)
+
+
+def extract_once(path):
+    with open_workbook(path) as xls:
+        for sheet in xls.sheet_names:
+            extract_sheet(xls, sheet)
+            release_sheet(xls, sheet)
+
+
+def timed(func, path, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sheets', type=int, default=30)
+    parser.add_argument('--rows', type=int, default=60)
+    parser.add_argument('--cols', type=int, default=25)
+    parser.add_argument('--format', choices=['xls', 'xlsx'], default='xls')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, f"Primer Trimestre.{args.format}")
+        build_workbook(path, args.sheets, args.rows, args.cols)
+
+        before = timed(read_per_sheet, path, args.repeat)
+        after = timed(read_once, path, args.repeat)
+        extracted = timed(extract_once, path, args.repeat)
+
+    print(f"Hojas: {args.sheets}  Filas: {args.rows}  Columnas: {args.cols}  Formato: {args.format}")
+    print(f"Re-analizando por hoja: {before:.3f} s")
+    print(f"Abriendo una sola vez:  {after:.3f} s")
+    print(f"Extracción acotada:     {extracted:.3f} s")
+    print(f"Aceleración: {before / after:.1f}x (lectura única), {before / extracted:.1f}x (extracción acotada)")
+
+
+if __name__ == '__main__':
+    main()
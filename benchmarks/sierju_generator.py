@@ -0,0 +1,125 @@
+"""
+Generador de libros trimestrales sintéticos con la estructura de los formularios SIERJU:
+19 filas de encabezado, los títulos en la fila 20, filas de detalle y la fila 'Total'.
+
+Los .xlsx se escriben con openpyxl; los .xls requieren el paquete opcional xlwt.
+
+Uso: python benchmarks/sierju_generator.py DESTINO [--parts N] [--sheets N] [--columns N]
+     [--rows N] [--format xls|xlsx] [--seed N]
+"""
+import argparse
+import os
+import random
+import sys
+
+from openpyxl import Workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import QUARTERS
+
+# Grupos de columnas de la fila 19; cada grupo ocupa varias columnas contiguas
+COLUMN_GROUPS = ["INVENTARIO INICIAL", "INGRESOS", "EGRESOS EFECTIVOS", "OTROS EGRESOS",
+                 "INVENTARIO FINAL", "AUDIENCIAS", "TUTELAS", "INCIDENTES"]
+
+HEADER_LABELS = ["CONSEJO SUPERIOR DE LA JUDICATURA",
+                 "SISTEMA DE INFORMACIÓN ESTADÍSTICA DE LA RAMA JUDICIAL - SIERJU",
+                 None, "Distrito:", "Circuito:", "Municipio:", "Despacho:", "Código del despacho:",
+                 "Funcionario:", "Cargo:", "Especialidad:", "Periodo:", "Fecha de corte:",
+                 "Formulario:", None, "Observaciones:", None, None]
+
+
+def sheet_rows(sheet_index, quarter, part, columns, detail_rows, rng):
+    """
+    Función que genera las filas de una hoja: el encabezado de 19 filas, los títulos de la
+    fila 20, `detail_rows` filas de detalle y la fila 'Total' con la suma de cada columna.
+    `columns` es el número de columnas de datos (sin contar la columna A).
+    """
+    rows = []
+    for label in HEADER_LABELS:
+        if label is None:
+            rows.append([None])
+        elif label == "Periodo:":
+            rows.append([label, f"{quarter} - parte {part}" if part else quarter])
+        elif label.endswith(':'):
+            rows.append([label, f"{label[:-1]} {sheet_index + 1}"])
+        else:
+            rows.append([label])
+
+    group_size = max(1, columns // len(COLUMN_GROUPS))
+    rows.append([None] + [COLUMN_GROUPS[min(c // group_size, len(COLUMN_GROUPS) - 1)] for c in range(columns)])
+
+    rows.append([None] + [f"COLUMNA {c + 1}" for c in range(columns)])
+    totals = [0] * columns
+    for r in range(detail_rows):
+        values = [rng.randint(0, 50) for _ in range(columns)]
+        totals = [total + value for total, value in zip(totals, values)]
+        rows.append([f"Proceso tipo {r + 1}"] + values)
+    rows.append(['Total'] + totals)
+    return rows
+
+
+def write_workbook(path, quarter, part=0, sheets=10, columns=20, detail_rows=30, seed=0):
+    """
+    Función que escribe un libro trimestral sintético en `path` (.xls o .xlsx). Con la misma
+    semilla se generan siempre los mismos valores.
+    """
+    rng = random.Random(f"{seed}-{quarter}-{part}")
+    sheet_names = [f"Hoja {s + 1}" for s in range(sheets)]
+
+    if path.endswith('.xls'):
+        try:
+            import xlwt
+        except ImportError as e:
+            raise ImportError("Para generar archivos .xls se necesita el paquete xlwt (pip install xlwt)") from e
+        book = xlwt.Workbook()
+        for s, name in enumerate(sheet_names):
+            ws = book.add_sheet(name)
+            for r, row in enumerate(sheet_rows(s, quarter, part, columns, detail_rows, rng)):
+                for c, value in enumerate(row):
+                    if value is not None:
+                        ws.write(r, c, value)
+        book.save(path)
+    else:
+        book = Workbook(write_only=True)
+        for s, name in enumerate(sheet_names):
+            ws = book.create_sheet(name)
+            for row in sheet_rows(s, quarter, part, columns, detail_rows, rng):
+                ws.append(row)
+        book.save(path)
+    return path
+
+
+def generate_quarterly_files(directory, parts=1, quarters=QUARTERS, fmt='xlsx', **kwargs):
+    """
+    Función que genera un libro por trimestre y parte en `directory`, con nombres como
+    'Primer Trimestre.xlsx' (una sola parte) o 'Primer Trimestre_1.xlsx', y devuelve sus
+    rutas en orden. Los demás argumentos se pasan a `write_workbook`.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for quarter in quarters:
+        for part in range(1, parts + 1) if parts > 1 else [0]:
+            name = f"{quarter}_{part}.{fmt}" if part else f"{quarter}.{fmt}"
+            paths.append(write_workbook(os.path.join(directory, name), quarter, part, **kwargs))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--parts', type=int, default=1)
+    parser.add_argument('--sheets', type=int, default=10)
+    parser.add_argument('--columns', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=30)
+    parser.add_argument('--format', choices=['xls', 'xlsx'], default='xlsx')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_quarterly_files(args.directory, args.parts, fmt=args.format, sheets=args.sheets,
+                                     columns=args.columns, detail_rows=args.rows, seed=args.seed)
+    for path in paths:
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from dataset import QUARTERS, is_input_name, parse_source_label, parse_year
+
+# Un archivo del catálogo. `folder` son las carpetas entre la carpeta de entrada (`root`) y
+# el archivo; en un árbol de distrito es (despacho, año).
+CatalogEntry = namedtuple('CatalogEntry', ['path', 'name', 'root', 'folder', 'quarter', 'part', 'year',
+                                           'size', 'mtime'])
+
+
+def period_key(entry):
+    """
+    Función que devuelve la clave de orden de un archivo por trimestre y parte, dejando
+    primero los que no corresponden a un trimestre.
+    """
+    return (QUARTERS.index(entry.quarter) if entry.quarter else -1, entry.part)
+
+
+@lru_cache(maxsize=None)
+def _folder_year(folder):
+    for text in reversed(folder):
+        year = parse_year(text)
+        if year is not None:
+            return year
+    return None
+
+
+def catalog_entry(path, root='', folder=(), size=None, mtime=None, name=None):
+    """
+    Función que construye la entrada de un archivo, obteniendo una sola vez el trimestre, la
+    parte y el año a partir de su nombre y de sus carpetas.
+    """
+    name = name or os.path.basename(path)
+    quarter, part = parse_source_label(name)
+    year = parse_year(name)
+    if year is None:
+        year = _folder_year(tuple(folder))
+    return CatalogEntry(path, name, root, tuple(folder), quarter, part, year, size, mtime)
+
+
+class FileCatalog:
+    """
+    Clase que guarda el índice de los archivos trimestrales de entrada, ordenado por
+    trimestre y parte. Las carpetas se recorren una sola vez con `os.scandir`, los datos de
+    cada nombre se obtienen una sola vez y de cada archivo se guardan su tamaño y su fecha de
+    modificación. Los archivos con el mismo trimestre y parte conservan el orden del recorrido.
+    """
+
+    def __init__(self, entries, roots=()):
+        self.entries = sorted(entries, key=period_key)
+        self.roots = list(roots)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def paths(self):
+        return [entry.path for entry in self.entries]
+
+    def duplicate_names(self):
+        """
+        Función que devuelve los archivos que comparten nombre (sin distinguir mayúsculas) en
+        distintas carpetas, como un diccionario nombre -> rutas. Sus filas tendrían la misma
+        etiqueta en el consolidado y sus archivos de resultados el mismo nombre.
+        """
+        groups = {}
+        for entry in self.entries:
+            groups.setdefault(entry.name.lower(), []).append(entry.path)
+        return {os.path.basename(paths[0]): paths for paths in groups.values() if len(paths) > 1}
+
+    @classmethod
+    def scan(cls, directories, recursive=False, max_depth=None):
+        """
+        Función que recorre las carpetas indicadas (y sus subcarpetas si `recursive` es
+        verdadero, hasta `max_depth` niveles) y devuelve el catálogo de sus archivos
+        trimestrales.
+        """
+        entries = []
+        for root in directories:
+            entries += _scan_directory(root, (), recursive, max_depth)
+        return cls(entries, directories)
+
+    @classmethod
+    def from_uploads(cls, uploads):
+        """
+        Función que construye el catálogo de archivos cargados en memoria, dados como pares
+        (nombre, contenido en bytes). Se incluyen todos los archivos, aunque su nombre no
+        corresponda a un trimestre.
+        """
+        return cls(catalog_entry(name, size=len(content)) for name, content in uploads)
+
+    def shards(self):
+        """
+        Función que agrupa los archivos que están en carpetas <despacho>/<año>/ de cada carpeta
+        de entrada. Devuelve una lista de tuplas (despacho, año, entradas) ordenada por carpeta
+        de entrada, despacho y año; las entradas de cada grupo mantienen el orden por trimestre.
+        """
+        groups = {}
+        for entry in self.entries:
+            if len(entry.folder) == 2:
+                groups.setdefault((entry.root, entry.folder), []).append(entry)
+        keys = sorted(groups, key=lambda key: (self.roots.index(key[0]), key[1]))
+        return [(folder[0], folder[1], groups[(root, folder)]) for root, folder in keys]
+
+
+def _scan_directory(root, folder, recursive, max_depth):
+    """
+    Función que devuelve las entradas de los archivos trimestrales de una carpeta, en orden
+    alfabético, seguidas de las de sus subcarpetas.
+    """
+    directory = os.path.normpath(os.path.join(root, *folder))
+    with os.scandir(directory) as iterator:
+        items = sorted(iterator, key=lambda item: item.name)
+
+    entries = []
+    for item in items:
+        if is_input_name(item.name) and item.is_file():
+            stat = item.stat()
+            entries.append(catalog_entry(os.path.join(directory, item.name), root, folder,
+                                         stat.st_size, stat.st_mtime, item.name))
+    if recursive and (max_depth is None or len(folder) < max_depth):
+        # Igual que os.walk, no se siguen los enlaces simbólicos a carpetas: un ciclo no termina
+        # y un enlace a otra carpeta leería dos veces los mismos trimestres
+        for item in items:
+            if item.is_dir(follow_symlinks=False):
+                entries += _scan_directory(root, folder + (item.name,), recursive, max_depth)
+    return entries
@@ -0,0 +1,50 @@
+import numpy as np
+
+from dataset import column_names, consolidate
+
+# Máximo de puntos por serie que se envían al navegador en los gráficos por archivo
+MAX_POINTS = 5000
+
+
+def trend_frame(sheet_data):
+    """
+    Función que agrega una sola vez las filas 'Total' de todos los archivos de una hoja en
+    una serie compacta por trimestre: una fila por trimestre presente (en orden cronológico,
+    sumando las partes) y una columna float32 por cada columna numérica, con su título como
+    nombre.
+    """
+    numeric = sheet_data.values.select_dtypes('number').columns
+    names = column_names(sheet_data.titles)
+    quarters = consolidate(sheet_data, rollups=False)[numeric].astype('float32')
+    quarters.columns = [names[position] for position in numeric]
+    quarters.index.name = 'Periodo'
+    return quarters
+
+
+def downsample(frame, max_points=MAX_POINTS):
+    """
+    Función que reduce un DataFrame a lo sumo a `max_points` filas tomadas a intervalos
+    regulares, conservando siempre la primera y la última. Si ya tiene menos filas lo
+    devuelve sin copiarlo.
+    """
+    if len(frame) <= max_points:
+        return frame
+    positions = np.unique(np.linspace(0, len(frame) - 1, max_points).round().astype(int))
+    return frame.iloc[positions]
+
+
+def file_frame(sheet_frame, sheet_data):
+    """
+    Función que ordena por trimestre y parte las filas de una hoja ya convertida con
+    `SheetData.to_frame`, para graficarlas como una serie por archivo.
+    """
+    return sheet_frame.iloc[sheet_data.sort_order()].reset_index(drop=True)
+
+
+def trend_long(trend, columns):
+    """
+    Función que convierte las columnas elegidas de una serie por trimestre a formato largo
+    (Periodo, Columna, Valor), el que usa plotly para dibujar una traza por columna.
+    """
+    frame = trend[list(columns)].reset_index()
+    return frame.melt(id_vars='Periodo', var_name='Columna', value_name='Valor')
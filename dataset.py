@@ -0,0 +1,524 @@
+import os
+import re
+from fnmatch import translate
+import numpy as np
+import pandas as pd
+
+from templates import TemplateRegistry
+
+QUARTERS = ["Primer Trimestre", "Segundo Trimestre", "Tercer Trimestre", "Cuarto Trimestre"]
+
+PERIOD_DTYPE = pd.CategoricalDtype(QUARTERS, ordered=True)
+
+SEMESTERS = ["Primer Semestre", "Segundo Semestre"]
+
+QUARTER_SEMESTER = dict(zip(QUARTERS, [SEMESTERS[0]] * 2 + [SEMESTERS[1]] * 2))
+
+ANNUAL = "Anual"
+
+LABEL_COLUMNS = ['concepto', 'archivo', 'periodo', 'parte']
+
+# Patrón de los archivos trimestrales; se excluyen los archivos temporales de Excel (~$)
+INPUT_PATTERN = '*Trimestre*.xls*'
+
+INPUT_RE = re.compile(translate(os.path.normcase(INPUT_PATTERN)))
+
+SOURCE_LABEL_RE = re.compile(r"(\w+ Trimestre)(_?(\d)?)")
+
+YEAR_RE = re.compile(r"(?<!\d)(19|20)\d{2}(?!\d)")
+
+
+def parse_source_label(name):
+    """
+    Función que obtiene el trimestre y la parte a partir del nombre de un archivo, por
+    ejemplo 'Tercer Trimestre_2.xls' -> ('Tercer Trimestre', 2). Si el nombre no
+    corresponde a un trimestre devuelve (None, 0).
+    """
+    match = SOURCE_LABEL_RE.match(name)
+    if match and match.group(1) in QUARTERS:
+        name, _, number = match.groups()
+        return name, int(number) if number else 0
+    return None, 0
+
+
+def is_input_name(name):
+    """
+    Función que indica si un nombre de archivo (sin carpetas) corresponde a un archivo
+    trimestral, con las mismas reglas que `fnmatch` para mayúsculas y minúsculas.
+    """
+    return INPUT_RE.match(os.path.normcase(name)) is not None and not name.startswith('~$')
+
+
+def is_input_file(path):
+    """
+    Función que indica si el nombre de un archivo corresponde a un archivo trimestral.
+    """
+    return is_input_name(os.path.basename(path))
+
+
+def parse_year(text):
+    """
+    Función que obtiene un año de cuatro cifras de un nombre de archivo o de carpeta, por
+    ejemplo '2024' o 'Primer Trimestre 2023.xls'. Devuelve None si no lo encuentra.
+    """
+    match = YEAR_RE.search(text)
+    return int(match.group(0)) if match else None
+
+
+def column_names(titles):
+    """
+    Función que devuelve nombres de columna únicos y legibles a partir de los títulos de la
+    fila 20: los títulos vacíos se nombran por su posición y los repetidos se marcan con '*'.
+    """
+    names = []
+    for position, title in enumerate(titles):
+        name = str(title).strip() if title is not None and str(title).strip() else f"Columna {position + 1}"
+        while name in names:
+            name += " *"
+        names.append(name)
+    return names
+
+
+def _typed_column(column):
+    """
+    Función que convierte una columna de valores de Excel a un tipo compacto: enteros
+    (Int64) o decimales (float64) si todos sus valores son numéricos, o texto (object)
+    en otro caso. Las celdas vacías quedan como valores faltantes.
+    """
+    series = pd.Series(column, dtype=object)
+    present = series.dropna()
+    if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        numeric = pd.to_numeric(series)
+        if (numeric.dropna() % 1 == 0).all():
+            return numeric.astype('Int64')
+        return numeric.astype('float64')
+    return series
+
+
+def _compact_column(column):
+    """
+    Función que guarda una columna de valores con el tipo más pequeño que no pierde
+    información: los enteros con el menor tipo entero con valores faltantes (Int8 a Int64)
+    y los decimales en float32 si todos sus valores se representan exactamente.
+    """
+    if pd.api.types.is_integer_dtype(column.dtype):
+        return pd.to_numeric(column, downcast='integer')
+    if pd.api.types.is_float_dtype(column.dtype) and column.dtype != 'float32':
+        compact = column.astype('float32')
+        same = (compact.astype('float64') == column) | column.isna()
+        if same.all():
+            return compact
+    return column
+
+
+class SheetData:
+    """
+    Clase que guarda los datos de una hoja en forma tipada y columnar: los títulos de la
+    fila 20, una única plantilla de encabezado compartida por todos los archivos y una fila
+    por archivo con los valores de la fila 'Total'.
+
+    Los valores numéricos se guardan en columnas de pandas (`values`, indexadas por la
+    posición de la columna en la hoja) y las etiquetas de cada fila en `labels`, con el
+    trimestre como categoría ordenada y la parte como entero pequeño.
+    """
+
+    def __init__(self, titles, header_rows=None):
+        self.titles = list(titles)
+        self.header_rows = header_rows
+        self._pending = []
+        self._values = pd.DataFrame(columns=range(1, len(self.titles)))
+        self._labels = pd.DataFrame(columns=LABEL_COLUMNS)
+        self._compact = False
+
+    @classmethod
+    def from_columns(cls, titles, header_rows, values, labels):
+        """
+        Función que construye una hoja directamente a partir de sus columnas ya tipadas
+        (`values` y `labels`, con la misma forma que las propiedades del mismo nombre), sin
+        volver a inferir los tipos fila por fila.
+        """
+        sheet_data = cls.__new__(cls)
+        sheet_data.titles = list(titles)
+        sheet_data.header_rows = header_rows
+        sheet_data._pending = []
+        sheet_data._values = values
+        sheet_data._labels = labels
+        sheet_data._compact = False
+        return sheet_data
+
+    def __len__(self):
+        return len(self._labels) + len(self._pending)
+
+    def __eq__(self, other):
+        if not isinstance(other, SheetData):
+            return NotImplemented
+        return (self.titles == other.titles and self.header_rows == other.header_rows
+                and self.rows() == other.rows())
+
+    def add(self, row_values, source, titles=None):
+        """
+        Función que agrega la fila de un archivo. `row_values` incluye el concepto de la
+        columna A ('Total') seguido de los valores de cada columna. Si la fila tiene más
+        columnas que la hoja, la hoja se ensancha (ver `widen`) con los títulos `titles` del
+        archivo o, si no se indican, con títulos vacíos; las filas más cortas se completan
+        con celdas vacías.
+        """
+        if len(row_values) > len(self.titles):
+            self.widen(titles if titles is not None and len(titles) >= len(row_values) else
+                       list(self.titles) + [''] * (len(row_values) - len(self.titles)))
+        row_values = list(row_values) + [None] * (len(self.titles) - len(row_values))
+        self._pending.append((row_values, source))
+
+    def widen(self, titles):
+        """
+        Función que agrega a la hoja las columnas de `titles` que van más allá de las suyas,
+        vacías en las filas que ya tiene. Los títulos propios no cambian.
+        """
+        start = len(self.titles)
+        if len(titles) <= start:
+            return
+        self.titles = self.titles + list(titles[start:])
+        for position in range(start, len(self.titles)):
+            self._values[position] = _typed_column([None] * len(self._values)).set_axis(self._values.index)
+        if self._compact:
+            self._compact_columns()
+
+    def extend(self, other):
+        """
+        Función que agrega las filas de otra hoja, conservando los títulos y el encabezado
+        propios; si la otra hoja tiene más columnas, la hoja se ensancha con sus títulos. Si
+        la otra hoja aún no ha construido sus columnas, se toman sus filas pendientes sin
+        construirlas.
+        """
+        self.widen(other.titles)
+        if len(other._labels):
+            rows = [(row[:-1], row[-1]) for row in other.rows()]
+        else:
+            rows = other._pending
+        for row_values, source in rows:
+            self.add(row_values, source)
+
+    def _materialize(self):
+        if not self._pending:
+            return
+        # Las filas agregadas antes de ensanchar la hoja se completan con celdas vacías
+        width = len(self.titles)
+        rows = [row + [None] * (width - len(row)) for row, _ in self._pending]
+        sources = [source for _, source in self._pending]
+        periods = [parse_source_label(source) for source in sources]
+        columns = list(zip(*rows)) if rows else []
+
+        new_values = pd.DataFrame({position: _typed_column(columns[position])
+                                   for position in range(1, len(self.titles))},
+                                  index=range(len(rows)))
+        new_labels = pd.DataFrame({
+            'concepto': pd.Series(columns[0], dtype=object) if columns else pd.Series(dtype=object),
+            'archivo': pd.Series(sources, dtype=object),
+            'periodo': pd.Categorical([period for period, _ in periods], dtype=PERIOD_DTYPE),
+            'parte': pd.Series([part for _, part in periods], dtype='int8'),
+        })
+        self._pending = []
+
+        if len(self._labels):
+            new_values = pd.concat([self._values, new_values], ignore_index=True)
+            new_labels = pd.concat([self._labels, new_labels], ignore_index=True)
+            new_values = pd.DataFrame({position: _typed_column(new_values[position].astype(object))
+                                       for position in new_values.columns})
+        self._values = new_values
+        self._labels = new_labels
+        if self._compact:
+            self._compact_columns()
+
+    def compact(self):
+        """
+        Función que reduce la memoria de la hoja: construye sus columnas pendientes, guarda
+        cada columna numérica con el tipo más pequeño que no pierde información y el concepto
+        y el archivo como categorías. Las filas que se agreguen o eliminen después conservan
+        los tipos compactos. Devuelve la hoja.
+        """
+        self._materialize()
+        self._compact_columns()
+        self._compact = True
+        return self
+
+    def _compact_columns(self):
+        for position in self._values.columns:
+            self._values[position] = _compact_column(self._values[position])
+        for name in ('concepto', 'archivo'):
+            if not isinstance(self._labels[name].dtype, pd.CategoricalDtype):
+                self._labels[name] = self._labels[name].astype('category')
+
+    def memory_bytes(self):
+        """
+        Función que devuelve la memoria aproximada que ocupan las columnas de la hoja.
+        """
+        return int(self.values.memory_usage(deep=True).sum() + self.labels.memory_usage(deep=True).sum())
+
+    def _replace_rows(self, positions):
+        # Las columnas se vuelven a tipar, como si las filas restantes se hubieran leído de nuevo
+        values = self.values.iloc[positions].reset_index(drop=True)
+        self._values = pd.DataFrame({position: _typed_column(values[position].astype(object))
+                                     for position in values.columns}, index=values.index)
+        self._labels = self.labels.iloc[positions].reset_index(drop=True)
+        if self._compact:
+            self._compact_columns()
+
+    def drop_sources(self, sources):
+        """
+        Función que elimina las filas de los archivos indicados. Devuelve el número de filas
+        eliminadas.
+        """
+        keep = ~self.labels['archivo'].isin(list(sources)).values
+        removed = len(keep) - int(keep.sum())
+        if removed:
+            self._replace_rows(keep.nonzero()[0])
+        return removed
+
+    def order_by_sources(self, sources):
+        """
+        Función que ordena las filas según el orden de los archivos en `sources`; las filas
+        de archivos que no están en la lista quedan al final, en su orden actual.
+        """
+        rank = {source: index for index, source in enumerate(sources)}
+        # El archivo puede ser una categoría si la hoja está compactada
+        keys = np.array([rank.get(source, len(rank)) for source in self.labels['archivo']])
+        order = keys.argsort(kind='stable')
+        if (order != np.arange(len(order))).any():
+            self._replace_rows(order)
+
+    @property
+    def values(self):
+        self._materialize()
+        return self._values
+
+    @property
+    def labels(self):
+        self._materialize()
+        return self._labels
+
+    def sort_order(self):
+        """
+        Función que devuelve las posiciones de las filas ordenadas por trimestre y parte,
+        dejando primero las filas cuyo archivo no corresponde a un trimestre.
+        """
+        labels = self.labels
+        keys = labels['periodo'].cat.codes.clip(lower=0).astype(int) * 1000 + labels['parte'].astype(int)
+        return list(keys.sort_values(kind='stable').index)
+
+    def rows(self, sort=False, start=0, stop=None):
+        """
+        Función que devuelve las filas como listas de Python ([concepto, valores..., archivo]),
+        con `None` en las celdas vacías. Con `start` y `stop` solo se convierten las filas de
+        ese intervalo.
+        """
+        values = self.values
+        labels = self.labels
+        if sort:
+            order = self.sort_order()
+            values = values.loc[order]
+            labels = labels.loc[order]
+        if start or stop is not None:
+            values = values.iloc[start:stop]
+            labels = labels.iloc[start:stop]
+        cells = values.astype(object).where(values.notna(), None).values.tolist()
+        return [[concept] + row + [source]
+                for concept, row, source in zip(labels['concepto'], cells, labels['archivo'])]
+
+    def column_names(self):
+        """
+        Función que devuelve nombres de columna únicos y legibles a partir de los títulos.
+        """
+        return column_names(self.titles)
+
+    def to_frame(self):
+        """
+        Función que construye un DataFrame para mostrar la hoja: una columna por título más
+        la columna 'Archivo'.
+        """
+        names = self.column_names()
+        frame = self.values.copy()
+        frame.columns = names[1:]
+        frame.insert(0, names[0], self.labels['concepto'].values)
+        frame['Archivo'] = self.labels['archivo'].values
+        return frame
+
+    def to_dict(self):
+        """
+        Función que devuelve la hoja como un diccionario serializable en JSON.
+        """
+        return {'titulos': self.titles, 'encabezado': self.header_rows, 'filas': self.rows()}
+
+
+def add_extract(all_sheets_data, sheet, extract, source, keep_header=True, templates=None):
+    """
+    Función que incorpora el extracto de una hoja a `all_sheets_data`. La primera vez que
+    aparece una hoja se guardan sus títulos y su encabezado como plantilla compartida; si se
+    indica `templates` (un `TemplateRegistry`), las hojas con el mismo encabezado comparten
+    una sola copia de sus filas.
+    """
+    header_rows, row_20_titles, total_row_values = extract
+    if sheet not in all_sheets_data:
+        if not keep_header:
+            header_rows = None
+        if templates is not None:
+            template = templates.intern(header_rows, row_20_titles)
+            header_rows, row_20_titles = template.header_rows, template.titles
+        all_sheets_data[sheet] = SheetData(row_20_titles, header_rows)
+    all_sheets_data[sheet].add(total_row_values, source, row_20_titles)
+
+
+def dataset_dict(all_sheets_data, max_rows=None):
+    """
+    Función que devuelve un conjunto de hojas como un diccionario serializable en JSON en el
+    que cada plantilla de encabezado distinta aparece una sola vez, en 'plantillas', y cada
+    hoja solo la referencia por su huella. Con `max_rows` se incluyen solo las primeras filas
+    de cada hoja; 'total_filas' indica cuántas tiene en total.
+    """
+    templates = TemplateRegistry()
+    sheets = {}
+    for sheet, data in all_sheets_data.items():
+        template = templates.intern(data.header_rows, data.titles)
+        sheets[sheet] = {'plantilla': template.key, 'total_filas': len(data), 'filas': data.rows(stop=max_rows)}
+    return {'plantillas': templates.to_dict(), 'hojas': sheets}
+
+
+def merge_datasets(all_sheets_data, other):
+    """
+    Función que incorpora otro conjunto de hojas a `all_sheets_data`, en orden.
+    """
+    for sheet, sheet_data in other.items():
+        if sheet not in all_sheets_data:
+            all_sheets_data[sheet] = sheet_data
+        else:
+            all_sheets_data[sheet].extend(sheet_data)
+
+
+def compact_dataset(all_sheets_data):
+    """
+    Función que compacta todas las hojas de un conjunto (ver `SheetData.compact`) y devuelve
+    los bytes que liberó, según `SheetData.memory_bytes`.
+    """
+    freed = 0
+    for sheet_data in all_sheets_data.values():
+        before = sheet_data.memory_bytes()
+        freed += before - sheet_data.compact().memory_bytes()
+    return freed
+
+
+def requires_rebuild(all_sheets_data, other, changed_sources, order):
+    """
+    Función que indica si actualizar `all_sheets_data` con `update_dataset` daría un
+    resultado distinto al de procesar de nuevo todos los archivos en el orden `order`.
+
+    Cada hoja toma sus títulos y su encabezado del primer archivo que la contiene, el de su
+    primera fila, y se ensancha con los títulos del primer archivo que trae más columnas.
+    El resultado cambia si ese archivo se modificó o se quitó (`changed_sources`), si un
+    archivo de `other` (los nuevos o modificados) queda antes que él o si `other` trae
+    más columnas que la hoja, porque sus títulos dependerían del orden de los archivos.
+    """
+    rank = {source: index for index, source in enumerate(order)}
+    changed_sources = set(changed_sources)
+    for sheet, sheet_data in all_sheets_data.items():
+        if not len(sheet_data):
+            continue
+        defining = sheet_data.labels['archivo'].iloc[0]
+        if defining in changed_sources:
+            return True
+        new = other.get(sheet)
+        if new is None:
+            continue
+        if len(new.titles) > len(sheet_data.titles):
+            return True
+        if min(rank.get(source, len(rank)) for source in new.labels['archivo']) < rank.get(defining, len(rank)):
+            return True
+    return False
+
+
+def update_dataset(all_sheets_data, other, removed_sources=(), order=None):
+    """
+    Función que actualiza un conjunto de hojas de forma incremental: elimina las filas de los
+    archivos `removed_sources`, incorpora las hojas de `other` (los archivos nuevos o
+    modificados) y, si se indica `order`, ordena según ese orden de archivos las filas de las
+    hojas modificadas y las hojas por su primer archivo. Las hojas que quedan sin filas se
+    eliminan. Devuelve el conjunto de hojas modificadas, incluidas las eliminadas.
+
+    El resultado es igual al de procesar todos los archivos de nuevo salvo en los casos que
+    detecta `requires_rebuild`.
+    """
+    changed = set()
+    if removed_sources:
+        for sheet, sheet_data in all_sheets_data.items():
+            if sheet_data.drop_sources(removed_sources):
+                changed.add(sheet)
+    merge_datasets(all_sheets_data, other)
+    changed.update(other)
+
+    for sheet in changed:
+        if not len(all_sheets_data[sheet]):
+            del all_sheets_data[sheet]
+        elif order is not None:
+            all_sheets_data[sheet].order_by_sources(order)
+
+    if order is not None:
+        # Las hojas quedan en el orden en que aparecen al recorrer los archivos
+        rank = {source: index for index, source in enumerate(order)}
+        sheets = sorted(all_sheets_data.items(),
+                        key=lambda item: rank.get(item[1].labels['archivo'].iloc[0], len(rank)))
+        if [sheet for sheet, _ in sheets] != list(all_sheets_data):
+            all_sheets_data.clear()
+            all_sheets_data.update(sheets)
+    return changed
+
+
+def consolidate(sheet_data, rollups=True):
+    """
+    Función que consolida los valores numéricos de una hoja por periodo en una sola pasada
+    vectorizada: suma por trimestre todas las partes de cada archivo (por ejemplo 'Tercer
+    Trimestre_1' y 'Tercer Trimestre_2') y, si `rollups` es verdadero, agrega los totales
+    por semestre y el total anual. Las celdas vacías se tratan como faltantes: un periodo
+    sin ningún valor en una columna queda vacío en lugar de sumar 0.
+
+    Devuelve un DataFrame con una fila por periodo presente (en orden cronológico) y las
+    mismas columnas que `sheet_data.values`; las columnas no numéricas quedan vacías.
+    """
+    values = sheet_data.values
+    numeric = values.select_dtypes('number')
+    periods = sheet_data.labels['periodo']
+
+    quarters = numeric.groupby(periods.values, observed=True, sort=True).sum(min_count=1)
+    quarters.index = quarters.index.astype(str)
+    frames = [quarters]
+
+    if rollups and len(quarters):
+        semester_keys = quarters.index.map(QUARTER_SEMESTER)
+        semesters = quarters.groupby(semester_keys, sort=False).sum(min_count=1)
+        annual = quarters.groupby([ANNUAL] * len(quarters)).sum(min_count=1)
+        frames += [semesters, annual]
+
+    result = pd.concat(frames) if len(quarters) else quarters
+    return result.reindex(columns=values.columns)
+
+
+def consolidation_rows(sheet_data, rollups=True):
+    """
+    Función que devuelve la consolidación de una hoja como filas de Python
+    (['Total', valores..., periodo]), con `None` en las celdas vacías.
+    """
+    result = consolidate(sheet_data, rollups)
+    cells = result.astype(object).where(result.notna(), None).values.tolist()
+    return [['Total'] + row + [period] for period, row in zip(result.index, cells)]
+
+
+def consolidate_data(data):
+    """
+    Función que consolida por trimestre una hoja. Acepta un `SheetData` o la forma anterior
+    en listas (títulos seguidos de filas ['Total', valores..., archivo]) y devuelve los
+    títulos seguidos de una fila por trimestre presente.
+    """
+    if isinstance(data, SheetData):
+        return [data.titles] + consolidation_rows(data, rollups=False)
+
+    sheet_data = SheetData([None] * (len(data[1]) - 1) if len(data) > 1 else [])
+    for row in data[1:]:
+        sheet_data.add(row[:-1], row[-1])
+    return [data[0]] + consolidation_rows(sheet_data, rollups=False)
@@ -0,0 +1,168 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from catalog import FileCatalog
+from dataset import PERIOD_DTYPE, QUARTER_SEMESTER, ANNUAL, add_extract, consolidate
+from parse_cache import cached_extract_workbook
+from run_log import log_message, log_queue, init_worker_logging
+from xlsx_writer import create_workbook, write_sheet, WRAPPED_STYLE
+
+# Niveles del índice del conjunto distrital
+KEYS = ['despacho', 'año', 'periodo']
+
+# Un fragmento es la carpeta de un despacho y un año: <raíz>/<despacho>/<año>/
+Shard = namedtuple('Shard', ['court', 'year', 'files'])
+
+# Resultado de `process_shard`: por hoja, los títulos y los totales por trimestre del fragmento
+ShardResult = namedtuple('ShardResult', ['court', 'year', 'sheets', 'errors', 'files'])
+
+
+def find_shards(roots):
+    """
+    Función que recorre árboles de carpetas <raíz>/<despacho>/<año>/ y devuelve un `Shard`
+    por cada carpeta de año que contiene archivos trimestrales, ordenados por despacho y año.
+    Las carpetas se recorren una sola vez con `FileCatalog`.
+    """
+    catalog = FileCatalog.scan(roots, recursive=True, max_depth=2)
+    return [Shard(court, year, [entry.path for entry in entries]) for court, year, entries in catalog.shards()]
+
+
+def process_shard(shard, cache=None):
+    """
+    Función que procesa un fragmento de forma independiente (fase de mapeo): lee sus
+    archivos, los agrupa por hoja y consolida cada hoja por trimestre sumando sus partes.
+    Devuelve un `ShardResult` con, por hoja, una tupla (títulos, DataFrame con una fila por
+    trimestre). Puede ejecutarse en otro proceso.
+    """
+    log_message(f"Procesando {shard.court} {shard.year}: {len(shard.files)} archivos", stage="fragmento")
+    all_sheets_data = {}
+    errors = []
+    for file in shard.files:
+        try:
+            sheet_results, _ = cached_extract_workbook(file, None, cache)
+        except Exception as e:
+            errors.append((file, str(e)))
+            continue
+        for sheet, extract, error in sheet_results:
+            if error:
+                errors.append((file, f"{sheet}: {error}"))
+            elif extract is not None:
+                add_extract(all_sheets_data, sheet, extract, os.path.basename(file), keep_header=False)
+
+    sheets = {sheet: (data.titles, consolidate(data, rollups=False)) for sheet, data in all_sheets_data.items()}
+    return ShardResult(shard.court, shard.year, sheets, errors, len(shard.files))
+
+
+def map_shards(shards, workers=1, cache=None):
+    """
+    Función que procesa los fragmentos en un pool de procesos y devuelve sus resultados en
+    el orden de `shards`.
+    """
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging,
+                                 initargs=(log_queue(),)) as executor:
+            return list(executor.map(process_shard, shards, [cache] * len(shards)))
+    return [process_shard(shard, cache) for shard in shards]
+
+
+class DistrictData:
+    """
+    Clase que guarda el conjunto distrital reducido: por hoja, los títulos de la fila 20 y
+    un DataFrame indexado por (despacho, año, periodo) con los totales de cada trimestre.
+    Las columnas son las posiciones de las columnas en la hoja, como en `SheetData.values`.
+    """
+
+    def __init__(self):
+        self.titles = {}
+        self.frames = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def sheets(self):
+        return list(self.frames)
+
+    def court_breakdown(self, sheet):
+        """
+        Función que devuelve el total anual de cada despacho en cada año.
+        """
+        frame = self.frames[sheet]
+        return frame.groupby(level=['despacho', 'año'], sort=True).sum(min_count=1)
+
+    def district_rollup(self, sheet):
+        """
+        Función que devuelve los totales del distrito por año: una fila por trimestre
+        presente, los semestres y el total anual, indexadas por (año, periodo).
+        """
+        pieces = {}
+        for year, group in self.frames[sheet].groupby(level='año', sort=True):
+            quarters = group.groupby(level='periodo', observed=True, sort=True).sum(min_count=1)
+            quarters.index = quarters.index.astype(str)
+            semesters = quarters.groupby(quarters.index.map(QUARTER_SEMESTER), sort=False).sum(min_count=1)
+            annual = quarters.groupby([ANNUAL] * len(quarters)).sum(min_count=1)
+            pieces[year] = pd.concat([quarters, semesters, annual])
+        if not pieces:
+            return self.frames[sheet].droplevel('despacho')
+        return pd.concat(pieces, names=['año', 'periodo'])
+
+
+def reduce_shards(shard_results):
+    """
+    Función que combina los resultados de los fragmentos (fase de reducción) en un
+    `DistrictData`. Las hojas con más columnas en algún fragmento conservan todas sus columnas.
+    """
+    district = DistrictData()
+    pieces = {}
+    for result in shard_results:
+        for sheet, (titles, quarters) in result.sheets.items():
+            if len(titles) > len(district.titles.get(sheet, [])):
+                district.titles[sheet] = titles
+            if len(quarters):
+                index = pd.MultiIndex.from_arrays(
+                    [[result.court] * len(quarters), [result.year] * len(quarters),
+                     pd.Categorical(quarters.index, dtype=PERIOD_DTYPE)], names=KEYS)
+                pieces.setdefault(sheet, []).append(quarters.set_axis(index))
+
+    for sheet in district.titles:
+        columns = range(1, len(district.titles[sheet]))
+        frames = [frame.reindex(columns=columns) for frame in pieces.get(sheet, [])]
+        if frames:
+            district.frames[sheet] = pd.concat(frames).sort_index()
+        else:
+            district.frames[sheet] = pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays(
+                [[], [], pd.Categorical([], dtype=PERIOD_DTYPE)], names=KEYS))
+    return district
+
+
+def _frame_rows(frame):
+    """
+    Función que devuelve las filas de un DataFrame indexado como listas de Python: los
+    niveles del índice seguidos de los valores, con `None` en las celdas vacías.
+    """
+    cells = frame.astype(object).where(frame.notna(), None).values.tolist()
+    return [[str(value) for value in (key if isinstance(key, tuple) else (key,))] + row
+            for key, row in zip(frame.index, cells)]
+
+
+def write_district_workbook(district, path):
+    """
+    Función que escribe el consolidado distrital: por hoja, el detalle por despacho, año y
+    trimestre, los totales del distrito por trimestre y por año y el total anual de cada
+    despacho.
+    """
+    workbook = create_workbook()
+    for sheet in district.sheets():
+        titles = district.titles[sheet][1:]
+        frame = district.frames[sheet]
+        rows = [["Detalle por despacho"], ["Despacho", "Año", "Periodo"] + titles]
+        rows += _frame_rows(frame)
+        rows += [[], ["Total del distrito"], ["Año", "Periodo"] + titles]
+        rows += _frame_rows(district.district_rollup(sheet))
+        rows += [[], ["Total anual por despacho"], ["Despacho", "Año"] + titles]
+        rows += _frame_rows(district.court_breakdown(sheet))
+        write_sheet(workbook, sheet, rows, style=WRAPPED_STYLE)
+    workbook.save(path)
+    return path
@@ -0,0 +1,195 @@
+import os
+from collections import namedtuple
+from datetime import time
+from io import BytesIO
+import pandas as pd
+import xlrd
+from xlrd import xldate
+
+from templates import TemplateRegistry
+
+# Número de filas del encabezado del formulario SIERJU; la fila siguiente contiene los títulos
+HEADER_ROWS = 19
+
+SheetExtract = namedtuple('SheetExtract', ['header_rows', 'row_20_titles', 'total_row_values'])
+
+
+class WorkbookReader(pd.ExcelFile):
+    """
+    Libro de Excel que se abre una sola vez y desde el cual se leen todas sus hojas.
+
+    Los archivos .xls se abren con xlrd en modo `on_demand`, de forma que cada hoja se
+    carga solo al leerla y puede descargarse con `release_sheet`. Los archivos .xlsx se
+    abren con openpyxl en modo de solo lectura. Como hereda de `pd.ExcelFile`, puede
+    pasarse directamente a `pd.read_excel`.
+    """
+
+    def __init__(self, source, file_name=None):
+        if file_name is None and isinstance(source, (str, os.PathLike)):
+            file_name = os.path.basename(source)
+        self.file_name = file_name or ''
+
+        if isinstance(source, (bytes, bytearray)):
+            source = BytesIO(source)
+
+        if self.file_name.lower().endswith('.xls'):
+            if hasattr(source, 'read'):
+                book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+            else:
+                book = xlrd.open_workbook(os.fspath(source), on_demand=True)
+            super().__init__(book, engine='xlrd')
+        else:
+            super().__init__(source, engine='openpyxl')
+
+
+def open_workbook(source, file_name=None):
+    """
+    Función que abre un libro de Excel una única vez para leer todas sus hojas.
+    """
+    return WorkbookReader(source, file_name)
+
+
+def release_sheet(xls, sheet_name):
+    """
+    Función que descarga de memoria una hoja ya procesada de un libro xlrd abierto en
+    modo `on_demand`. Para cualquier otro lector no hace nada.
+    """
+    book = getattr(xls, 'book', None)
+    if isinstance(book, xlrd.Book) and book.on_demand and book.sheet_loaded(sheet_name):
+        book.unload_sheet(sheet_name)
+
+
+def extract_sheet(xls, sheet_name):
+    """
+    Función que extrae de una hoja solo lo que se utiliza: las 19 filas de encabezado, los
+    títulos de la fila 20 y la primera fila cuya columna A es 'Total'.
+
+    Las filas se leen en orden y la lectura se detiene en cuanto se tienen el encabezado y la
+    fila 'Total'. Las hojas que no cumplen las condiciones (menos de 20 filas o sin fila
+    'Total') se descartan revisando únicamente la columna A. Devuelve un `SheetExtract` o
+    `None` si la hoja no cumple.
+    """
+    book = getattr(xls, 'book', None)
+    if isinstance(book, xlrd.Book):
+        return _extract_xlrd_sheet(book, sheet_name)
+    return _extract_openpyxl_sheet(book[sheet_name])
+
+
+def _build_extract(first_rows, total_row):
+    header_rows = first_rows[:HEADER_ROWS]
+    row_20_titles = [''] + first_rows[HEADER_ROWS][1:]
+    total_row_values = ['Total'] + total_row[1:]
+    return SheetExtract(header_rows, row_20_titles, total_row_values)
+
+
+def _xlrd_cell_value(value, cell_type, datemode):
+    """
+    Función que convierte el contenido de una celda xlrd igual que pandas, pero dejando las
+    celdas vacías y los errores como `None`.
+    """
+    if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+        return None
+    if cell_type == xlrd.XL_CELL_NUMBER:
+        return int(value) if value == int(value) else value
+    if cell_type == xlrd.XL_CELL_BOOLEAN:
+        return bool(value)
+    if cell_type == xlrd.XL_CELL_DATE:
+        try:
+            value = xldate.xldate_as_datetime(value, datemode)
+        except OverflowError:
+            return value
+        # Excel no distingue fechas de horas: las fechas en la época se tratan como horas
+        if value.timetuple()[0:3] in ((1899, 12, 31), (1904, 1, 1)):
+            return time(value.hour, value.minute, value.second, value.microsecond)
+        return value
+    return value if value != '' else None
+
+
+def _extract_xlrd_sheet(book, sheet_name):
+    sheet = book.sheet_by_name(sheet_name)
+    if sheet.nrows < HEADER_ROWS + 1:
+        return None
+
+    try:
+        total_row_index = sheet.col_values(0).index('Total')
+    except ValueError:
+        return None
+
+    def row(index):
+        return [_xlrd_cell_value(value, cell_type, book.datemode)
+                for value, cell_type in zip(sheet.row_values(index), sheet.row_types(index))]
+
+    first_rows = [row(i) for i in range(HEADER_ROWS + 1)]
+    total_row = first_rows[total_row_index] if total_row_index <= HEADER_ROWS else row(total_row_index)
+    return _build_extract(first_rows, total_row)
+
+
+def _openpyxl_cell_value(cell):
+    if cell.data_type == 'e':
+        return None
+    value = cell.value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if value == '':
+        return None
+    return value
+
+
+def _extract_openpyxl_sheet(ws):
+    first_rows = []
+    total_row = None
+
+    for cells in ws.iter_rows():
+        if len(first_rows) <= HEADER_ROWS:
+            values = [_openpyxl_cell_value(cell) for cell in cells]
+            first_rows.append(values)
+            if total_row is None and values and values[0] == 'Total':
+                total_row = values
+        elif cells and cells[0].value == 'Total':
+            total_row = [_openpyxl_cell_value(cell) for cell in cells]
+
+        if total_row is not None and len(first_rows) > HEADER_ROWS:
+            break
+
+    if total_row is None or len(first_rows) <= HEADER_ROWS:
+        return None
+
+    # Igual que pandas, todas las filas se completan hasta el mismo ancho
+    width = max(len(values) for values in first_rows + [total_row])
+    first_rows = [values + [None] * (width - len(values)) for values in first_rows]
+    total_row = total_row + [None] * (width - len(total_row))
+    return _build_extract(first_rows, total_row)
+
+
+def iter_workbook(source, file_name=None):
+    """
+    Función que abre un libro una sola vez y entrega, a medida que se extrae cada hoja con
+    `extract_sheet`, tuplas (hoja, extracto o None, mensaje de error o None). El libro se
+    cierra al terminar o al cerrar el generador.
+
+    Las filas de encabezado iguales entre hojas se comparten (ver `TemplateRegistry`), de
+    modo que los resultados se serializan con cada fila repetida una sola vez al guardarlos
+    en la caché o al devolverlos desde otro proceso.
+    """
+    templates = TemplateRegistry()
+    with open_workbook(source, file_name) as xls:
+        for sheet_name in xls.sheet_names:
+            try:
+                extract, error = extract_sheet(xls, sheet_name), None
+                if extract is not None:
+                    template = templates.intern(extract.header_rows, extract.row_20_titles)
+                    extract = extract._replace(header_rows=template.header_rows, row_20_titles=template.titles)
+            except Exception as e:
+                extract, error = None, str(e)
+            finally:
+                release_sheet(xls, sheet_name)
+            yield sheet_name, extract, error
+
+
+def extract_workbook(source, file_name=None):
+    """
+    Función que extrae todas las hojas de un libro con `iter_workbook` y devuelve la lista
+    de tuplas (hoja, extracto o None, mensaje de error o None). Al ser una función de
+    módulo, puede ejecutarse en un pool de procesos.
+    """
+    return list(iter_workbook(source, file_name))
@@ -0,0 +1,168 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from dataset import QUARTERS, column_names, parse_source_label, parse_year
+
+HISTORY_FILE = 'historial.sqlite'
+
+# Ruta de SQLite para un historial que solo existe en memoria
+MEMORY = ':memory:'
+
+# Debe incrementarse cada vez que cambie el esquema de la base de datos
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS totales (
+    hash TEXT NOT NULL,
+    hoja TEXT NOT NULL,
+    columna INTEGER NOT NULL,
+    titulo TEXT NOT NULL,
+    archivo TEXT NOT NULL,
+    origen TEXT NOT NULL,
+    periodo TEXT,
+    trimestre INTEGER,
+    parte INTEGER NOT NULL,
+    año INTEGER,
+    valor REAL,
+    texto TEXT,
+    actualizado TEXT NOT NULL,
+    PRIMARY KEY (hash, hoja, columna)
+);
+CREATE INDEX IF NOT EXISTS totales_serie ON totales (hoja, titulo, año, trimestre);
+CREATE INDEX IF NOT EXISTS totales_periodo ON totales (año, trimestre);
+CREATE INDEX IF NOT EXISTS totales_archivo ON totales (origen, archivo, año);
+"""
+
+UPSERT = """
+INSERT INTO totales (hash, hoja, columna, titulo, archivo, origen, periodo, trimestre, parte, año, valor, texto,
+                     actualizado)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hash, hoja, columna) DO UPDATE SET
+    titulo = excluded.titulo, archivo = excluded.archivo, origen = excluded.origen, periodo = excluded.periodo,
+    trimestre = excluded.trimestre, parte = excluded.parte, año = excluded.año,
+    valor = excluded.valor, texto = excluded.texto, actualizado = excluded.actualizado
+"""
+
+
+def year_from_path(path):
+    """
+    Función que obtiene el año de un archivo a partir de su ruta, buscando una carpeta o
+    un nombre de archivo con un año de cuatro cifras (por ejemplo '.../2024/Primer
+    Trimestre.xls'). Devuelve None si no lo encuentra.
+    """
+    parts = os.path.normpath(os.path.abspath(path)).split(os.sep)
+    for part in reversed(parts):
+        year = parse_year(part)
+        if year is not None:
+            return year
+    return None
+
+
+class HistoryStore:
+    """
+    Clase que guarda en una base de datos SQLite local la fila 'Total' de cada hoja de cada
+    archivo trimestral procesado, una fila por columna, para comparar trimestres entre años
+    sin volver a leer los libros. Cada archivo se identifica por el SHA-256 de su contenido,
+    por lo que volver a procesarlo actualiza sus filas en lugar de duplicarlas. Con `path`
+    igual a ':memory:' el historial se guarda solo en memoria.
+    """
+
+    def __init__(self, path):
+        if path != MEMORY:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f"La base de datos {path} tiene un esquema no compatible (versión {version})")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def upsert_file(self, digest, file_name, sheets, year=None, origin=''):
+        """
+        Función que guarda o actualiza las filas 'Total' de un archivo. `sheets` es un iterable
+        de tuplas (hoja, títulos de la fila 20, valores de la fila 'Total'); `origin` identifica
+        la carpeta o el despacho del archivo. Una versión anterior del mismo archivo (mismo
+        nombre, origen y año, con otro contenido) se reemplaza para no sumarla dos veces.
+        Devuelve el número de celdas guardadas.
+        """
+        period, part = parse_source_label(file_name)
+        quarter = QUARTERS.index(period) + 1 if period else None
+        updated = datetime.now().isoformat(timespec='seconds')
+        rows = []
+        for sheet, titles, total_row_values in sheets:
+            names = column_names(titles)
+            for position in range(1, len(titles)):
+                value = total_row_values[position] if position < len(total_row_values) else None
+                number = value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+                text = str(value) if value is not None and number is None else None
+                rows.append((digest, sheet, position, names[position], file_name, origin, period, quarter, part,
+                             year, number, text, updated))
+        with self.connection:
+            self.connection.execute("DELETE FROM totales WHERE origen = ? AND archivo = ? AND año IS ? AND hash != ?",
+                                    (origin, file_name, year, digest))
+            self.connection.executemany(UPSERT, rows)
+        return len(rows)
+
+    def has_file(self, digest):
+        """
+        Función que indica si ya hay filas guardadas para el contenido `digest`.
+        """
+        return self.connection.execute("SELECT 1 FROM totales WHERE hash = ? LIMIT 1", (digest,)).fetchone() is not None
+
+    def years(self):
+        """
+        Función que devuelve los años con datos guardados, en orden.
+        """
+        return [row[0] for row in self.connection.execute(
+            "SELECT DISTINCT año FROM totales WHERE año IS NOT NULL ORDER BY año")]
+
+    def sheets(self):
+        """
+        Función que devuelve las hojas con datos guardados, en orden alfabético.
+        """
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT hoja FROM totales ORDER BY hoja")]
+
+    def titles(self, sheet):
+        """
+        Función que devuelve los títulos de columna guardados para una hoja, en el orden de
+        las columnas.
+        """
+        return [row[0] for row in self.connection.execute(
+            "SELECT titulo FROM totales WHERE hoja = ? GROUP BY titulo ORDER BY MIN(columna)", (sheet,))]
+
+    def series(self, sheet, title):
+        """
+        Función que devuelve la serie de tiempo de una columna de una hoja: un DataFrame con
+        una fila por año y trimestre (columnas 'año', 'periodo' y 'valor') en orden
+        cronológico, sumando las partes de cada trimestre.
+        """
+        frame = pd.read_sql_query(
+            "SELECT año, trimestre, SUM(valor) AS valor FROM totales "
+            "WHERE hoja = ? AND titulo = ? AND trimestre IS NOT NULL "
+            "GROUP BY año, trimestre ORDER BY año, trimestre",
+            self.connection, params=(sheet, title))
+        frame.insert(1, 'periodo', [QUARTERS[quarter - 1] for quarter in frame.pop('trimestre')])
+        return frame
+
+    def compare(self, sheet, title):
+        """
+        Función que devuelve una tabla de comparación de una columna: una fila por trimestre
+        y una columna por año.
+        """
+        series = self.series(sheet, title)
+        table = series.pivot(index='periodo', columns='año', values='valor')
+        return table.reindex([quarter for quarter in QUARTERS if quarter in table.index])
@@ -0,0 +1,140 @@
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from excel_reader import iter_workbook
+from parse_cache import cached_extract_workbook, file_digest
+from run_report import timed_call
+
+# Resultado de una hoja, entregado apenas se extrae
+SheetResult = namedtuple('SheetResult', ['file', 'sheet', 'extract', 'error'])
+
+# Resultado de un libro, entregado después de sus hojas; `sheet_results` son las tuplas
+# (hoja, extracto, error) del libro y `seconds` el tiempo de lectura
+WorkbookResult = namedtuple('WorkbookResult', ['file', 'sheet_results', 'error', 'cache_hit', 'seconds'])
+
+_END = object()
+
+
+def _cancelled(cancel):
+    return cancel is not None and cancel.is_set()
+
+
+def ordered_map(function, items, workers=1, cancel=None, initializer=None, initargs=(), window=None):
+    """
+    Función que aplica `function` a cada elemento de `items` y entrega, a medida que
+    terminan y en el orden de `items`, tuplas (elemento, resultado, excepción o None).
+
+    Con `workers` > 1 las llamadas se ejecutan en un pool de procesos con a lo sumo `window`
+    tareas en curso (por defecto el doble de `workers`), de modo que los resultados no se
+    acumulan en memoria si se consumen a medida que llegan. No se inician más tareas en
+    cuanto `cancel` (un `threading.Event`) está activo o se cierra el generador; las tareas
+    pendientes se cancelan.
+    """
+    items = iter(items)
+    if workers <= 1:
+        for item in items:
+            if _cancelled(cancel):
+                return
+            try:
+                result, error = function(item), None
+            except Exception as e:
+                result, error = None, e
+            yield item, result, error
+        return
+
+    window = window or 2 * workers
+    pending = deque()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs)
+    try:
+        while True:
+            while len(pending) < window and not _cancelled(cancel):
+                item = next(items, _END)
+                if item is _END:
+                    break
+                pending.append((item, executor.submit(function, item)))
+            if not pending or _cancelled(cancel):
+                return
+            item, future = pending.popleft()
+            try:
+                result, error = future.result(), None
+            except Exception as e:
+                result, error = None, e
+            yield item, result, error
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _read_workbook(item, cache=None):
+    name, source = item
+    return timed_call(cached_extract_workbook, source, name, cache)
+
+
+def _stream_workbook(name, source, cache, cancel):
+    """
+    Función que lee un libro en el proceso actual y entrega cada hoja apenas se extrae,
+    seguida del resultado del libro. Los extractos se guardan en la caché solo si se leyó
+    el libro completo.
+    """
+    seconds = 0.0
+    started = time.perf_counter()
+    sheet_results = []
+    cached = None
+    sheets = None
+    try:
+        digest = file_digest(source) if cache is not None else None
+        cached = cache.get(digest) if digest is not None else None
+        sheets = iter(cached) if cached is not None else iter_workbook(source, name)
+        for sheet, extract, error in sheets:
+            sheet_results.append((sheet, extract, error))
+            # El tiempo de lectura no incluye lo que tarda quien consume los resultados
+            seconds += time.perf_counter() - started
+            yield SheetResult(name, sheet, extract, error)
+            started = time.perf_counter()
+            if _cancelled(cancel):
+                return
+        if cached is None and digest is not None:
+            try:
+                cache.put(digest, sheet_results)
+            except OSError:
+                pass
+    except Exception as e:
+        seconds += time.perf_counter() - started
+        yield WorkbookResult(name, sheet_results, str(e), False, seconds)
+        return
+    finally:
+        if hasattr(sheets, 'close'):
+            sheets.close()
+    seconds += time.perf_counter() - started
+    yield WorkbookResult(name, sheet_results, None, cached is not None, seconds)
+
+
+def stream_workbooks(sources, workers=1, cache=None, cancel=None):
+    """
+    Función que lee los libros de `sources`, pares (nombre, ruta o contenido en bytes), y
+    entrega sus resultados a medida que se extraen y en el orden recibido: un `SheetResult`
+    por hoja y, después de las hojas de cada libro, un `WorkbookResult`. Los libros que no
+    se pueden leer solo entregan su `WorkbookResult`, con el error.
+
+    Con `workers` igual a 1 cada hoja se entrega apenas se lee; con más, los libros se leen
+    en paralelo en un pool de procesos y sus hojas se entregan al terminar cada libro. Los
+    libros cuyo contenido está en la caché (`cache`) no se vuelven a leer. La lectura se
+    detiene en cuanto `cancel` (un `threading.Event`) está activo o se cierra el generador.
+    """
+    if workers <= 1:
+        for name, source in sources:
+            if _cancelled(cancel):
+                return
+            yield from _stream_workbook(name, source, cache, cancel)
+        return
+
+    read = partial(_read_workbook, cache=cache)
+    for (name, source), value, error in ordered_map(read, sources, workers, cancel):
+        if error is not None:
+            yield WorkbookResult(name, [], str(error), False, 0.0)
+            continue
+        (sheet_results, cache_hit), seconds = value
+        for sheet, extract, sheet_error in sheet_results:
+            yield SheetResult(name, sheet, extract, sheet_error)
+        yield WorkbookResult(name, sheet_results, None, cache_hit, seconds)
@@ -1,21 +1,53 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.express as px
 from pathlib import Path
-import tempfile
 import os
-import openpyxl
-from openpyxl.styles import Alignment, Border, Side
 import base64
+import hashlib
+import pickle
 from io import BytesIO
-import re
 import requests
-import glob
-from datetime import datetime
-from openpyxl.utils.dataframe import dataframe_to_rows
 import warnings
-
+import logging
+import json
+from contextlib import closing
+from parse_cache import ParseCache
+from dataset import (SheetData, add_extract, compact_dataset, consolidation_rows, dataset_dict, parse_year,
+                     requires_rebuild, update_dataset)
+from xlsx_writer import create_workbook, write_sheet
+from run_log import log_message, start_logging
+from run_report import RunReport, MemoryBudget, MemoryBudgetExceeded
+from snapshot import SNAPSHOT_FILE, snapshot_available, save_snapshot, load_snapshot
+from parse_cache import file_digest
+from history import MEMORY, HistoryStore
+from catalog import FileCatalog
+from templates import TemplateRegistry
+from ingest import SheetResult, stream_workbooks
+from charts import downsample, file_frame, trend_frame, trend_long
+
+
+def app_data_dir():
+    """
+    Devuelve la carpeta de datos de la aplicación del usuario que ejecuta el servidor
+    (%LOCALAPPDATA% en Windows, $XDG_CACHE_HOME o ~/.cache en los demás sistemas), en lugar
+    de la carpeta temporal compartida por todos los usuarios del equipo.
+    """
+    base = os.environ.get("LOCALAPPDATA") if os.name == "nt" else os.environ.get("XDG_CACHE_HOME")
+    return os.path.join(base or os.path.join(os.path.expanduser("~"), ".cache"), "AnalizadorEstadisticoJudicial")
+
+# Caché de archivos ya leídos, direccionada por el contenido de cada archivo; `ParseCache`
+# crea la carpeta solo para el usuario del servidor
+PARSE_CACHE_DIR = os.path.join(app_data_dir(), "cache")
+
+# Límite opcional de memoria residente del servidor en MB, común a todas las sesiones porque
+# comparten el proceso (incluye la de Streamlit). Solo se aplica si se define la variable de
+# entorno ANALIZADOR_MEMORY_BUDGET_MB; sin ella la memoria solo se mide
+MEMORY_BUDGET_MB = int(os.environ.get("ANALIZADOR_MEMORY_BUDGET_MB") or 0) or None
+
+# Filas por página de la tabla del resumen y filas por hoja de la vista previa de los datos en bruto
+PAGE_SIZE = 50
+RAW_PREVIEW_ROWS = 20
 
 # Configuración de la página
 st.set_page_config(page_title="AnalizadorEstadisticoJudicial", page_icon="📊", layout="wide")
@@ -65,103 +97,272 @@ def get_binary_file_downloader_html(bin_file, file_label='File'):
     href = f'<a href="data:application/octet-stream;base64,{bin_str}" download="{os.path.basename(bin_file)}" class="btn-download">Descargar {file_label}</a>'
     return href
 
-def sort_key_func(file_name):
-    order = ["Primer", "Segundo", "Tercer", "Cuarto"]
-    match = re.match(r"(\w+ Trimestre)(_?(\d)?)", file_name)
-    if match:
-        name, _, number = match.groups()
-        return (order.index(name.split(' ')[0]), int(number) if number else 0)
-    return (0, 0)
-
-def sorted_files(files):
-    return sorted(files, key=lambda x: sort_key_func(Path(x).name))
-
-def log_message(message, add_space=False):
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_entry = f"[{timestamp}] {message}"
-    with open("log.txt", "a") as log_file:
-        if add_space:
-            log_file.write("\n")
-        log_file.write(log_entry + "\n")
-
-def process_excel_files(excel_files, subfolder):
+def process_excel_files(uploads, workers=None, cache=None, report=None, history=None, year=None, digests=None,
+                        budget=None, errors=None, low_memory=False):
+    """
+    Procesa los archivos cargados, dados como pares (nombre, contenido en bytes), sin
+    escribirlos en disco: cada libro se lee directamente desde su contenido en memoria.
+    Los archivos se procesan en paralelo en un pool de procesos, con una única barra de
+    progreso, y los resultados se combinan en el orden recibido para que sean deterministas.
+    Los archivos cuyo contenido ya está en la caché no se vuelven a leer. Si se indica
+    `report`, se registra el tiempo de lectura de cada archivo, y si se indica `history`
+    (un `HistoryStore`), las filas 'Total' de cada archivo se guardan en el historial con
+    el año de su nombre o, si no lo tiene, el año `year`; los archivos sin año no se
+    guardan. `digests` puede dar el SHA-256 ya calculado de cada archivo. Si se indica
+    `errors`, se le agregan las tuplas (archivo, error) de los archivos que no se pudieron
+    leer. Los encabezados iguales entre hojas y archivos se guardan una sola vez.
+
+    Es una capa sobre `ingest.stream_workbooks`: cada hoja se incorpora apenas llega y la
+    barra de progreso avanza con cada archivo. Si Streamlit interrumpe la ejecución (por
+    ejemplo, al pulsar "Cancelar"), el flujo se cierra y las lecturas pendientes se cancelan.
+
+    Si se indica `budget` (un `MemoryBudget`), antes de leer cada archivo se comprueba que la
+    memoria en uso más la estimada para leerlo según su tamaño no supera el límite,
+    compactando los datos si hace falta, y se lanza `MemoryBudgetExceeded` si aun así no
+    alcanza. Con `low_memory` los archivos se leen en un solo proceso y los datos se
+    compactan al terminar.
+    """
+    if cache is None:
+        cache = ParseCache(PARSE_CACHE_DIR)
+    if report is None:
+        report = RunReport()
     all_sheets_data = {}
-    for file in excel_files:
-        file_path = Path(file)
-        st.info(f"Procesando archivo: {file_path.name}")
-        try:
-            if file_path.suffix.lower() == '.xls':
-                xls = pd.ExcelFile(file, engine='xlrd')
+    templates = TemplateRegistry()
+    contents = dict(uploads)
+    cache_hits = 0
+    done = 0
+    summary = []
+    without_year = []
+    progress = st.progress(0.0, text="Procesando archivos...")
+
+    workers = 1 if low_memory else min(workers or os.cpu_count() or 1, len(uploads))
+    sources = uploads
+    if budget is not None:
+        sources = budget.guard(uploads, lambda upload: len(upload[1]), lambda: compact_dataset(all_sheets_data))
+    with closing(stream_workbooks(sources, workers=workers, cache=cache)) as stream:
+        for result in stream:
+            file_name = Path(result.file).name
+            if isinstance(result, SheetResult):
+                process_sheet(file_name, result.sheet, result.extract, result.error, all_sheets_data, summary,
+                              templates)
+                continue
+
+            done += 1
+            if result.error:
+                summary.append((file_name, "-", f"Error al procesar el archivo: {result.error}"))
+                log_message(f"Error al procesar {file_name}: {result.error}", logging.ERROR,
+                            file=file_name, stage="lectura")
+                if errors is not None:
+                    errors.append((result.file, result.error))
             else:
-                xls = pd.ExcelFile(file, engine='openpyxl')
-            
-            process_file(xls, file_path, all_sheets_data)
-        except Exception as e:
-            st.warning(f"Error al procesar {file_path.name}: {str(e)}")
-            log_message(f"Error al procesar {file_path.name}: {str(e)}")
+                cache_hits += result.cache_hit
+                rows = sum(len(extract.header_rows) + 2 for _, extract, _ in result.sheet_results
+                           if extract is not None)
+                report.record("cache" if result.cache_hit else "extraccion", result.seconds,
+                              file=file_name, rows=rows)
+                file_year = parse_year(file_name) or year
+                if history is not None and file_year is None:
+                    without_year.append(file_name)
+                elif history is not None:
+                    digest = digests[result.file] if digests and result.file in digests else None
+                    record_history(history, file_name, contents[result.file], result.sheet_results, file_year,
+                                   report, digest)
+            progress.progress(done / len(uploads), text=f"Procesado {file_name} ({done}/{len(uploads)})")
+
+    log_message(f"Caché de archivos: {cache_hits} aciertos, {done - cache_hits} fallos", stage="cache")
+    if low_memory:
+        compact_dataset(all_sheets_data)
+    progress.empty()
+    if without_year:
+        st.warning(f"No se guardaron en el historial {len(without_year)} archivos sin año en el nombre. "
+                   "Indica el año de los archivos en la barra lateral y vuelve a procesarlos.")
+    st.dataframe(pd.DataFrame(summary, columns=["Archivo", "Hoja", "Resultado"]), hide_index=True)
     return all_sheets_data
 
-def process_file(xls, file_path, all_sheets_data):
-    for sheet_name in xls.sheet_names:
-        try:
-            data = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-            if len(data) >= 20 and 'Total' in data[0].values:
-                if sheet_name not in all_sheets_data:
-                    all_sheets_data[sheet_name] = []
-                
-                # Reemplazar NaN con None para evitar problemas de conversión
-                data = data.replace({np.nan: None})
-                
-                header_rows = data.iloc[:19].values.tolist()
-                row_20_titles = [''] + data.iloc[19, 1:].tolist()
-                total_row_index = data[data[0] == 'Total'].index[0]
-                total_row_values = ['Total'] + data.iloc[total_row_index, 1:].tolist()
-                
-                all_sheets_data[sheet_name].append(header_rows + [row_20_titles, total_row_values + [file_path.name]])
-                
-                st.text(f"Datos procesados para la hoja '{sheet_name}':")
-                st.dataframe(data.head())
-        except Exception as e:
-            st.warning(f"Error al procesar la hoja '{sheet_name}' en {file_path.name}: {str(e)}")
-            log_message(f"Error al procesar la hoja '{sheet_name}' en {file_path.name}: {str(e)}")
+def record_history(history, file_name, content, sheet_results, year=None, report=None, digest=None):
+    """
+    Guarda en el historial las filas 'Total' de un archivo ya leído.
+    """
+    report = report if report is not None else RunReport()
+    try:
+        with report.stage("historial", file=file_name):
+            history.upsert_file(digest or file_digest(content), file_name,
+                                [(sheet, extract.row_20_titles, extract.total_row_values)
+                                 for sheet, extract, _ in sheet_results if extract is not None],
+                                year=year)
+    except Exception as e:
+        log_message(f"No se pudo guardar en el historial {file_name}: {str(e)}", logging.WARNING,
+                    file=file_name, stage="historial")
+
+def process_sheet(file_name, sheet_name, extract, error, all_sheets_data, summary, templates=None):
+    if error:
+        summary.append((file_name, sheet_name, f"Error: {error}"))
+        log_message(f"Error al procesar la hoja '{sheet_name}' en {file_name}: {error}", logging.ERROR,
+                    file=file_name, sheet=sheet_name, stage="hojas")
+    elif extract is None:
+        summary.append((file_name, sheet_name, "No cumple con las condiciones necesarias"))
+    else:
+        add_extract(all_sheets_data, sheet_name, extract, file_name, templates=templates)
+        summary.append((file_name, sheet_name, "Procesada"))
+
+def create_consolidated_file(all_sheets_data, report=None, totals=None, changed=None):
+    """
+    Genera el consolidado en memoria y devuelve su contenido en bytes, listo para
+    `st.download_button`, o None si no se pudo guardar. Si se indica `totals` (un
+    diccionario hoja -> filas de totales que se conserva en la sesión), se reutilizan los
+    totales ya calculados de las hojas que no están en `changed` y se guardan los de las
+    demás. Las filas de cada archivo no se guardan: se convierten de nuevo desde los datos.
+    """
+    if report is None:
+        report = RunReport()
+    if totals is None:
+        totals = {}
+    for sheet in list(totals):
+        if sheet not in all_sheets_data or (changed is not None and sheet in changed):
+            del totals[sheet]
+    consolidated_writer = create_workbook()
 
-    st.success(f"Archivo {file_path.name} procesado con éxito.")
+    for sheet, data in all_sheets_data.items():
+        with report.stage("consolidacion_hoja", sheet=sheet):
+            # El encabezado se escribe una sola vez, seguido de los títulos y una fila por archivo;
+            # los valores se escriben con su tipo (las celdas vacías llegan como None)
+            rows = (data.header_rows or []) + [data.titles] + data.rows()
 
-def create_consolidated_file(all_sheets_data, subfolder):
-    consolidated_writer = openpyxl.Workbook()
-    consolidated_writer.remove(consolidated_writer.active)
+            # Totales por trimestre (sumando las partes), por semestre y anual
+            if sheet not in totals:
+                totals[sheet] = consolidation_rows(data)
+            if totals[sheet]:
+                rows += [[], data.titles] + totals[sheet]
 
-    for sheet, data in all_sheets_data.items():
-        ws = consolidated_writer.create_sheet(title=sheet)
-        
-        for row_data in data:
-            for row in row_data:
-                # Convertir elementos a string para evitar problemas con NaN
-                ws.append([str(cell) if cell is not None else '' for cell in row])
+        with report.stage("escritura_consolidado", sheet=sheet):
+            write_sheet(consolidated_writer, sheet, rows)
 
-    consolidated_file = os.path.join(subfolder, 'Consolidado.xlsx')
     try:
-        consolidated_writer.save(consolidated_file)
-        st.success(f"Archivo consolidado creado exitosamente en {consolidated_file}.")
-        return consolidated_file
+        buffer = BytesIO()
+        with report.stage("guardado_consolidado"):
+            consolidated_writer.save(buffer)
+        st.success("Archivo consolidado creado exitosamente.")
+        return buffer.getvalue()
     except Exception as e:
         st.error(f"Error al guardar el archivo consolidado: {str(e)}")
-        log_message(f"Error al guardar el archivo consolidado: {str(e)}")
+        log_message(f"Error al guardar el archivo consolidado: {str(e)}", logging.ERROR, stage="consolidado")
         return None
 
-def consolidate_data(data):
-    consolidated_data = [data[0]]
-    trimesters = ["Primer Trimestre", "Segundo Trimestre", "Tercer Trimestre", "Cuarto Trimestre"]
-
-    for trimester in trimesters:
-        rows = [row for row in data[1:] if trimester in row[-1]]
-        if rows:
-            consolidated_row = ['Total'] + [sum(row[i] for row in rows) for i in range(1, len(rows[0]) - 1)] + [trimester]
-            consolidated_data.append(consolidated_row)
+def create_snapshot_file(all_sheets_data, report=None):
+    """
+    Genera en memoria la instantánea Arrow de los datos procesados, para descargarla y
+    volver a cargarla más tarde sin procesar de nuevo los archivos de Excel.
+    """
+    if not snapshot_available():
+        return None
+    if report is None:
+        report = RunReport()
+    try:
+        buffer = BytesIO()
+        with report.stage("guardado_instantanea"):
+            save_snapshot(all_sheets_data, buffer)
+        return buffer.getvalue()
+    except Exception as e:
+        log_message(f"Error al guardar la instantánea de los datos: {str(e)}", logging.ERROR, stage="instantanea")
+        return None
 
-    return consolidated_data
+def cancel_processing():
+    st.session_state.processing_cancelled = True
+    log_message("Procesamiento cancelado por el usuario", stage="lectura")
+
+def process_uploads(uploads, report, history=None, year=None, budget=None, low_memory=False):
+    """
+    Procesa solo los archivos nuevos o modificados desde el último procesamiento de la
+    sesión, comparando el SHA-256 de su contenido con el guardado en `file_hashes`, y
+    actualiza los datos de la sesión: se eliminan las filas de los archivos modificados o
+    quitados y se agregan las de los archivos leídos. Devuelve el conjunto de hojas
+    modificadas (vacío si ningún archivo cambió). Si cambió el año `year`, los archivos
+    sin año en el nombre también se vuelven a procesar, para guardarlos en el historial con
+    el nuevo año. Si el resultado incremental no sería igual al de procesar todo de nuevo
+    (ver `dataset.requires_rebuild`), se procesan todos los archivos. Los archivos que no se
+    pudieron leer no se registran en `file_hashes`, para volver a intentarlos. `budget` y
+    `low_memory` se pasan a `process_excel_files`; con `low_memory` los datos de la sesión
+    quedan compactados.
+    """
+    with report.stage("huellas"):
+        digests = {name: file_digest(content) for name, content in uploads}
+    previous = st.session_state.file_hashes
+    all_sheets_data = st.session_state.all_sheets_data
+    if previous is None or not all_sheets_data:
+        previous, all_sheets_data = {}, {}
+
+    year_changed = history is not None and year != st.session_state.history_year
+
+    def stale(name):
+        return digests.get(name) != previous.get(name) or (year_changed and parse_year(name) is None)
+
+    pending = [(name, content) for name, content in uploads if stale(name)]
+    removed = [name for name in previous if stale(name)]
+    if not pending and not removed:
+        st.info("Los archivos no han cambiado desde el último procesamiento.")
+        return set()
+    if previous:
+        st.info(f"Archivos nuevos o modificados: {len(pending)}; sin cambios: {len(uploads) - len(pending)}; "
+                f"quitados: {len([name for name in removed if name not in digests])}.")
+
+    errors = []
+    order = [name for name, _ in uploads]
+    new_data = process_excel_files(pending, report=report, history=history, year=year, digests=digests,
+                                   budget=budget, errors=errors, low_memory=low_memory) if pending else {}
+    if all_sheets_data and requires_rebuild(all_sheets_data, new_data, removed, order):
+        # Cambió el archivo del que alguna hoja toma sus títulos: se procesa todo de nuevo
+        # (los archivos sin cambios se leen desde la caché)
+        st.info("Los títulos de alguna hoja cambiaron; se procesan de nuevo todos los archivos.")
+        errors = []
+        new_data = process_excel_files(uploads, report=report, digests=digests, budget=budget, errors=errors,
+                                       low_memory=low_memory)
+        changed = set(all_sheets_data) | set(new_data)
+        all_sheets_data = new_data
+    else:
+        with report.stage("actualizacion"):
+            changed = update_dataset(all_sheets_data, new_data, removed, order=order)
+    if low_memory:
+        with report.stage("compactacion"):
+            compact_dataset(all_sheets_data)
+    if budget is not None:
+        budget.measure()
+    st.session_state.all_sheets_data = all_sheets_data
+    # Los archivos que no se pudieron leer se vuelven a intentar en el siguiente procesamiento
+    failed = {name for name, _ in errors}
+    st.session_state.file_hashes = {name: digest for name, digest in digests.items() if name not in failed}
+    if history is not None:
+        st.session_state.history_year = year
+    return changed
+
+def load_snapshot_upload(snapshot_upload):
+    """
+    Carga una instantánea subida por el usuario en lugar de procesar los archivos de Excel.
+    La instantánea se lee sin copiarla desde el contenido que ya tiene Streamlit en memoria.
+    """
+    report = RunReport()
+    try:
+        with report.stage("carga_instantanea", file=snapshot_upload.name):
+            all_sheets_data = load_snapshot(snapshot_upload.getvalue())
+    except Exception as e:
+        st.error(f"No se pudo cargar la instantánea: {str(e)}")
+        log_message(f"Error al cargar la instantánea {snapshot_upload.name}: {str(e)}", logging.ERROR,
+                    file=snapshot_upload.name, stage="instantanea")
+        return
+    st.session_state.all_sheets_data = all_sheets_data
+    st.session_state.dataset_fingerprint = None
+    st.session_state.file_hashes = None
+    st.session_state.consolidated_rows = {}
+    st.session_state.consolidated_file = None
+    st.session_state.snapshot_file = snapshot_upload.getvalue()
+    st.session_state.run_report = report.summary()
+    st.session_state.files_processed = True
+    st.success("Instantánea cargada con éxito!")
 
 def main():
+    # Registro en segundo plano en log.txt; Streamlit vuelve a ejecutar el script en cada
+    # interacción, pero el registro solo se inicia una vez por proceso
+    start_logging()
+
     st.title("AnalizadorEstadisticoJudicial 📊")
 
     st.write("""
@@ -179,7 +380,22 @@ def main():
     if 'consolidated_file' not in st.session_state:
         st.session_state.consolidated_file = None
     if 'files_processed' not in st.session_state:
-        st.session_state.files_processed = False    
+        st.session_state.files_processed = False
+    if 'dataset_fingerprint' not in st.session_state:
+        st.session_state.dataset_fingerprint = None
+    if 'run_report' not in st.session_state:
+        st.session_state.run_report = None
+    if 'snapshot_file' not in st.session_state:
+        st.session_state.snapshot_file = None
+    if 'file_hashes' not in st.session_state:
+        # SHA-256 de cada archivo cargado en el último procesamiento, para procesar solo los cambios
+        st.session_state.file_hashes = None
+    if 'consolidated_rows' not in st.session_state:
+        # Filas de totales del consolidado por hoja, para no recalcular las hojas sin cambios
+        st.session_state.consolidated_rows = {}
+    if 'history_year' not in st.session_state:
+        # Año con el que se guardaron en el historial los archivos sin año en el nombre
+        st.session_state.history_year = None
     
     show_sidebar_resources()
     
@@ -187,6 +403,14 @@ def main():
         st.header("Carga de Archivos")
         uploaded_files = st.file_uploader("Carga tus archivos Excel trimestrales", 
                                           accept_multiple_files=True, type=['xls', 'xlsx'])
+        files_year = st.number_input("Año de los archivos", min_value=2000, max_value=2100, value=None, step=1,
+                                     placeholder="Tomado del nombre de cada archivo",
+                                     help="Se usa para guardar en el historial los totales de los archivos sin año "
+                                          "en el nombre (por ejemplo 'Primer Trimestre 2024.xls') y compararlos "
+                                          "entre años.")
+        low_memory = st.checkbox("Modo de memoria reducida",
+                                 help="Lee los archivos en un solo proceso y guarda los datos con los tipos más "
+                                      "pequeños que no pierden información. Útil con muchos archivos.")
         
         st.markdown("### Instrucciones")
         st.info("""
@@ -198,44 +422,82 @@ def main():
 
         if st.button("Usar Dataset de Muestra"):
             st.session_state.all_sheets_data = load_sample_dataset()
+            st.session_state.dataset_fingerprint = None
+            st.session_state.file_hashes = None
+            st.session_state.consolidated_rows = {}
+            st.session_state.consolidated_file = None
+            st.session_state.snapshot_file = None
+            st.session_state.run_report = None
             st.session_state.files_processed = True
             st.success("Dataset de muestra cargado con éxito!")
 
+        if snapshot_available():
+            snapshot_upload = st.file_uploader(f"O carga una instantánea ({SNAPSHOT_FILE}) de un procesamiento anterior",
+                                               type=['arrow'])
+            if snapshot_upload is not None and st.button("Cargar Instantánea"):
+                load_snapshot_upload(snapshot_upload)
+
+        if st.session_state.pop('processing_cancelled', False):
+            st.info("Procesamiento cancelado. Se conservan los datos del último procesamiento completo.")
+
         if st.button("Procesar Archivos"):
             if uploaded_files:
                 with st.spinner('Procesando archivos...'):
                     try:
-                        with tempfile.TemporaryDirectory() as temp_dir:
-                            file_paths = []
-                            for file in uploaded_files:
-                                temp_file = Path(temp_dir) / file.name
-                                temp_file.write_bytes(file.getvalue())
-                                file_paths.append(str(temp_file))
-
-                            st.session_state.all_sheets_data = process_excel_files(sorted_files(file_paths), temp_dir)
-                            
-                            if not st.session_state.all_sheets_data:
-                                st.error("No se pudieron procesar los archivos. Verifica que contengan datos válidos.")
-                                st.session_state.files_processed = False
-                                return
-
-                            st.write("Datos procesados:")
-                            st.json(st.session_state.all_sheets_data)
-
-                            st.session_state.consolidated_file = create_consolidated_file(st.session_state.all_sheets_data, temp_dir)
-
-                            if st.session_state.consolidated_file is None:
-                                st.warning("No se pudo crear el archivo consolidado, pero los datos están disponibles para visualización.")
-                            else:
-                                st.success('Archivos procesados y consolidados con éxito!')
+                        report = RunReport()
+                        # El límite de memoria, si el servidor lo define, se aplica a todas las sesiones
+                        report.memory = MemoryBudget(MEMORY_BUDGET_MB * 1024 * 1024 if MEMORY_BUDGET_MB else None)
+                        st.session_state.run_report = None
+                        # Los archivos se leen desde el contenido que ya tiene Streamlit en memoria
+                        with report.stage("carga"):
+                            uploads = {file.name: file.getvalue() for file in uploaded_files}
+                        catalog = FileCatalog.from_uploads(uploads.items())
+                        uploads = [(entry.name, uploads[entry.name]) for entry in catalog]
+
+                        # Al pulsar "Cancelar" Streamlit interrumpe esta ejecución: las lecturas pendientes
+                        # se cancelan y los datos de la sesión quedan como estaban
+                        st.button("Cancelar procesamiento", on_click=cancel_processing)
+
+                        # Solo se leen los archivos nuevos o modificados desde el último procesamiento
+                        changed = process_uploads(uploads, report, history=get_history(),
+                                                  year=int(files_year) if files_year is not None else None,
+                                                  budget=report.memory, low_memory=low_memory)
+
+                        if not st.session_state.all_sheets_data:
+                            st.error("No se pudieron procesar los archivos. Verifica que contengan datos válidos.")
+                            st.session_state.file_hashes = None
+                            st.session_state.files_processed = False
+                            return
+
+                        if changed or st.session_state.consolidated_file is None:
+                            st.session_state.dataset_fingerprint = None
+                            st.session_state.consolidated_file = create_consolidated_file(
+                                st.session_state.all_sheets_data, report, st.session_state.consolidated_rows, changed)
+                            st.session_state.snapshot_file = create_snapshot_file(st.session_state.all_sheets_data,
+                                                                                  report)
+                        st.session_state.run_report = report.summary()
+
+                        if st.session_state.consolidated_file is None:
+                            st.warning("No se pudo crear el archivo consolidado, pero los datos están disponibles para visualización.")
+                        else:
+                            st.success('Archivos procesados y consolidados con éxito!')
 
                         st.session_state.files_processed = True
+                    except MemoryBudgetExceeded as e:
+                        # Los datos de la sesión solo se actualizan al terminar la lectura, así que se conservan
+                        st.error(f"{str(e)}. Se conservan los datos del último procesamiento completo; "
+                                 "procesa menos archivos a la vez o aumenta el límite del servidor.")
+                        log_message(str(e), logging.ERROR, stage="lectura")
+                        st.session_state.run_report = report.summary()
                     except Exception as e:
                         st.error(f"Error al procesar los archivos: {str(e)}")
-                        log_message(f"Error al procesar los archivos: {str(e)}")
+                        log_message(f"Error al procesar los archivos: {str(e)}", logging.ERROR)
                         st.info("Intente usar el método manual descargando el ejecutable o use el dataset de muestra.")
                         st.session_state.all_sheets_data = None
+                        st.session_state.file_hashes = None
+                        st.session_state.consolidated_rows = {}
                         st.session_state.consolidated_file = None
+                        st.session_state.snapshot_file = None
                         st.session_state.files_processed = False
             else:
                 st.warning("Por favor, carga archivos antes de procesar.")
@@ -246,20 +508,30 @@ def main():
     st.sidebar.write("<div style='text-align: center;'>v.1.1.1</div>", unsafe_allow_html=True)
     st.sidebar.write("<div style='text-align: center;'><a href='https://github.com/bladealex9848'>GitHub</a> | <a href='https://alexanderoviedofadul.dev/'>Website</a> | <a href='https://www.linkedin.com/in/alexander-oviedo-fadul/'>LinkedIn</a></div>", unsafe_allow_html=True)
 
+    if st.session_state.files_processed and st.session_state.run_report:
+        show_run_report(st.session_state.run_report)
+
     if st.session_state.files_processed and st.session_state.all_sheets_data:
-        tabs = st.tabs(["Resumen", "Detalles por Trimestre", "Gráficos", "Descargar Informe"])
+        tabs = st.tabs(["Resumen", "Detalles por Trimestre", "Gráficos", "Histórico", "Descargar Informe"])
+
+        if st.session_state.get('dataset_fingerprint') is None:
+            st.session_state.dataset_fingerprint = dataset_fingerprint(st.session_state.all_sheets_data)
+        sheet_frames = SheetFrames(st.session_state.dataset_fingerprint, st.session_state.all_sheets_data)
 
         with tabs[0]:
-            show_summary(st.session_state.all_sheets_data)
+            show_summary(st.session_state.all_sheets_data, sheet_frames)
 
         with tabs[1]:
-            show_details(st.session_state.all_sheets_data)
+            show_details(st.session_state.all_sheets_data, sheet_frames)
 
         with tabs[2]:
-            show_charts(st.session_state.all_sheets_data)
+            show_charts(st.session_state.all_sheets_data, sheet_frames)
 
         with tabs[3]:
-            offer_download(st.session_state.consolidated_file)
+            show_history()
+
+        with tabs[4]:
+            offer_download(st.session_state.all_sheets_data)
     elif not st.session_state.files_processed:
         st.info("Carga tus archivos Excel y haz clic en 'Procesar Archivos' para comenzar.")
     else:
@@ -283,22 +555,84 @@ def main():
     else:
         st.warning("El ejecutable no está disponible en este momento. Por favor, contacte al administrador del sistema.")
 
-def show_summary(all_sheets_data):
+def dataset_fingerprint(all_sheets_data):
+    """
+    Huella del conjunto de datos procesado. Se calcula una sola vez al cargar los datos y
+    sirve como clave de la caché de DataFrames.
+    """
+    return hashlib.sha256(pickle.dumps(all_sheets_data, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+def build_frame(data):
+    try:
+        return data.to_frame(), None
+    except Exception as e:
+        return None, str(e)
+
+# Los DataFrames se construyen una vez por conjunto de datos y hoja, solo cuando se muestran, y se
+# comparten entre las pestañas y las re-ejecuciones; se usa cache_resource para no copiarlos en
+# cada acceso (son de solo lectura).
+@st.cache_resource(max_entries=256, show_spinner=False)
+def get_sheet_frame(fingerprint, sheet, _data):
+    return build_frame(_data)
+
+class SheetFrames:
+    """
+    Acceso por hoja a los DataFrames de las pestañas: cada uno se construye la primera vez
+    que se consulta su hoja.
+    """
+    def __init__(self, fingerprint, all_sheets_data):
+        self.fingerprint = fingerprint
+        self.all_sheets_data = all_sheets_data
+
+    def __getitem__(self, sheet):
+        return get_sheet_frame(self.fingerprint, sheet, self.all_sheets_data[sheet])
+
+def show_raw_preview(sheet, data, label="Datos en bruto"):
+    """
+    Muestra los datos en bruto de una hoja limitados a sus primeras filas, para no enviar al
+    navegador el conjunto completo.
+    """
+    preview = dataset_dict({sheet: data}, max_rows=RAW_PREVIEW_ROWS)
+    if len(data) > RAW_PREVIEW_ROWS:
+        label += f" (primeras {RAW_PREVIEW_ROWS} de {len(data)} filas)"
+    st.write(f"{label}:")
+    st.json(preview, expanded=False)
+
+def show_summary(all_sheets_data, sheet_frames):
+    """
+    Muestra una hoja a la vez, elegida por el usuario, en una tabla paginada y opcionalmente
+    filtrada por archivo, de modo que cada re-ejecución solo envía la página visible.
+    """
     st.header("Resumen de Datos")
     if not all_sheets_data:
         st.warning("No hay datos para mostrar. Por favor, carga y procesa los archivos Excel.")
         return
-    for sheet, data_list in all_sheets_data.items():
-        st.subheader(f"Hoja: {sheet}")
-        for data in data_list:
-            try:
-                df = pd.DataFrame(data[1:], columns=data[0])
-                st.dataframe(df)
-            except Exception as e:
-                st.error(f"Error al mostrar datos de la hoja {sheet}: {str(e)}")
-                st.write("Datos en bruto:", data)
-
-def show_details(all_sheets_data):
+    columns = st.columns([2, 2, 1])
+    sheet = columns[0].selectbox("Hoja", list(all_sheets_data), key="summary_sheet")
+    data = all_sheets_data[sheet]
+    df, error = sheet_frames[sheet]
+    if error is not None:
+        st.error(f"Error al mostrar datos de la hoja {sheet}: {error}")
+        show_raw_preview(sheet, data)
+        return
+
+    sources = data.labels['archivo']
+    source = columns[1].selectbox("Archivo", ["Todos"] + list(pd.unique(sources)), key=f"summary_file_{sheet}")
+    if source != "Todos":
+        df = df[(sources == source).values]
+
+    pages = max(1, -(-len(df) // PAGE_SIZE))
+    # La clave incluye la hoja y el archivo para que cada selección empiece en su primera página
+    page = columns[2].number_input(f"Página (de {pages})", min_value=1, max_value=pages, value=1, step=1,
+                                   key=f"summary_page_{sheet}_{source}")
+    start = (int(page) - 1) * PAGE_SIZE
+    st.dataframe(df.iloc[start:start + PAGE_SIZE])
+    st.caption(f"Filas {min(start + 1, len(df))} a {min(start + PAGE_SIZE, len(df))} de {len(df)}")
+
+    with st.expander("Datos procesados (vista previa)"):
+        show_raw_preview(sheet, data)
+
+def show_details(all_sheets_data, sheet_frames):
     st.header("Detalles por Trimestre")
     if not all_sheets_data:
         st.warning("No hay datos para mostrar. Por favor, carga y procesa los archivos Excel.")
@@ -306,30 +640,54 @@ def show_details(all_sheets_data):
     trimester = st.selectbox("Selecciona un trimestre", 
                              ["Primer Trimestre", "Segundo Trimestre", "Tercer Trimestre", "Cuarto Trimestre"])
     
-    for sheet, data_list in all_sheets_data.items():
-        for data in data_list:
-            try:
-                df = pd.DataFrame(data[1:], columns=data[0])
-                trimester_data = df[df.iloc[:, -1].str.contains(trimester)]
-                if not trimester_data.empty:
-                    st.subheader(f"{sheet} - {trimester}")
-                    st.dataframe(trimester_data)
-            except Exception as e:
-                st.error(f"Error al mostrar detalles de la hoja {sheet} para {trimester}: {str(e)}")
-                st.write("Datos en bruto:", data)
-
-def show_charts(all_sheets_data):
+    for sheet, data in all_sheets_data.items():
+        df, error = sheet_frames[sheet]
+        try:
+            if error is not None:
+                raise ValueError(error)
+            trimester_data = df[(data.labels['periodo'] == trimester).values]
+            if not trimester_data.empty:
+                st.subheader(f"{sheet} - {trimester}")
+                st.dataframe(trimester_data)
+        except Exception as e:
+            st.error(f"Error al mostrar detalles de la hoja {sheet} para {trimester}: {str(e)}")
+            show_raw_preview(sheet, data)
+
+# Las series de los gráficos se agregan una vez por conjunto de datos y hoja
+@st.cache_resource(max_entries=256, show_spinner=False)
+def get_trend_frame(fingerprint, sheet, _data):
+    return trend_frame(_data)
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def get_file_frame(fingerprint, sheet, _data, _sheet_frame):
+    return file_frame(_sheet_frame, _data)
+
+def show_charts(all_sheets_data, sheet_frames):
+    """
+    Grafica la tendencia por trimestre de una hoja, a partir de series ya agregadas de todos
+    sus archivos y partes, o los valores de cada archivo. Las líneas y la dispersión se
+    dibujan con WebGL y, con muchos archivos, se muestran a lo sumo `charts.MAX_POINTS` puntos.
+    """
     st.header("Visualización de Datos")
     if not all_sheets_data:
         st.warning("No hay datos para visualizar. Por favor, carga y procesa los archivos Excel.")
         return
     
     sheet = st.selectbox("Selecciona una hoja", list(all_sheets_data.keys()))
+    data = all_sheets_data[sheet]
     
-    if all_sheets_data[sheet]:
+    if len(data):
         try:
-            df = pd.DataFrame(all_sheets_data[sheet][0][1:], columns=all_sheets_data[sheet][0][0])
-            numeric_columns = df.select_dtypes(include=['float64', 'int64']).columns
+            view = st.radio("Vista", ["Tendencia por trimestre", "Por archivo"], horizontal=True)
+            if view == "Tendencia por trimestre":
+                show_trend_chart(sheet, get_trend_frame(sheet_frames.fingerprint, sheet, data))
+                return
+
+            df, error = sheet_frames[sheet]
+            if error is not None:
+                raise ValueError(error)
+            df = get_file_frame(sheet_frames.fingerprint, sheet, data, df)
+            numeric_columns = df.select_dtypes(include='number').columns
             
             if numeric_columns.empty:
                 st.warning("No se encontraron columnas numéricas para graficar.")
@@ -338,33 +696,139 @@ def show_charts(all_sheets_data):
             chart_type = st.radio("Tipo de gráfico", ["Barras", "Líneas", "Dispersión"])
             x_axis = st.selectbox("Eje X", df.columns)
             y_axis = st.selectbox("Eje Y", numeric_columns)
+            points = downsample(df[[x_axis, y_axis]] if x_axis != y_axis else df[[x_axis]])
 
             if chart_type == "Barras":
-                fig = px.bar(df, x=x_axis, y=y_axis, title=f"{y_axis} por {x_axis}")
+                fig = px.bar(points, x=x_axis, y=y_axis, title=f"{y_axis} por {x_axis}")
             elif chart_type == "Líneas":
-                fig = px.line(df, x=x_axis, y=y_axis, title=f"{y_axis} a lo largo de {x_axis}")
+                fig = px.line(points, x=x_axis, y=y_axis, title=f"{y_axis} a lo largo de {x_axis}",
+                              render_mode='webgl')
             else:
-                fig = px.scatter(df, x=x_axis, y=y_axis, title=f"Relación entre {x_axis} y {y_axis}")
+                fig = px.scatter(points, x=x_axis, y=y_axis, title=f"Relación entre {x_axis} y {y_axis}",
+                                 render_mode='webgl')
 
             st.plotly_chart(fig)
+            if len(points) < len(df):
+                st.caption(f"Se muestran {len(points)} de {len(df)} archivos, tomados a intervalos regulares.")
         except Exception as e:
             st.error(f"Error al crear el gráfico: {str(e)}")
-            st.write("Datos en bruto:", all_sheets_data[sheet])
+            show_raw_preview(sheet, data)
     else:
         st.warning(f"No hay datos disponibles para la hoja {sheet}")
 
-def offer_download(file_path):
+def show_trend_chart(sheet, trend):
+    """
+    Grafica las columnas elegidas de la serie por trimestre de una hoja (sumando todos los
+    archivos y partes de cada trimestre).
+    """
+    if trend.columns.empty or trend.empty:
+        st.warning("No se encontraron valores numéricos por trimestre para graficar.")
+        return
+    columns = st.multiselect("Columnas", list(trend.columns), default=list(trend.columns[:3]),
+                             key=f"trend_columns_{sheet}")
+    if not columns:
+        st.info("Selecciona al menos una columna.")
+        return
+    chart_type = st.radio("Tipo de gráfico", ["Líneas", "Barras"], key="trend_chart_type")
+    points = trend_long(trend, columns)
+    if chart_type == "Líneas":
+        fig = px.line(points, x='Periodo', y='Valor', color='Columna', markers=True, render_mode='webgl',
+                      title=f"Tendencia por trimestre - {sheet}")
+    else:
+        fig = px.bar(points, x='Periodo', y='Valor', color='Columna', barmode='group',
+                     title=f"Totales por trimestre - {sheet}")
+    st.plotly_chart(fig)
+    st.dataframe(trend[columns])
+
+def get_history():
+    """
+    Devuelve el historial de la sesión, una base de datos SQLite en memoria: cada sesión
+    solo ve y reemplaza los totales de los archivos que procesó, aunque varios usuarios
+    compartan el servidor.
+    """
+    if st.session_state.get('history') is None:
+        st.session_state.history = HistoryStore(MEMORY)
+    return st.session_state.history
+
+def show_history():
+    """
+    Compara una columna de una hoja entre los años guardados en el historial de la sesión.
+    Las consultas se resuelven con los índices de la base de datos, sin volver a leer los
+    archivos.
+    """
+    st.header("Histórico por Año")
+    history = get_history()
+    sheets = history.sheets()
+    if not sheets:
+        st.info("El historial está vacío. Procesa archivos de uno o varios años para compararlos.")
+        return
+    sheet = st.selectbox("Hoja", sheets, key="history_sheet")
+    title = st.selectbox("Columna", history.titles(sheet), key="history_title")
+    series = history.series(sheet, title)
+    comparison = history.compare(sheet, title)
+
+    if series.empty:
+        st.warning("No hay valores trimestrales guardados para esta columna.")
+        return
+    series['año'] = series['año'].astype('Int64').astype(str)
+    fig = px.bar(series, x='periodo', y='valor', color='año', barmode='group',
+                 title=f"{title} por trimestre y año")
+    st.plotly_chart(fig)
+    st.dataframe(comparison)
+
+def show_run_report(report):
+    """
+    Muestra el informe de ejecución del último procesamiento: tiempo por etapa y por
+    archivo, filas por segundo y pico de memoria, con la opción de descargarlo en JSON.
+    """
+    with st.expander("Informe de ejecución"):
+        columns = st.columns(3)
+        columns[0].metric("Tiempo total", f"{report['total_seconds']:.2f} s")
+        columns[1].metric("Filas por segundo",
+                          f"{report['rows_per_second']:.0f}" if report['rows_per_second'] else "N/A")
+        columns[2].metric("Pico de memoria",
+                          f"{report['peak_rss_bytes'] / (1024 * 1024):.1f} MB" if report['peak_rss_bytes'] else "N/A")
+        budget = report.get('memory_budget')
+        if budget and budget['peak_bytes'] and budget['limit_bytes']:
+            st.caption(f"Memoria del servidor: pico medido {budget['peak_bytes'] / (1024 * 1024):.1f} MB "
+                       f"de {budget['limit_bytes'] / (1024 * 1024):.0f} MB permitidos.")
+
+        stages = pd.DataFrame([(stage, totals['seconds'], totals['count'])
+                               for stage, totals in report['stages'].items()],
+                              columns=["Etapa", "Segundos", "Mediciones"])
+        st.dataframe(stages, hide_index=True)
+        if report['per_file']:
+            st.dataframe(pd.DataFrame(report['per_file']).T.rename_axis("Archivo"))
+
+        st.download_button("Descargar informe (JSON)", json.dumps(report, ensure_ascii=False, indent=2, default=str),
+                           file_name="run_report.json", mime="application/json")
+
+def offer_download(all_sheets_data):
+    """
+    Ofrece el consolidado guardado en memoria. Si no existe (por ejemplo, con el dataset de
+    muestra) se puede generar a partir de los datos cargados.
+    """
     st.header("Descargar Informe Consolidado")
-    if file_path and os.path.exists(file_path):
-        with open(file_path, "rb") as file:
-            btn = st.download_button(
-                label="Descargar informe consolidado",
-                data=file,
-                file_name="informe_consolidado.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+    if st.session_state.consolidated_file is None and all_sheets_data:
+        if st.button("Generar informe consolidado"):
+            st.session_state.consolidated_file = create_consolidated_file(all_sheets_data)
+    if st.session_state.consolidated_file:
+        st.download_button(
+            label="Descargar informe consolidado",
+            data=st.session_state.consolidated_file,
+            file_name="informe_consolidado.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
     else:
         st.warning("El archivo consolidado aún no está disponible. Por favor, procesa los archivos primero.")
+    if st.session_state.snapshot_file:
+        st.download_button(
+            label="Descargar instantánea de los datos",
+            data=st.session_state.snapshot_file,
+            file_name=SNAPSHOT_FILE,
+            mime="application/vnd.apache.arrow.file",
+            help="Permite volver a cargar estos datos más tarde sin procesar de nuevo los archivos de Excel."
+        )
 
 def load_sample_dataset():
     # Dataset de muestra para casos de derecho de familia en Colombia
@@ -416,7 +880,14 @@ def load_sample_dataset():
             ]
         ]
     }
-    return sample_data
+    return {sheet: build_sample_sheet(blocks[0]) for sheet, blocks in sample_data.items()}
+
+def build_sample_sheet(block):
+    # Cada fila de muestra termina con el trimestre, que hace las veces de archivo de origen
+    sheet_data = SheetData(block[0][:-1])
+    for row in block[1:]:
+        sheet_data.add(row[:-1], row[-1])
+    return sheet_data
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import zlib
+
+from excel_reader import SheetExtract, extract_workbook
+from templates import decode_cell, encode_cell
+
+# Debe incrementarse cada vez que cambie lo que devuelve `extract_workbook` o el formato de
+# las entradas, para que las entradas guardadas por una versión anterior no se reutilicen.
+PARSER_VERSION = 2
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def file_digest(source):
+    """
+    Función que calcula el SHA-256 del contenido de un archivo (ruta o bytes).
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_results(sheet_results):
+    """
+    Función que convierte los resultados de `extract_workbook` en un objeto serializable en
+    JSON. Cada fila se guarda una sola vez en 'filas' y los extractos la referencian por su
+    posición, de modo que las filas compartidas entre hojas (ver `TemplateRegistry`) siguen
+    compartidas al cargarlas. Las fechas y horas se marcan con su tipo (`encode_cell`).
+    """
+    rows = []
+    positions = {}
+
+    def row(values):
+        if id(values) not in positions:
+            positions[id(values)] = len(rows)
+            rows.append(values)
+        return positions[id(values)]
+
+    sheets = []
+    for sheet, extract, error in sheet_results:
+        if extract is not None:
+            extract = {'encabezado': None if extract.header_rows is None else list(map(row, extract.header_rows)),
+                       'titulos': row(extract.row_20_titles),
+                       'total': extract.total_row_values}
+        sheets.append([sheet, extract, error])
+    return {'filas': rows, 'hojas': sheets}
+
+
+def decode_results(payload):
+    """
+    Función que reconstruye los resultados guardados con `encode_results`.
+    """
+    rows = payload['filas']
+    sheet_results = []
+    for sheet, extract, error in payload['hojas']:
+        if extract is not None:
+            header = extract['encabezado']
+            extract = SheetExtract(None if header is None else [rows[index] for index in header],
+                                   rows[extract['titulos']], extract['total'])
+        sheet_results.append((sheet, extract, error))
+    return sheet_results
+
+
+class ParseCache:
+    """
+    Caché en disco de los extractos de cada archivo trimestral, direccionada por el SHA-256
+    del contenido y la versión del analizador. Cada entrada se guarda como JSON comprimido
+    (nunca como objetos de Python, para que leer la caché no ejecute código) y, al superar
+    `max_bytes`, se eliminan las entradas usadas hace más tiempo (LRU).
+
+    La carpeta se crea solo para el usuario actual; en POSIX, si pertenece a otro usuario o
+    otros pueden escribir en ella, la caché no se usa.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, digest):
+        return os.path.join(self.directory, f"{digest}-v{PARSER_VERSION}.json.z")
+
+    def _check_directory(self):
+        """
+        Función que crea la carpeta de la caché con permisos solo para el usuario actual y
+        lanza `PermissionError` si otro usuario puede plantar entradas en ella.
+        """
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if os.name != 'posix':
+            return
+        info = os.stat(self.directory)
+        if info.st_uid != os.getuid() or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise PermissionError(f"La carpeta de la caché {self.directory} no es privada")
+
+    def get(self, digest):
+        path = self._entry_path(digest)
+        try:
+            self._check_directory()
+            with open(path, 'rb') as f:
+                sheet_results = decode_results(json.loads(zlib.decompress(f.read()), object_hook=decode_cell))
+        except (OSError, zlib.error, ValueError, KeyError, TypeError, IndexError):
+            self.misses += 1
+            return None
+        # La fecha de modificación marca el último uso para el desalojo LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return sheet_results
+
+    def put(self, digest, sheet_results):
+        self._check_directory()
+        content = json.dumps(encode_results(sheet_results), ensure_ascii=False, default=encode_cell)
+        payload = zlib.compress(content.encode('utf-8'))
+        # Escritura atómica: varios procesos pueden escribir en la misma caché
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(temp_path, self._entry_path(digest))
+        self.evict()
+
+    def evict(self):
+        """
+        Función que elimina las entradas menos usadas recientemente hasta respetar el tamaño máximo.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json.z'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def cached_extract_workbook(source, file_name=None, cache=None):
+    """
+    Función que devuelve los extractos de un archivo desde la caché si su contenido no ha
+    cambiado, o los obtiene con `extract_workbook` y los guarda. Devuelve una tupla
+    (extractos, acierto_en_cache). Puede ejecutarse en un pool de procesos.
+    """
+    if cache is None:
+        return extract_workbook(source, file_name), False
+
+    digest = file_digest(source)
+    sheet_results = cache.get(digest)
+    if sheet_results is not None:
+        return sheet_results, True
+
+    sheet_results = extract_workbook(source, file_name)
+    try:
+        cache.put(digest, sheet_results)
+    except OSError:
+        pass
+    return sheet_results, False
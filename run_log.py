@@ -0,0 +1,181 @@
+import atexit
+import json
+import logging
+import multiprocessing
+import queue
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "log.txt"
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Campos opcionales de cada entrada, además de la fecha, el nivel, el mensaje y el proceso
+FIELDS = ('file', 'sheet', 'stage')
+
+logger = logging.getLogger('analizador')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+# Sin registro iniciado, las entradas se descartan
+logger.addHandler(logging.NullHandler())
+
+_queue = None
+_listener = None
+_handler = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Formateador que convierte cada registro en una línea JSON.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        for field in FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        entry['pid'] = record.process
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """
+    Manejador que acumula las líneas en memoria y las escribe en bloque cuando se juntan
+    `batch_size` líneas, cuando llega una entrada y han pasado `flush_interval` segundos
+    desde la última escritura, o cuando llega un error. Mientras no llegan entradas,
+    `FlushingQueueListener` lo vacía cada `flush_interval` segundos. El archivo se rota al
+    superar `max_bytes`, conservando `backup_count` copias (log.txt.1, log.txt.2, ...).
+    """
+
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count,
+                         encoding='utf-8', delay=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self._last_flush = time.monotonic()
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if (len(self.buffer) >= self.batch_size or record.levelno >= logging.ERROR
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                data = ''.join(self.buffer)
+                self.buffer = []
+                if self.stream is None:
+                    self.stream = self._open()
+                size = len(data.encode('utf-8'))
+                if self.maxBytes > 0 and self.stream.tell() and self.stream.tell() + size > self.maxBytes:
+                    self.doRollover()
+                    if self.stream is None:
+                        self.stream = self._open()
+                self.stream.write(data)
+                self.stream.flush()
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+class FlushingQueueListener(QueueListener):
+    """
+    Hilo que escribe las entradas de la cola con sus manejadores y que, si no llega ninguna
+    en `flush_interval` segundos, vacía los manejadores para que las líneas acumuladas no
+    esperen a la siguiente entrada.
+    """
+
+    def __init__(self, records, handler, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        super().__init__(records, handler)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                for handler in self.handlers:
+                    handler.flush()
+
+
+def start_logging(path=LOG_FILE, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                  batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """
+    Función que inicia el registro en segundo plano: `log_message` solo deja cada entrada
+    en una cola y un hilo la escribe en `path` como línea JSON. La cola es de
+    multiprocessing, por lo que los procesos trabajadores pueden usarla (ver
+    `init_worker_logging`). Las entradas se escriben en bloque, como mucho `flush_interval`
+    segundos después de llegar, y las pendientes se escriben al salir del programa. Si el
+    registro ya está iniciado no hace nada y devuelve la misma cola.
+    """
+    global _queue, _listener, _handler
+    if _listener is not None:
+        return _queue
+
+    _queue = multiprocessing.Queue()
+    _handler = BatchRotatingFileHandler(path, max_bytes, backup_count, batch_size, flush_interval)
+    _handler.setFormatter(JsonLineFormatter())
+    _listener = FlushingQueueListener(_queue, _handler, flush_interval)
+    _listener.start()
+    logger.handlers = [QueueHandler(_queue)]
+    atexit.register(stop_logging)
+    return _queue
+
+
+def stop_logging():
+    """
+    Función que detiene el registro en segundo plano y escribe las entradas pendientes.
+    """
+    global _queue, _listener, _handler
+    if _listener is None:
+        return
+    logger.handlers = [logging.NullHandler()]
+    _listener.stop()
+    _handler.close()
+    _queue.close()
+    _queue = _listener = _handler = None
+    atexit.unregister(stop_logging)
+
+
+def log_queue():
+    """
+    Función que devuelve la cola del registro, o None si no se ha iniciado.
+    """
+    return _queue
+
+
+def init_worker_logging(queue):
+    """
+    Función de inicialización de los procesos trabajadores: envía sus entradas a la cola del
+    proceso principal. Si la cola es None, las entradas del trabajador se descartan.
+    """
+    logger.handlers = [QueueHandler(queue)] if queue is not None else [logging.NullHandler()]
+
+
+def log_message(message, level=logging.INFO, file=None, sheet=None, stage=None):
+    """
+    Función que registra un mensaje con los campos opcionales de archivo, hoja y etapa.
+    """
+    logger.log(level, message, extra={'file': file, 'sheet': sheet, 'stage': stage})
@@ -0,0 +1,240 @@
+import gc
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_FILE = "run_report.json"
+
+# Veces el tamaño de un libro de Excel que se estima que ocupa en memoria al leerlo
+READ_MEMORY_FACTOR = 10
+
+
+def peak_rss_bytes(children=False):
+    """
+    Función que devuelve el pico de memoria residente (RSS) en bytes del proceso actual o,
+    si `children` es verdadero, el mayor de sus procesos hijos ya terminados. Devuelve None
+    si no puede medirse en esta plataforma.
+    """
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+        # macOS informa bytes; Linux, kilobytes
+        return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    if sys.platform == 'win32' and not children:
+        return _windows_peak_working_set()
+    return None
+
+
+def current_rss_bytes():
+    """
+    Función que devuelve la memoria residente (RSS) actual del proceso en bytes, o None si
+    no puede medirse en esta plataforma.
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == 'win32':
+        counters = _windows_memory_counters()
+        return counters.WorkingSetSize if counters is not None else None
+    return None
+
+
+def _windows_peak_working_set():
+    counters = _windows_memory_counters()
+    return counters.PeakWorkingSetSize if counters is not None else None
+
+
+def _windows_memory_counters():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    try:
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+    except (AttributeError, OSError):
+        return None
+    return counters
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """
+    Error que indica que el procesamiento superó el límite de memoria configurado.
+    """
+
+
+class MemoryBudget:
+    """
+    Clase que vigila la memoria residente (RSS) del proceso frente a un límite en bytes.
+    Cada medición actualiza el pico observado durante la ejecución, que a diferencia de
+    `peak_rss_bytes` no incluye lo que el proceso usó antes (por ejemplo, en otras sesiones
+    de un servidor compartido). Con `limit_bytes` None solo se mide la memoria. Si la
+    plataforma no permite medirla, el límite no se aplica.
+    """
+
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.peak_bytes = None
+        self.last_bytes = None
+        self.exceeded_count = 0
+
+    def measure(self):
+        rss = self.last_bytes = current_rss_bytes()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+        return rss
+
+    def reserve(self, upcoming_bytes=0, relieve=None):
+        """
+        Función que comprueba, antes de leer un archivo, que la memoria en uso más la que se
+        estima que necesitará su lectura (`upcoming_bytes`) no supera el límite. Si lo supera,
+        libera lo que pueda con la función `relieve`, que devuelve los bytes liberados, y con
+        el recolector de basura; lo liberado se descuenta de la medición porque el proceso lo
+        reutiliza aunque el sistema siga contándolo en el RSS. Lanza `MemoryBudgetExceeded`
+        si aun así no alcanza.
+        """
+        rss = self.measure()
+        if rss is None or self.limit_bytes is None or rss + upcoming_bytes <= self.limit_bytes:
+            return
+        self.exceeded_count += 1
+        freed = (relieve() or 0) if relieve is not None else 0
+        gc.collect()
+        rss = self.measure() - freed
+        if rss + upcoming_bytes > self.limit_bytes:
+            raise MemoryBudgetExceeded(
+                f"El procesamiento superaría el límite de memoria de {self.limit_bytes / (1024 * 1024):.0f} MB: "
+                f"hay {rss / (1024 * 1024):.0f} MB en uso y leer el siguiente archivo necesitaría unos "
+                f"{upcoming_bytes / (1024 * 1024):.0f} MB")
+
+    def guard(self, items, size, relieve=None):
+        """
+        Función que entrega los elementos de `items` y, antes de cada uno, reserva la memoria
+        que se estima para leerlo (`READ_MEMORY_FACTOR` veces lo que devuelve `size` para ese
+        elemento, en bytes) con `reserve`. Como se consume a medida que se leen los archivos,
+        la comprobación se hace justo antes de leer cada uno.
+        """
+        for item in items:
+            self.reserve(size(item) * READ_MEMORY_FACTOR, relieve)
+            yield item
+
+    def summary(self):
+        return {'limit_bytes': self.limit_bytes, 'peak_bytes': self.peak_bytes, 'exceeded': self.exceeded_count}
+
+
+class RunReport:
+    """
+    Clase que acumula el tiempo de cada etapa de una ejecución, por archivo y por hoja, y
+    genera el informe de ejecución (duración por etapa, filas por segundo y pico de memoria).
+
+    Cada medición es un diccionario con `stage`, `seconds` y, cuando aplican, `file`,
+    `sheet` y `rows`, para poder devolverlas desde un proceso trabajador y combinarlas con
+    `extend`.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self._start = time.perf_counter()
+        self.timings = []
+        self.memory = None
+
+    @contextmanager
+    def stage(self, stage, file=None, sheet=None):
+        """
+        Función que mide el tiempo de una etapa. Devuelve la medición, a la que puede
+        asignarse `rows` con el número de filas procesadas.
+        """
+        entry = {'stage': stage}
+        if file is not None:
+            entry['file'] = file
+        if sheet is not None:
+            entry['sheet'] = sheet
+        start = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            entry['seconds'] = time.perf_counter() - start
+            self.timings.append(entry)
+
+    def record(self, stage, seconds, file=None, sheet=None, rows=None):
+        entry = {'stage': stage, 'seconds': seconds}
+        for key, value in (('file', file), ('sheet', sheet), ('rows', rows)):
+            if value is not None:
+                entry[key] = value
+        self.timings.append(entry)
+
+    def extend(self, timings):
+        self.timings.extend(timings)
+
+    def summary(self, rows_stage='extraccion'):
+        """
+        Función que construye el informe: el tiempo total, el tiempo y el número de
+        mediciones por etapa y por archivo, las filas por segundo de la etapa `rows_stage`,
+        el pico de memoria del proceso y de sus trabajadores, el límite y el pico de memoria
+        observado si se indicó un `MemoryBudget` en `memory`, y todas las mediciones.
+        """
+        stages = {}
+        files = {}
+        for entry in self.timings:
+            stage = stages.setdefault(entry['stage'], {'seconds': 0.0, 'count': 0})
+            stage['seconds'] += entry['seconds']
+            stage['count'] += 1
+            if 'file' in entry:
+                file_stages = files.setdefault(entry['file'], {})
+                file_stages[entry['stage']] = file_stages.get(entry['stage'], 0.0) + entry['seconds']
+
+        rows = sum(entry.get('rows', 0) for entry in self.timings if entry['stage'] == rows_stage)
+        rows_seconds = stages.get(rows_stage, {}).get('seconds', 0.0)
+        return {
+            'started': self.started.isoformat(timespec='seconds'),
+            'total_seconds': time.perf_counter() - self._start,
+            'files': len(files),
+            'sheets': len({(entry['file'], entry['sheet']) for entry in self.timings
+                           if 'file' in entry and 'sheet' in entry}),
+            'rows': rows,
+            'rows_per_second': rows / rows_seconds if rows_seconds else None,
+            'peak_rss_bytes': peak_rss_bytes(),
+            'peak_rss_workers_bytes': peak_rss_bytes(children=True),
+            'memory_budget': self.memory.summary() if self.memory is not None else None,
+            'stages': stages,
+            'per_file': files,
+            'timings': self.timings,
+        }
+
+    def save(self, subfolder, name=REPORT_FILE):
+        """
+        Función que guarda el informe como JSON en `subfolder` y devuelve la ruta y el informe.
+        """
+        report = self.summary()
+        path = os.path.join(subfolder, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+        return path, report
+
+
+def timed_call(function, *args):
+    """
+    Función que ejecuta `function(*args)` y devuelve una tupla (resultado, segundos). Al ser
+    una función de módulo, puede enviarse a un pool de procesos.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
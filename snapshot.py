@@ -0,0 +1,207 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset import SheetData, LABEL_COLUMNS, PERIOD_DTYPE
+from templates import TemplateRegistry, decode_cell, encode_cell
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow es opcional: sin él no se guardan ni cargan instantáneas
+    pa = None
+
+SNAPSHOT_FILE = 'Consolidado.arrow'
+
+# Debe incrementarse cada vez que cambie el formato de la instantánea
+SNAPSHOT_VERSION = 3
+
+# Versiones anteriores que se pueden seguir cargando: la versión 2 guardaba como texto las
+# fechas del encabezado, que se cargan igual que entonces
+COMPATIBLE_VERSIONS = {'2', str(SNAPSHOT_VERSION)}
+
+
+def snapshot_available():
+    """
+    Función que indica si está instalado pyarrow, necesario para las instantáneas.
+    """
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Para guardar o cargar instantáneas se necesita el paquete pyarrow (pip install pyarrow)")
+
+
+def _numeric_cell(value):
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+
+def _sheet_cells(values):
+    """
+    Función que devuelve las celdas de una hoja como dos matrices (filas x columnas): los
+    valores numéricos (float64, NaN si la celda está vacía o es texto) y los textos (None
+    si la celda es numérica o está vacía).
+    """
+    numbers = np.full(values.shape, np.nan)
+    texts = np.full(values.shape, None, dtype=object)
+    for index, position in enumerate(values.columns):
+        column = values[position]
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            numbers[:, index] = column.to_numpy(dtype='float64', na_value=np.nan)
+            continue
+        for row, value in enumerate(column):
+            if _numeric_cell(value):
+                numbers[row, index] = value
+            elif value is not None and not pd.isna(value):
+                texts[row, index] = str(value)
+    return numbers, texts
+
+
+def snapshot_table(all_sheets_data):
+    """
+    Función que convierte un conjunto de hojas en una tabla de Arrow en formato largo: una
+    fila por celda (hoja, fila, columna) con las etiquetas de la fila, el valor numérico en
+    'valor' y el texto, si la celda no es numérica, en 'texto'. Las celdas de cada hoja se
+    guardan contiguas y por filas. Los metadatos de la tabla guardan cada plantilla de
+    encabezado (títulos y encabezado) una sola vez y, por hoja, la huella de su plantilla y
+    su número de filas; las fechas y horas del encabezado se marcan con su tipo
+    (`encode_cell`) para recuperarlas tal cual.
+    """
+    _require_pyarrow()
+    columns = {name: [] for name in ['hoja', 'fila', 'columna', 'valor', 'texto'] + LABEL_COLUMNS}
+    sheets = {}
+    templates = TemplateRegistry()
+    for sheet, data in all_sheets_data.items():
+        values = data.values
+        labels = data.labels
+        count, width = values.shape
+        template = templates.intern(data.header_rows, data.titles)
+        sheets[sheet] = {'plantilla': template.key, 'filas': count if width else 0}
+        if not count or not width:
+            continue
+
+        numbers, texts = _sheet_cells(values)
+        columns['hoja'].append(np.full(count * width, sheet, dtype=object))
+        columns['fila'].append(np.repeat(np.arange(count, dtype='int32'), width))
+        columns['columna'].append(np.tile(values.columns.to_numpy(dtype='int16'), count))
+        columns['valor'].append(numbers.reshape(-1))
+        columns['texto'].append(texts.reshape(-1))
+        for name in LABEL_COLUMNS:
+            column = labels[name].astype(object).where(labels[name].notna(), None).to_numpy()
+            if name != 'parte':
+                column = np.array([None if value is None else str(value) for value in column], dtype=object)
+            columns[name].append(np.repeat(column, width))
+
+    def joined(name, dtype=object):
+        return np.concatenate(columns[name]) if columns[name] else np.array([], dtype=dtype)
+
+    arrays = {
+        'hoja': pa.array(joined('hoja'), pa.string()).dictionary_encode(),
+        'fila': pa.array(joined('fila', 'int32'), pa.int32()),
+        'columna': pa.array(joined('columna', 'int16'), pa.int16()),
+        'valor': pa.array(joined('valor', 'float64'), pa.float64(), from_pandas=True),
+        'texto': pa.array(joined('texto'), pa.string()),
+        'concepto': pa.array(joined('concepto'), pa.string()).dictionary_encode(),
+        'archivo': pa.array(joined('archivo'), pa.string()).dictionary_encode(),
+        'periodo': pa.array(joined('periodo'), pa.string()).dictionary_encode(),
+        'parte': pa.array(joined('parte', 'int8'), pa.int8()),
+    }
+    metadata = {'version': str(SNAPSHOT_VERSION),
+                'plantillas': json.dumps(templates.to_dict(), ensure_ascii=False, default=encode_cell),
+                'hojas': json.dumps(sheets, ensure_ascii=False)}
+    return pa.table(arrays, metadata=metadata)
+
+
+def save_snapshot(all_sheets_data, destination):
+    """
+    Función que guarda un conjunto de hojas como instantánea en formato Arrow IPC. `destination`
+    puede ser una ruta o un objeto de archivo abierto en modo binario. Devuelve `destination`.
+    """
+    table = snapshot_table(all_sheets_data)
+    sink = destination
+    if isinstance(destination, (str, os.PathLike)):
+        sink = pa.OSFile(os.fspath(destination), 'wb')
+    try:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    finally:
+        if sink is not destination:
+            sink.close()
+    return destination
+
+
+def _sheet_values(numbers, texts, positions):
+    """
+    Función que reconstruye las columnas de valores de una hoja con los mismos tipos que
+    `SheetData`: enteros (Int64), decimales (float64) o texto (object).
+    """
+    missing = np.isnan(numbers)
+    filled = np.where(missing, 0, numbers)
+    integers = filled.astype('int64')
+    integral = (filled == integers).all(axis=0)
+    has_text = (texts != None).any(axis=0)  # noqa: E711
+    columns = {}
+    for index, position in enumerate(positions):
+        if has_text[index]:
+            cells = [text if text is not None else None if empty else int(value) if value % 1 == 0 else value
+                     for value, text, empty in zip(numbers[:, index].tolist(), texts[:, index], missing[:, index])]
+            columns[position] = pd.Series(cells, dtype=object)
+        elif integral[index]:
+            columns[position] = pd.arrays.IntegerArray(integers[:, index], missing[:, index])
+        else:
+            columns[position] = numbers[:, index]
+    return pd.DataFrame(columns, index=range(len(numbers)))
+
+
+def load_snapshot(source):
+    """
+    Función que carga una instantánea guardada con `save_snapshot` y devuelve el conjunto de
+    hojas ({hoja: SheetData}). `source` puede ser una ruta, que se abre en memoria mapeada
+    sin copiarla, o el contenido de la instantánea en bytes.
+    """
+    _require_pyarrow()
+    if isinstance(source, (str, os.PathLike)):
+        with pa.memory_map(os.fspath(source), 'r') as stream:
+            table = pa.ipc.open_file(stream).read_all()
+    else:
+        table = pa.ipc.open_file(pa.BufferReader(source)).read_all()
+
+    metadata = table.schema.metadata or {}
+    if metadata.get(b'version', b'').decode() not in COMPATIBLE_VERSIONS:
+        raise ValueError("La instantánea no es compatible con esta versión del analizador")
+    sheets = json.loads(metadata[b'hojas'].decode('utf-8'))
+    templates = json.loads(metadata[b'plantillas'].decode('utf-8'), object_hook=decode_cell)
+
+    numbers = table.column('valor').to_numpy()
+    texts = table.column('texto').to_numpy(zero_copy_only=False)
+    # Las columnas codificadas como diccionario se decodifican antes de pasarlas a numpy
+    # para que las etiquetas vacías sigan siendo None
+    labels = {name: table.column(name).cast(pa.int8() if name == 'parte' else pa.string())
+              .to_numpy(zero_copy_only=False) for name in LABEL_COLUMNS}
+
+    all_sheets_data = {}
+    start = 0
+    for sheet, info in sheets.items():
+        template = templates[info['plantilla']]
+        positions = range(1, len(template['titulos']))
+        count, width = info['filas'], len(positions)
+        end = start + count * width
+        if not count:
+            all_sheets_data[sheet] = SheetData(template['titulos'], template['encabezado'])
+            continue
+        sheet_values = _sheet_values(numbers[start:end].reshape(count, width),
+                                     texts[start:end].reshape(count, width), positions)
+        rows = slice(start, end, width)
+        sheet_labels = pd.DataFrame({
+            'concepto': pd.Series(labels['concepto'][rows], dtype=object),
+            'archivo': pd.Series(labels['archivo'][rows], dtype=object),
+            'periodo': pd.Categorical(labels['periodo'][rows], dtype=PERIOD_DTYPE),
+            'parte': pd.Series(labels['parte'][rows], dtype='int8'),
+        }, columns=LABEL_COLUMNS)
+        all_sheets_data[sheet] = SheetData.from_columns(template['titulos'], template['encabezado'],
+                                                        sheet_values, sheet_labels)
+        start = end
+    return all_sheets_data
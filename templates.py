@@ -0,0 +1,111 @@
+import hashlib
+import json
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+# Una plantilla de encabezado: las 19 filas del formulario SIERJU y los títulos de la fila 20,
+# identificada por la huella de su contenido.
+HeaderTemplate = namedtuple('HeaderTemplate', ['key', 'header_rows', 'titles'])
+
+
+def _cell_key(value):
+    # El tipo forma parte de la clave para no confundir 1, 1.0 y True
+    return type(value), value
+
+
+def template_key(header_rows, titles):
+    """
+    Función que calcula la huella de una plantilla de encabezado: los primeros 16 caracteres
+    del SHA-256 de sus filas y sus títulos.
+    """
+    content = json.dumps([header_rows, titles], ensure_ascii=False, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+
+# Clave con la que se marcan en JSON las celdas que no son texto, número, booleano o None
+CELL_TYPE_KEY = '__tipo__'
+
+_CELL_TYPES = {
+    'fecha_hora': (datetime, datetime.isoformat, datetime.fromisoformat),
+    'fecha': (date, date.isoformat, date.fromisoformat),
+    'hora': (time, time.isoformat, time.fromisoformat),
+    'duracion': (timedelta, timedelta.total_seconds, lambda seconds: timedelta(seconds=seconds)),
+}
+
+
+def encode_cell(value):
+    """
+    Función para el parámetro `default` de `json.dumps`: convierte las fechas, horas y
+    duraciones de las celdas en un diccionario marcado con su tipo, que `decode_cell`
+    reconstruye. Cualquier otro valor no serializable se guarda como texto.
+    """
+    # datetime es una subclase de date, por eso se revisa primero
+    for name, (cell_type, encode, _) in _CELL_TYPES.items():
+        if isinstance(value, cell_type):
+            return {CELL_TYPE_KEY: name, 'valor': encode(value)}
+    return str(value)
+
+
+def decode_cell(obj):
+    """
+    Función para el parámetro `object_hook` de `json.loads`: reconstruye las celdas
+    guardadas con `encode_cell` y deja igual los demás diccionarios.
+    """
+    name = obj.get(CELL_TYPE_KEY)
+    if name in _CELL_TYPES and len(obj) == 2:
+        return _CELL_TYPES[name][2](obj['valor'])
+    return obj
+
+
+class TemplateRegistry:
+    """
+    Clase que guarda una sola vez cada plantilla de encabezado distinta. Las filas iguales se
+    comparten entre plantillas (el mismo objeto de lista), por lo que un encabezado repetido
+    en varias hojas o archivos ocupa memoria una sola vez y `pickle` lo serializa una sola
+    vez dentro de un mismo objeto. Las filas compartidas no deben modificarse.
+    """
+
+    def __init__(self):
+        self.templates = {}
+        self._by_rows = {}
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.templates)
+
+    def __iter__(self):
+        return iter(self.templates.values())
+
+    def __getitem__(self, key):
+        return self.templates[key]
+
+    def _row(self, row):
+        try:
+            key = tuple(_cell_key(value) for value in row)
+            return self._rows.setdefault(key, list(row))
+        except TypeError:  # celdas no hashables: la fila no se comparte
+            return list(row)
+
+    def intern(self, header_rows, titles):
+        """
+        Función que devuelve la plantilla registrada con el mismo encabezado y los mismos
+        títulos, registrándola si es nueva. `header_rows` puede ser None.
+        """
+        rows = [self._row(row) for row in header_rows or []]
+        titles = self._row(titles)
+        identity = (header_rows is None, id(titles)) + tuple(map(id, rows))
+        template = self._by_rows.get(identity)
+        if template is None:
+            rows = rows if header_rows is not None else None
+            template = HeaderTemplate(template_key(rows, titles), rows, titles)
+            template = self.templates.setdefault(template.key, template)
+            self._by_rows[identity] = template
+        return template
+
+    def to_dict(self):
+        """
+        Función que devuelve las plantillas como un diccionario serializable en JSON,
+        indexado por su huella.
+        """
+        return {template.key: {'titulos': template.titles, 'encabezado': template.header_rows}
+                for template in self}
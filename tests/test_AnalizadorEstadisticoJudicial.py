@@ -3,16 +3,36 @@ import pandas as pd
 from unittest.mock import patch, mock_open, MagicMock
 import os
 import sys
+import tempfile
+import io
+import json
+from openpyxl import Workbook
 
 # Asumimos que el script principal está en el directorio padre
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from excel_reader import SheetExtract
+from dataset import SheetData
+from history import HistoryStore
 from AnalizadorEstadisticoJudicial import (
     sort_key_func, sorted_files, process_excel_files, process_sheets,
-    process_rows, consolidate_data, create_consolidated_file
+    process_rows, consolidate_data, create_consolidated_file,
+    start_deferred_results, finish_deferred_results, find_input_files, main,
+    EXIT_OK, EXIT_ERROR, EXIT_NO_FILES, EXIT_FILE_ERRORS, EXIT_DUPLICATE_NAMES
 )
+from run_log import stop_logging
 
 class TestAnalizadorEstadisticoJudicial(unittest.TestCase):
 
+    def setUp(self):
+        # Cada prueba trabaja en su propia carpeta temporal, donde se crean las entradas y salidas
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.temp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
     def test_sort_key_func(self):
         test_cases = [
             ("Primer Trimestre.xls", (0, 0)),
@@ -38,7 +58,7 @@ class TestAnalizadorEstadisticoJudicial(unittest.TestCase):
         ]
         self.assertEqual(sorted_files(files), expected)
 
-    @patch('pandas.ExcelFile')
+    @patch('AnalizadorEstadisticoJudicial.open_workbook')
     @patch('AnalizadorEstadisticoJudicial.process_sheets')
     def test_process_excel_files(self, mock_process_sheets, mock_excel_file):
         mock_excel_file.return_value = MagicMock()
@@ -52,12 +72,200 @@ class TestAnalizadorEstadisticoJudicial(unittest.TestCase):
         self.assertEqual(len(mock_process_sheets.call_args_list), 2)
         self.assertIsInstance(result, dict)
 
-    @patch('pandas.read_excel')
-    def test_process_sheets(self, mock_read_excel):
-        mock_read_excel.return_value = pd.DataFrame({
-            0: ['Total'] + [None] * 19,
-            1: range(20)
-        })
+    def test_process_excel_files_parallel_matches_serial(self):
+        files = ["Segundo Trimestre.xlsx", "Primer Trimestre_2.xlsx", "Primer Trimestre_1.xlsx"]
+        for n, name in enumerate(files):
+            wb = Workbook()
+            wb.remove(wb.active)
+            for sheet in ["Hoja B", "Hoja A"][n % 2:]:
+                ws = wb.create_sheet(sheet)
+                for i in range(19):
+                    ws.append([f"Encabezado {i}"])
+                ws.append(['', 'INGRESOS'])
+                ws.append(['Total', n])
+            wb.save(name)
+        os.makedirs('serial')
+        os.makedirs('paralelo')
+
+        serial = process_excel_files(list(files), 'serial/')
+        parallel = process_excel_files(list(files), 'paralelo/', workers=2)
+
+        self.assertEqual(serial, parallel)
+        self.assertEqual(list(parallel), ['Hoja B', 'Hoja A'])
+        # Primer Trimestre_1, Primer Trimestre_2 y Segundo Trimestre
+        self.assertEqual([row[1] for row in parallel['Hoja A'].rows()], [2, 1, 0])
+
+    def test_process_excel_files_results_modes(self):
+        files = ["Primer Trimestre.xlsx", "Segundo Trimestre.xlsx"]
+        for n, name in enumerate(files):
+            wb = Workbook()
+            ws = wb.active
+            ws.title = 'Hoja A'
+            for i in range(19):
+                ws.append([f"Encabezado {i}", 'Grupo', 'Grupo'])
+            ws.append(['', 'INGRESOS', 'EGRESOS'])
+            ws.append(['Total', n, n + 1])
+            wb.save(name)
+        for mode in ['inline', 'deferred', 'skip']:
+            os.makedirs(mode)
+
+        inline = process_excel_files(list(files), 'inline/')
+        pending = []
+        deferred = process_excel_files(list(files), 'deferred/', results_mode='deferred',
+                                       pending_results=pending)
+        self.assertEqual(os.listdir('deferred'), [])
+        executor, futures = start_deferred_results(pending, 'deferred/')
+        finish_deferred_results(executor, futures)
+        skipped = process_excel_files(list(files), 'skip/', results_mode='skip',
+                                      pending_results=pending[:0])
+
+        self.assertEqual(inline, deferred)
+        self.assertEqual(inline, skipped)
+        self.assertEqual(os.listdir('skip'), [])
+        self.assertEqual([file for file, _ in pending], files)
+        self.assertEqual(sorted(os.listdir('deferred')), sorted(os.listdir('inline')))
+        self.assertEqual(len(os.listdir('inline')), 2)
+        for name in os.listdir('inline'):
+            expected = pd.read_excel('inline/' + name, sheet_name=None, header=None)
+            actual = pd.read_excel('deferred/' + name, sheet_name=None, header=None)
+            self.assertEqual(list(expected), list(actual))
+            for sheet in expected:
+                pd.testing.assert_frame_equal(expected[sheet], actual[sheet])
+
+    def write_quarter(self, path, value):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Hoja A'
+        for i in range(19):
+            ws.append([f"Encabezado {i}"])
+        ws.append(['', 'INGRESOS'])
+        ws.append(['Total', value])
+        wb.save(path)
+
+    def test_find_input_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.makedirs(os.path.join(temp_dir, 'juzgado', '2024'))
+            for name in ['Segundo Trimestre.xlsx', 'Primer Trimestre.xls', '~$Primer Trimestre.xlsx', 'otro.xlsx']:
+                open(os.path.join(temp_dir, name), 'w').close()
+            open(os.path.join(temp_dir, 'juzgado', '2024', 'Tercer Trimestre_1.xlsx'), 'w').close()
+
+            flat = find_input_files([temp_dir])
+            recursive = find_input_files([temp_dir], recursive=True)
+
+        self.assertEqual([os.path.basename(file) for file in flat], ['Primer Trimestre.xls', 'Segundo Trimestre.xlsx'])
+        self.assertEqual([os.path.relpath(file, temp_dir) for file in recursive],
+                         ['Primer Trimestre.xls', 'Segundo Trimestre.xlsx',
+                          os.path.join('juzgado', '2024', 'Tercer Trimestre_1.xlsx')])
+
+    def run_batch(self, argv):
+        stdout = io.StringIO()
+        try:
+            with patch('sys.stdout', stdout), patch('builtins.input') as mock_input:
+                exit_code = main(argv)
+        finally:
+            stop_logging()
+        mock_input.assert_not_called()
+        return exit_code, json.loads(stdout.getvalue())
+
+    def test_main_batch_json(self):
+        os.makedirs(os.path.join('entrada', 'parte'))
+        self.write_quarter(os.path.join('entrada', 'Primer Trimestre.xlsx'), 1)
+        self.write_quarter(os.path.join('entrada', 'parte', 'Segundo Trimestre.xlsx'), 2)
+
+        exit_code, summary = self.run_batch(['entrada', '-r', '-o', 'salida', '--json', '--results', 'skip'])
+
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(summary['status'], 'ok')
+        self.assertEqual(summary['sheets'], 1)
+        self.assertEqual(len(summary['files']), 2)
+        self.assertTrue(os.path.exists(summary['consolidated']))
+        self.assertTrue(os.path.exists(summary['report']))
+        self.assertTrue(summary['output'].startswith('salida'))
+        self.assertFalse(os.path.exists('README.md'))
+        with HistoryStore(summary['history']) as history:
+            self.assertEqual(history.sheets(), ['Hoja A'])
+            self.assertEqual(history.series('Hoja A', 'INGRESOS')['valor'].tolist(), [1.0, 2.0])
+
+    def test_main_batch_exit_codes(self):
+        os.makedirs('vacia')
+        exit_code, summary = self.run_batch(['vacia', '--json'])
+        self.assertEqual(exit_code, EXIT_NO_FILES)
+        self.assertEqual(summary['status'], 'no_files')
+
+        os.makedirs('entrada')
+        self.write_quarter(os.path.join('entrada', 'Primer Trimestre.xlsx'), 1)
+        with open(os.path.join('entrada', 'Segundo Trimestre.xlsx'), 'w') as f:
+            f.write('no es un libro de Excel')
+        exit_code, summary = self.run_batch(['entrada', '--json', '-o', 'salida'])
+        self.assertEqual(exit_code, EXIT_FILE_ERRORS)
+        self.assertEqual(summary['status'], 'partial')
+        self.assertEqual([error['file'] for error in summary['errors']],
+                         [os.path.join('entrada', 'Segundo Trimestre.xlsx')])
+
+    def test_main_batch_rejects_duplicate_names(self):
+        for court in ('juzgado1', 'juzgado2'):
+            os.makedirs(court)
+            self.write_quarter(os.path.join(court, 'Primer Trimestre.xlsx'), 1)
+        exit_code, summary = self.run_batch(['juzgado1', 'juzgado2', '--json', '-o', 'salida'])
+        self.assertEqual(exit_code, EXIT_DUPLICATE_NAMES)
+        self.assertEqual(summary['status'], 'duplicate_names')
+        self.assertEqual([error['file'] for error in summary['errors']],
+                         [os.path.join('juzgado1', 'Primer Trimestre.xlsx'),
+                          os.path.join('juzgado2', 'Primer Trimestre.xlsx')])
+        self.assertIsNone(summary['consolidated'])
+        # El registro se escribe en la carpeta de salida
+        self.assertTrue(os.path.exists(os.path.join('salida', 'log.txt')))
+        self.assertFalse(os.path.exists('log.txt'))
+
+    def test_main_batch_low_memory(self):
+        os.makedirs('entrada')
+        self.write_quarter(os.path.join('entrada', 'Primer Trimestre.xlsx'), 1)
+        exit_code, summary = self.run_batch(['entrada', '--json', '-o', 'salida', '--results', 'skip',
+                                             '--workers', '2', '--memory-budget', '65536'])
+        self.assertEqual(exit_code, EXIT_OK)
+        with open(summary['report'], encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['memory_budget']['limit_bytes'], 65536 * 1024 * 1024)
+
+        exit_code, summary = self.run_batch(['entrada', '--json', '-o', 'limite', '--memory-budget', '1'])
+        self.assertEqual(exit_code, EXIT_ERROR)
+        self.assertEqual(summary['status'], 'error')
+        self.assertIn('límite de memoria', summary['errors'][0]['error'])
+
+    def test_main_batch_snapshot(self):
+        os.makedirs('entrada')
+        self.write_quarter(os.path.join('entrada', 'Primer Trimestre.xlsx'), 1)
+        self.write_quarter(os.path.join('entrada', 'Segundo Trimestre.xlsx'), 2)
+        exit_code, summary = self.run_batch(['entrada', '-o', 'salida', '--json', '--results', 'skip'])
+        if summary['snapshot'] is None:
+            self.skipTest("pyarrow no está instalado")
+        first = pd.read_excel(summary['consolidated'], sheet_name=None, header=None)
+
+        exit_code, summary = self.run_batch(['--snapshot', summary['snapshot'], '-o', 'recarga', '--json'])
+
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(summary['sheets'], 1)
+        self.assertTrue(summary['output'].startswith('recarga'))
+        second = pd.read_excel(summary['consolidated'], sheet_name=None, header=None)
+        pd.testing.assert_frame_equal(first['Hoja A'], second['Hoja A'])
+
+    def test_main_batch_district(self):
+        for court, year, value in [('Juzgado 01', '2023', 1), ('Juzgado 01', '2024', 2), ('Juzgado 02', '2024', 3)]:
+            os.makedirs(os.path.join('distrito', court, year))
+            self.write_quarter(os.path.join('distrito', court, year, 'Primer Trimestre.xlsx'), value)
+
+        exit_code, summary = self.run_batch(['distrito', '--district', '-o', 'salida', '--json'])
+
+        self.assertEqual(exit_code, EXIT_OK)
+        self.assertEqual(summary['shards'], 3)
+        self.assertEqual(summary['files'], 3)
+        self.assertEqual(os.path.basename(summary['consolidated']), 'Consolidado_Distrito.xlsx')
+        self.assertTrue(os.path.exists(summary['report']))
+
+    @patch('AnalizadorEstadisticoJudicial.extract_sheet')
+    def test_process_sheets(self, mock_extract_sheet):
+        mock_extract_sheet.return_value = SheetExtract(
+            [['Total', 0]] + [[None, i] for i in range(1, 19)], ['', 19], ['Total', 0]
+        )
 
         mock_xls = MagicMock()
         mock_xls.sheet_names = ['Sheet1']
@@ -70,11 +278,23 @@ class TestAnalizadorEstadisticoJudicial(unittest.TestCase):
 
         self.assertIn('Sheet1', all_sheets_data)
 
+    @patch('AnalizadorEstadisticoJudicial.extract_sheet')
+    def test_process_sheets_rejected(self, mock_extract_sheet):
+        mock_extract_sheet.return_value = None
+
+        mock_xls = MagicMock()
+        mock_xls.sheet_names = ['Sheet1']
+
+        all_sheets_data = {}
+        file_table = MagicMock()
+
+        process_sheets(mock_xls, 'test.xls', all_sheets_data, MagicMock(), file_table)
+
+        self.assertNotIn('Sheet1', all_sheets_data)
+        file_table.add_row.assert_called_once_with('test.xls', 'Sheet1', "La hoja no cumple con las condiciones necesarias")
+
     def test_process_rows(self):
-        data = pd.DataFrame({
-            0: [''] * 19 + ['Total'],
-            1: range(20)
-        })
+        data = SheetExtract([[''] * 2 for _ in range(19)], ['', 19], ['Total', 19])
         file = 'test.xls'
         all_sheets_data = {}
         writer = MagicMock()
@@ -84,7 +304,8 @@ class TestAnalizadorEstadisticoJudicial(unittest.TestCase):
         process_rows(data, file, all_sheets_data, writer, sheet, file_table)
 
         self.assertIn('Sheet1', all_sheets_data)
-        self.assertEqual(len(all_sheets_data['Sheet1']), 2)  # Titles and data
+        self.assertEqual(all_sheets_data['Sheet1'].titles, ['', 19])
+        self.assertEqual(all_sheets_data['Sheet1'].rows(), [['Total', 19, 'test']])
 
     def test_consolidate_data(self):
         data = [
@@ -102,13 +323,10 @@ class TestAnalizadorEstadisticoJudicial(unittest.TestCase):
         mock_wb = MagicMock()
         mock_workbook.return_value = mock_wb
 
-        all_sheets_data = {
-            'Sheet1': [
-                ['Title1', 'Title2'],
-                ['Total', 10, 20, 'Primer Trimestre'],
-                ['Total', 30, 40, 'Segundo Trimestre'],
-            ]
-        }
+        sheet_data = SheetData(['', 'Title1', 'Title2'])
+        sheet_data.add(['Total', 10, 20], 'Primer Trimestre')
+        sheet_data.add(['Total', 30, 40], 'Segundo Trimestre')
+        all_sheets_data = {'Sheet1': sheet_data}
         subfolder = 'test_subfolder/'
 
         create_consolidated_file(all_sheets_data, subfolder)
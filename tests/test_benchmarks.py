@@ -0,0 +1,53 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from excel_reader import extract_workbook
+from sierju_generator import generate_quarterly_files, write_workbook
+from bench_pipeline import compare
+
+class TestSierjuGenerator(unittest.TestCase):
+
+    def test_generated_workbook_matches_form(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = write_workbook(os.path.join(temp_dir, 'Primer Trimestre.xlsx'), 'Primer Trimestre',
+                                  sheets=3, columns=8, detail_rows=5)
+            results = extract_workbook(path)
+
+        self.assertEqual([sheet for sheet, _, _ in results], ['Hoja 1', 'Hoja 2', 'Hoja 3'])
+        for sheet, extract, error in results:
+            self.assertIsNone(error)
+            self.assertEqual(len(extract.header_rows), 19)
+            self.assertEqual(extract.header_rows[18][1], 'INVENTARIO INICIAL')
+            self.assertEqual(extract.row_20_titles, [''] + [f"COLUMNA {c}" for c in range(1, 9)])
+            self.assertEqual(extract.total_row_values[0], 'Total')
+            self.assertTrue(all(isinstance(value, int) for value in extract.total_row_values[1:]))
+
+    def test_generate_quarterly_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = generate_quarterly_files(temp_dir, parts=2, quarters=['Primer Trimestre', 'Segundo Trimestre'],
+                                             sheets=1, columns=2, detail_rows=1)
+            again = generate_quarterly_files(os.path.join(temp_dir, 'otra'), parts=2,
+                                             quarters=['Primer Trimestre', 'Segundo Trimestre'],
+                                             sheets=1, columns=2, detail_rows=1)
+            totals = [extract_workbook(path)[0][1].total_row_values for path in paths]
+            totals_again = [extract_workbook(path)[0][1].total_row_values for path in again]
+
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['Primer Trimestre_1.xlsx', 'Primer Trimestre_2.xlsx',
+                          'Segundo Trimestre_1.xlsx', 'Segundo Trimestre_2.xlsx'])
+        # Con la misma semilla los valores se repiten
+        self.assertEqual(totals, totals_again)
+
+    def test_compare_flags_regressions(self):
+        rows = compare({'web.lectura': 1.3, 'web.escritura': 1.0, 'nuevo': 2.0},
+                       {'web.lectura': 1.0, 'web.escritura': 1.0}, threshold=0.2)
+        self.assertEqual([(name, regression) for name, _, _, _, regression in rows],
+                         [('web.lectura', True), ('web.escritura', False), ('nuevo', False)])
+        self.assertIsNone(rows[2][3])
+
+if __name__ == '__main__':
+    unittest.main()
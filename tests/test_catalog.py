@@ -0,0 +1,76 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from catalog import FileCatalog
+
+class TestFileCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.files = [
+            'Segundo Trimestre.xlsx', 'Primer Trimestre_2.xls', 'Primer Trimestre_1.xls', '~$Primer Trimestre.xlsx',
+            'otro.xlsx', os.path.join('Juzgado 02', '2024', 'Primer Trimestre.xlsx'),
+            os.path.join('Juzgado 01', '2023', 'Cuarto Trimestre.xlsx'),
+            os.path.join('Juzgado 01', '2023', 'Tercer Trimestre.xlsx'),
+            os.path.join('Juzgado 01', '2023', 'anexos', 'Primer Trimestre.xlsx'),
+        ]
+        for name in self.files:
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'x' * len(name))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def relative(self, catalog):
+        return [os.path.relpath(path, self.root) for path in catalog.paths()]
+
+    def test_scan_flat(self):
+        catalog = FileCatalog.scan([self.root])
+        self.assertEqual(self.relative(catalog), ['Primer Trimestre_1.xls', 'Primer Trimestre_2.xls',
+                                                  'Segundo Trimestre.xlsx'])
+        entry = catalog.entries[1]
+        self.assertEqual((entry.quarter, entry.part, entry.folder), ('Primer Trimestre', 2, ()))
+        self.assertEqual(entry.size, len('Primer Trimestre_2.xls'))
+        self.assertIsNotNone(entry.mtime)
+
+    def test_scan_recursive_keeps_walk_order_within_a_period(self):
+        catalog = FileCatalog.scan([self.root], recursive=True)
+        self.assertEqual(self.relative(catalog)[:3], [
+            os.path.join('Juzgado 01', '2023', 'anexos', 'Primer Trimestre.xlsx'),
+            os.path.join('Juzgado 02', '2024', 'Primer Trimestre.xlsx'),
+            'Primer Trimestre_1.xls',
+        ])
+        years = {entry.path: entry.year for entry in catalog}
+        self.assertEqual(years[os.path.join(self.root, 'Juzgado 02', '2024', 'Primer Trimestre.xlsx')], 2024)
+        self.assertIsNone(years[os.path.join(self.root, 'Segundo Trimestre.xlsx')])
+
+    @unittest.skipUnless(hasattr(os, 'symlink') and os.name == 'posix', "Enlaces simbólicos POSIX")
+    def test_scan_recursive_does_not_follow_directory_links(self):
+        expected = self.relative(FileCatalog.scan([self.root], recursive=True))
+        # Un ciclo y un enlace a una carpeta hermana no agregan archivos
+        os.symlink(self.root, os.path.join(self.root, 'Juzgado 01', 'ciclo'))
+        os.symlink(os.path.join(self.root, 'Juzgado 02'), os.path.join(self.root, 'Juzgado 03'))
+        self.assertEqual(self.relative(FileCatalog.scan([self.root], recursive=True)), expected)
+
+    def test_shards(self):
+        shards = FileCatalog.scan([self.root], recursive=True, max_depth=2).shards()
+        self.assertEqual([(court, year, [entry.name for entry in entries]) for court, year, entries in shards], [
+            ('Juzgado 01', '2023', ['Tercer Trimestre.xlsx', 'Cuarto Trimestre.xlsx']),
+            ('Juzgado 02', '2024', ['Primer Trimestre.xlsx']),
+        ])
+
+    def test_from_uploads(self):
+        catalog = FileCatalog.from_uploads([('Tercer Trimestre.xls', b'abc'), ('Resumen.xlsx', b''),
+                                            ('Primer Trimestre 2024.xls', b'a')])
+        self.assertEqual(catalog.paths(), ['Resumen.xlsx', 'Primer Trimestre 2024.xls', 'Tercer Trimestre.xls'])
+        self.assertEqual(catalog.entries[1].year, 2024)
+        self.assertEqual(catalog.entries[2].size, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from charts import downsample, file_frame, trend_frame, trend_long
+from dataset import SheetData
+
+class TestCharts(unittest.TestCase):
+
+    def build_sheet(self):
+        sheet_data = SheetData(['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'])
+        sheet_data.add(['Total', 4, None, 'texto'], 'Segundo Trimestre.xls')
+        sheet_data.add(['Total', 2, 1.5], 'Primer Trimestre_2.xls')
+        sheet_data.add(['Total', 3, 0.5], 'Primer Trimestre_1.xls')
+        return sheet_data
+
+    def test_trend_frame_sums_parts(self):
+        trend = trend_frame(self.build_sheet())
+        self.assertEqual(list(trend.index), ['Primer Trimestre', 'Segundo Trimestre'])
+        self.assertEqual(list(trend.columns), ['INGRESOS', 'EGRESOS'])
+        self.assertEqual(str(trend['INGRESOS'].dtype), 'float32')
+        self.assertEqual(trend['INGRESOS'].tolist(), [5.0, 4.0])
+        self.assertTrue(pd.isna(trend.loc['Segundo Trimestre', 'EGRESOS']))
+
+        points = trend_long(trend, ['INGRESOS', 'EGRESOS'])
+        self.assertEqual(list(points.columns), ['Periodo', 'Columna', 'Valor'])
+        self.assertEqual(len(points), 4)
+
+    def test_file_frame_is_sorted_by_period(self):
+        sheet_data = self.build_sheet()
+        frame = file_frame(sheet_data.to_frame(), sheet_data)
+        self.assertEqual(frame['Archivo'].tolist(), ['Primer Trimestre_1.xls', 'Primer Trimestre_2.xls',
+                                                     'Segundo Trimestre.xls'])
+
+    def test_downsample_keeps_ends(self):
+        frame = pd.DataFrame({'valor': range(10000)})
+        points = downsample(frame, max_points=100)
+        self.assertEqual(len(points), 100)
+        self.assertEqual(points['valor'].iloc[0], 0)
+        self.assertEqual(points['valor'].iloc[-1], 9999)
+        self.assertIs(downsample(points, max_points=100), points)
+
+if __name__ == '__main__':
+    unittest.main()
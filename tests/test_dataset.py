@@ -0,0 +1,239 @@
+import unittest
+import os
+import sys
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import (SheetData, parse_source_label, consolidate, consolidation_rows, consolidate_data, merge_datasets,
+                     add_extract, compact_dataset, dataset_dict, requires_rebuild, update_dataset)
+from excel_reader import SheetExtract
+from templates import TemplateRegistry
+
+class TestDataset(unittest.TestCase):
+
+    def build_sheet(self):
+        sheet_data = SheetData(['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'], [['Encabezado']])
+        sheet_data.add(['Total', 5, 1.5, 'texto'], 'Segundo Trimestre.xls')
+        sheet_data.add(['Total', 3, None, None], 'Primer Trimestre_2.xls')
+        sheet_data.add(['Total', 2, 0.5], 'Primer Trimestre_1.xls')
+        return sheet_data
+
+    def test_parse_source_label(self):
+        self.assertEqual(parse_source_label('Tercer Trimestre_2.xls'), ('Tercer Trimestre', 2))
+        self.assertEqual(parse_source_label('Cuarto Trimestre'), ('Cuarto Trimestre', 0))
+        self.assertEqual(parse_source_label('Resumen.xls'), (None, 0))
+
+    def test_typed_columns(self):
+        sheet_data = self.build_sheet()
+        self.assertEqual(str(sheet_data.values[1].dtype), 'Int64')
+        self.assertEqual(str(sheet_data.values[2].dtype), 'float64')
+        self.assertEqual(str(sheet_data.values[3].dtype), 'object')
+        self.assertEqual(list(sheet_data.labels['parte']), [0, 2, 1])
+        self.assertEqual(str(sheet_data.labels['periodo'].dtype), 'category')
+
+    def test_rows_sorted(self):
+        rows = self.build_sheet().rows(sort=True)
+        self.assertEqual(rows, [
+            ['Total', 2, 0.5, None, 'Primer Trimestre_1.xls'],
+            ['Total', 3, None, None, 'Primer Trimestre_2.xls'],
+            ['Total', 5, 1.5, 'texto', 'Segundo Trimestre.xls'],
+        ])
+        self.assertEqual(self.build_sheet().rows(sort=True, start=1, stop=2), rows[1:2])
+
+    def test_add_widens_sheet(self):
+        sheet_data = SheetData(['', 'INGRESOS'])
+        sheet_data.add(['Total', 1], 'Primer Trimestre.xls')
+        sheet_data.values
+        sheet_data.add(['Total', 2], 'Segundo Trimestre.xls')
+        # Las columnas de un archivo más ancho no se recortan
+        sheet_data.add(['Total', 3, 4], 'Tercer Trimestre.xls', ['', 'INGRESOS', 'EGRESOS'])
+
+        self.assertEqual(sheet_data.titles, ['', 'INGRESOS', 'EGRESOS'])
+        self.assertEqual(sheet_data.rows(), [['Total', 1, None, 'Primer Trimestre.xls'],
+                                             ['Total', 2, None, 'Segundo Trimestre.xls'],
+                                             ['Total', 3, 4, 'Tercer Trimestre.xls']])
+        self.assertEqual(str(sheet_data.values[2].dtype), 'Int64')
+
+        other = SheetData(['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'])
+        other.add(['Total', 5, 6, 'nota'], 'Cuarto Trimestre.xls')
+        sheet_data.compact()
+        sheet_data.extend(other)
+        self.assertEqual(sheet_data.titles, ['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'])
+        self.assertEqual(sheet_data.rows()[-1], ['Total', 5, 6, 'nota', 'Cuarto Trimestre.xls'])
+        self.assertEqual(sheet_data.rows()[0], ['Total', 1, None, None, 'Primer Trimestre.xls'])
+
+    def test_extend_keeps_types(self):
+        sheet_data = self.build_sheet()
+        other = SheetData(['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'])
+        other.add(['Total', 7, 2, None], 'Cuarto Trimestre.xls')
+        all_sheets_data = {'Hoja': sheet_data}
+        merge_datasets(all_sheets_data, {'Hoja': other, 'Otra': other})
+
+        self.assertEqual(len(all_sheets_data['Hoja']), 4)
+        self.assertEqual(str(all_sheets_data['Hoja'].values[1].dtype), 'Int64')
+        self.assertEqual(list(all_sheets_data), ['Hoja', 'Otra'])
+
+    def test_extend_materialized_and_pending_rows(self):
+        other = self.build_sheet()
+        other.values
+        other.add(['Total', 7, 2, None], 'Cuarto Trimestre.xls')
+        sheet_data = SheetData(['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'])
+        sheet_data.extend(other)
+
+        self.assertEqual(sheet_data.rows(), other.rows())
+
+    def test_consolidate_data_ignores_blanks(self):
+        result = consolidate_data(self.build_sheet())
+        self.assertEqual(result[0], ['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'])
+        self.assertEqual(result[1], ['Total', 5, 0.5, None, 'Primer Trimestre'])
+        self.assertEqual(result[2], ['Total', 5, 1.5, None, 'Segundo Trimestre'])
+
+    def test_consolidate_rollups(self):
+        sheet_data = SheetData(['', 'INGRESOS', 'EGRESOS'])
+        sheet_data.add(['Total', 1, None], 'Primer Trimestre')
+        sheet_data.add(['Total', 2, None], 'Tercer Trimestre_1')
+        sheet_data.add(['Total', 3, 4], 'Tercer Trimestre_2')
+        sheet_data.add(['Total', 4, None], 'Cuarto Trimestre')
+
+        result = consolidate(sheet_data)
+
+        self.assertEqual(list(result.index), ['Primer Trimestre', 'Tercer Trimestre', 'Cuarto Trimestre',
+                                              'Primer Semestre', 'Segundo Semestre', 'Anual'])
+        self.assertEqual(list(result[1]), [1, 5, 4, 1, 9, 10])
+        # Un periodo sin valores queda vacío en lugar de sumar 0
+        self.assertTrue(result.loc['Primer Trimestre', 2] is pd.NA)
+        self.assertEqual(consolidation_rows(sheet_data)[-1], ['Total', 10, 4, 'Anual'])
+
+    def test_shared_header_templates(self):
+        templates = TemplateRegistry()
+        all_sheets_data = {}
+        titles = ['', 'INGRESOS']
+        for sheet in ['Hoja1', 'Hoja2']:
+            add_extract(all_sheets_data, sheet, SheetExtract([['Encabezado']], list(titles), ['Total', 1]),
+                        'Primer Trimestre.xls', templates=templates)
+        add_extract(all_sheets_data, 'Hoja3', SheetExtract([['Otro']], list(titles), ['Total', 2]),
+                    'Primer Trimestre.xls', templates=templates)
+
+        self.assertIs(all_sheets_data['Hoja1'].header_rows, all_sheets_data['Hoja2'].header_rows)
+        self.assertIs(all_sheets_data['Hoja1'].header_rows[0], all_sheets_data['Hoja2'].header_rows[0])
+        result = dataset_dict(all_sheets_data)
+        self.assertEqual(len(result['plantillas']), 2)
+        self.assertEqual(result['hojas']['Hoja1']['plantilla'], result['hojas']['Hoja2']['plantilla'])
+        self.assertEqual(result['hojas']['Hoja3']['filas'], [['Total', 2, 'Primer Trimestre.xls']])
+
+        preview = dataset_dict({'Hoja': self.build_sheet()}, max_rows=2)
+        self.assertEqual(preview['hojas']['Hoja']['total_filas'], 3)
+        self.assertEqual(len(preview['hojas']['Hoja']['filas']), 2)
+
+    def test_update_dataset_matches_full_processing(self):
+        titles = ['', 'INGRESOS', 'OBSERVACIONES']
+        files = {'Primer Trimestre.xls': {'Hoja1': ['Total', 1, 'nota'], 'Hoja2': ['Total', 5, None]},
+                 'Segundo Trimestre.xls': {'Hoja1': ['Total', 2, None]},
+                 'Tercer Trimestre.xls': {'Hoja1': ['Total', 3, None]}}
+
+        def build(names, data=None):
+            data = {} if data is None else data
+            for name in names:
+                for sheet, total in files[name].items():
+                    add_extract(data, sheet, SheetExtract(None, titles, total), name)
+            return data
+
+        all_sheets_data = build(['Primer Trimestre.xls', 'Tercer Trimestre.xls'])
+        # Se corrige el primer trimestre (sin Hoja2) y se agrega el segundo
+        files['Primer Trimestre.xls'] = {'Hoja1': ['Total', 4, None]}
+        order = ['Primer Trimestre.xls', 'Segundo Trimestre.xls', 'Tercer Trimestre.xls']
+        changed = update_dataset(all_sheets_data, build(order[:2]), ['Primer Trimestre.xls'], order)
+
+        self.assertEqual(changed, {'Hoja1', 'Hoja2'})
+        expected = build(order)
+        self.assertEqual(list(all_sheets_data), ['Hoja1'])
+        self.assertEqual(all_sheets_data['Hoja1'], expected['Hoja1'])
+        self.assertEqual(list(all_sheets_data['Hoja1'].values.dtypes), list(expected['Hoja1'].values.dtypes))
+
+    def test_update_dataset_on_compacted_sheets(self):
+        titles = ['', 'INGRESOS']
+        order = ['Primer Trimestre.xls', 'Segundo Trimestre.xls', 'Tercer Trimestre.xls']
+
+        def build(names):
+            data = {}
+            for name in names:
+                add_extract(data, 'Hoja1', SheetExtract(None, titles, ['Total', order.index(name) + 1]), name)
+            return data
+
+        all_sheets_data = build(['Primer Trimestre.xls', 'Tercer Trimestre.xls'])
+        compact_dataset(all_sheets_data)
+        # El archivo compactado es una categoría; agregar uno intermedio obliga a reordenar las filas
+        changed = update_dataset(all_sheets_data, build(['Segundo Trimestre.xls']), [], order)
+
+        self.assertEqual(changed, {'Hoja1'})
+        self.assertEqual(all_sheets_data['Hoja1'], build(order)['Hoja1'])
+        self.assertEqual(str(all_sheets_data['Hoja1'].labels['archivo'].dtype), 'category')
+
+    def test_update_dataset_detects_template_changes(self):
+        files = {'Primer Trimestre.xls': {'Hoja1': (['', 'A', 'B'], ['Total', 1, 5])},
+                 'Segundo Trimestre.xls': {'Hoja1': (['', 'A', 'B'], ['Total', 2, 6]), 'Hoja3': (['', 'C'], ['Total', 7])},
+                 'Tercer Trimestre.xls': {'Hoja1': (['', 'A'], ['Total', 3]), 'Hoja2': (['', 'D'], ['Total', 4])}}
+        order = list(files)
+
+        def build(names):
+            data = {}
+            for name in names:
+                for sheet, (titles, total) in files[name].items():
+                    add_extract(data, sheet, SheetExtract([[name]], titles, total), name)
+            return data
+
+        # Un archivo agregado antes del que define la hoja, con más columnas, cambia sus títulos
+        all_sheets_data = build(order[2:])
+        self.assertTrue(requires_rebuild(all_sheets_data, build(order[:1]), [], order))
+        # También si se modifica o se quita el archivo que define la hoja
+        self.assertTrue(requires_rebuild(all_sheets_data, {}, ['Tercer Trimestre.xls'], order))
+
+        # Un archivo posterior con las mismas columnas se incorpora sin cambiar el resultado, y las
+        # hojas nuevas quedan en el orden de los archivos
+        all_sheets_data = build([order[0], order[2]])
+        new_data = build([order[1]])
+        self.assertFalse(requires_rebuild(all_sheets_data, new_data, [], order))
+        update_dataset(all_sheets_data, new_data, [], order)
+        expected = build(order)
+        self.assertEqual(list(all_sheets_data), ['Hoja1', 'Hoja3', 'Hoja2'])
+        self.assertEqual(list(all_sheets_data), list(expected))
+        self.assertEqual(all_sheets_data, expected)
+
+        # Un archivo nuevo con menos columnas se completa con celdas vacías; uno con más columnas
+        # ensancharía la hoja con títulos que dependen del orden de los archivos
+        files['Cuarto Trimestre.xls'] = {'Hoja1': (['', 'A'], ['Total', 4])}
+        order.append('Cuarto Trimestre.xls')
+        new_data = build(order[3:])
+        self.assertFalse(requires_rebuild(all_sheets_data, new_data, [], order))
+        update_dataset(all_sheets_data, new_data, [], order)
+        self.assertEqual(all_sheets_data, build(order))
+        files['Cuarto Trimestre_2.xls'] = {'Hoja1': (['', 'A', 'B', 'C'], ['Total', 5, 8, 9])}
+        order.append('Cuarto Trimestre_2.xls')
+        self.assertTrue(requires_rebuild(all_sheets_data, build(order[4:]), [], order))
+
+    def test_compact_keeps_values(self):
+        sheet_data = self.build_sheet()
+        sheet_data.add(['Total', 70000, 0.1], 'Tercer Trimestre.xls')
+        expected = self.build_sheet()
+        expected.add(['Total', 70000, 0.1], 'Tercer Trimestre.xls')
+
+        compact_dataset({'Hoja': sheet_data})
+        self.assertEqual(str(sheet_data.values[1].dtype), 'Int32')
+        # 0.1 no se representa exactamente en float32
+        self.assertEqual(str(sheet_data.values[2].dtype), 'float64')
+        self.assertEqual(str(sheet_data.labels['archivo'].dtype), 'category')
+        self.assertEqual(sheet_data.rows(sort=True), expected.rows(sort=True))
+        self.assertEqual(consolidation_rows(sheet_data), consolidation_rows(expected))
+
+        # Las filas que se agregan o eliminan después conservan los tipos compactos
+        sheet_data.add(['Total', 1, 0.5], 'Cuarto Trimestre.xls')
+        self.assertEqual(str(sheet_data.values[1].dtype), 'Int32')
+        self.assertEqual(str(sheet_data.labels['archivo'].dtype), 'category')
+        self.assertEqual(sheet_data.rows(sort=True)[-1][:3], ['Total', 1, 0.5])
+        sheet_data.drop_sources(['Tercer Trimestre.xls'])
+        self.assertEqual(str(sheet_data.values[1].dtype), 'Int8')
+        self.assertEqual(str(sheet_data.labels['concepto'].dtype), 'category')
+        self.assertEqual(compact_dataset({'Hoja': sheet_data}), 0)
+
+if __name__ == '__main__':
+    unittest.main()
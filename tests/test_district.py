@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import tempfile
+
+from openpyxl import load_workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from district import find_shards, map_shards, reduce_shards, write_district_workbook
+from sierju_generator import generate_quarterly_files
+from dataset import QUARTERS
+
+class TestDistrict(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        for court, year, parts in [('Juzgado 01', '2023', 1), ('Juzgado 01', '2024', 2), ('Juzgado 02', '2024', 1)]:
+            generate_quarterly_files(os.path.join(self.root, court, year), parts,
+                                     sheets=2, columns=4, detail_rows=3, seed=court)
+        os.makedirs(os.path.join(self.root, 'Juzgado 03', '2024'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_find_shards(self):
+        shards = find_shards([self.root])
+        self.assertEqual([(shard.court, shard.year) for shard in shards],
+                         [('Juzgado 01', '2023'), ('Juzgado 01', '2024'), ('Juzgado 02', '2024')])
+        self.assertEqual(len(shards[1].files), 8)
+        self.assertEqual(os.path.basename(shards[1].files[0]), 'Primer Trimestre_1.xlsx')
+
+    def test_map_reduce(self):
+        shard_results = map_shards(find_shards([self.root]))
+        district = reduce_shards(shard_results)
+
+        self.assertEqual(district.sheets(), ['Hoja 1', 'Hoja 2'])
+        self.assertEqual(sum(len(result.errors) for result in shard_results), 0)
+        frame = district.frames['Hoja 1']
+        self.assertEqual(len(frame), 12)
+        self.assertEqual(list(frame.index.get_level_values('periodo')[:4]), QUARTERS)
+
+        # El trimestre de un despacho con dos partes suma las dos
+        quarters = shard_results[1].sheets['Hoja 1'][1]
+        self.assertEqual(frame.loc[('Juzgado 01', '2024', 'Primer Trimestre'), 1], quarters.loc['Primer Trimestre', 1])
+
+        rollup = district.district_rollup('Hoja 1')
+        self.assertEqual(list(rollup.loc['2024'].index), QUARTERS + ['Primer Semestre', 'Segundo Semestre', 'Anual'])
+        year_total = frame.xs('2024', level='año')[1].sum()
+        self.assertEqual(rollup.loc[('2024', 'Anual'), 1], year_total)
+
+        breakdown = district.court_breakdown('Hoja 1')
+        self.assertEqual(list(breakdown.index), [('Juzgado 01', '2023'), ('Juzgado 01', '2024'), ('Juzgado 02', '2024')])
+        self.assertEqual(breakdown[1].sum(), frame[1].sum())
+
+    def test_parallel_map_matches_serial(self):
+        shards = find_shards([self.root])
+        serial = reduce_shards(map_shards(shards))
+        parallel = reduce_shards(map_shards(shards, workers=2))
+        for sheet in serial.sheets():
+            self.assertTrue(serial.frames[sheet].equals(parallel.frames[sheet]))
+
+    def test_write_district_workbook(self):
+        district = reduce_shards(map_shards(find_shards([self.root])))
+        path = os.path.join(self.root, 'Consolidado_Distrito.xlsx')
+        write_district_workbook(district, path)
+
+        rows = list(load_workbook(path, read_only=True)['Hoja 1'].values)
+        self.assertEqual(rows[0][0], "Detalle por despacho")
+        self.assertEqual(rows[1][:4], ("Despacho", "Año", "Periodo", "COLUMNA 1"))
+        self.assertEqual(rows[2][:3], ('Juzgado 01', '2023', 'Primer Trimestre'))
+        sections = [row[0] for row in rows if row and row[0] in ("Total del distrito", "Total anual por despacho")]
+        self.assertEqual(sections, ["Total del distrito", "Total anual por despacho"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import sys
+import tempfile
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from excel_reader import open_workbook, release_sheet, extract_sheet
+
+try:
+    import xlwt
+except ImportError:
+    xlwt = None
+
+
+class TestExcelReader(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_open_workbook_xlsx(self):
+        path = os.path.join(self.temp_dir.name, 'Primer Trimestre.xlsx')
+        wb = Workbook()
+        wb.remove(wb.active)
+        for name in ['Hoja1', 'Hoja2']:
+            ws = wb.create_sheet(name)
+            ws.append(['Total', 1, 2])
+        wb.save(path)
+
+        with open_workbook(path) as xls:
+            self.assertEqual(xls.sheet_names, ['Hoja1', 'Hoja2'])
+            data = pd.read_excel(xls, sheet_name='Hoja2', header=None)
+            release_sheet(xls, 'Hoja2')
+
+        self.assertEqual(data.iloc[0].tolist(), ['Total', 1, 2])
+
+    @unittest.skipIf(xlwt is None, "xlwt no está instalado")
+    def test_open_workbook_xls_on_demand(self):
+        path = os.path.join(self.temp_dir.name, 'Primer Trimestre.xls')
+        book = xlwt.Workbook()
+        for name in ['Hoja1', 'Hoja2']:
+            book.add_sheet(name).write(0, 0, 'Total')
+        book.save(path)
+
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        with open_workbook(content, 'Primer Trimestre.xls') as xls:
+            self.assertTrue(xls.book.on_demand)
+            data = pd.read_excel(xls, sheet_name='Hoja1', header=None)
+            self.assertTrue(xls.book.sheet_loaded('Hoja1'))
+            release_sheet(xls, 'Hoja1')
+            self.assertFalse(xls.book.sheet_loaded('Hoja1'))
+
+        self.assertEqual(data.iloc[0, 0], 'Total')
+
+    def build_sierju_xlsx(self, detail_rows, with_total=True):
+        path = os.path.join(self.temp_dir.name, 'Segundo Trimestre.xlsx')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Formulario'
+        for i in range(19):
+            ws.append([f"Encabezado {i}"])
+        ws.append(['', 'INGRESOS', 'EGRESOS'])
+        for i in range(detail_rows):
+            ws.append([f"Proceso {i}", i, None])
+        if with_total:
+            ws.append(['Total', 10, 2.0])
+        for i in range(detail_rows):
+            ws.append([f"Nota {i}"])
+        wb.save(path)
+        return path
+
+    def test_extract_sheet_xlsx(self):
+        path = self.build_sierju_xlsx(detail_rows=5)
+        with open_workbook(path) as xls:
+            extract = extract_sheet(xls, 'Formulario')
+
+        self.assertEqual(len(extract.header_rows), 19)
+        self.assertEqual(extract.header_rows[0], ['Encabezado 0', None, None])
+        self.assertEqual(extract.row_20_titles, ['', 'INGRESOS', 'EGRESOS'])
+        self.assertEqual(extract.total_row_values, ['Total', 10, 2])
+
+    def test_extract_sheet_without_total(self):
+        path = self.build_sierju_xlsx(detail_rows=5, with_total=False)
+        with open_workbook(path) as xls:
+            self.assertIsNone(extract_sheet(xls, 'Formulario'))
+
+    @unittest.skipIf(xlwt is None, "xlwt no está instalado")
+    def test_extract_sheet_xls_matches_pandas(self):
+        path = os.path.join(self.temp_dir.name, 'Tercer Trimestre.xls')
+        book = xlwt.Workbook()
+        ws = book.add_sheet('Formulario')
+        for i in range(19):
+            ws.write(i, 0, f"Encabezado {i}")
+        ws.write(19, 1, 'INGRESOS')
+        ws.write(19, 2, 'EGRESOS')
+        ws.write(20, 0, 'Total')
+        ws.write(20, 1, 7)
+        ws.write(20, 2, 1.5)
+        book.save(path)
+
+        with open_workbook(path) as xls:
+            extract = extract_sheet(xls, 'Formulario')
+            data = pd.read_excel(xls, sheet_name='Formulario', header=None)
+
+        self.assertEqual(extract.row_20_titles, [''] + data.iloc[19, 1:].tolist())
+        self.assertEqual(extract.total_row_values, ['Total'] + data.iloc[20, 1:].tolist())
+        self.assertIsNone(extract.header_rows[0][1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from history import MEMORY, HistoryStore, year_from_path
+
+class TestHistoryStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'historial.sqlite')
+        self.history = HistoryStore(self.path)
+        self.titles = ['', 'INGRESOS', 'EGRESOS', None]
+
+    def tearDown(self):
+        self.history.close()
+        self.temp_dir.cleanup()
+
+    def test_series_sums_parts_by_year_and_quarter(self):
+        self.history.upsert_file('a', 'Primer Trimestre_1.xls', [('Hoja1', self.titles, ['Total', 2, 1, 'nota'])], year=2023)
+        self.history.upsert_file('b', 'Primer Trimestre_2.xls', [('Hoja1', self.titles, ['Total', 3, None])], year=2023)
+        self.history.upsert_file('c', 'Segundo Trimestre.xls', [('Hoja1', self.titles, ['Total', 7, 4])], year=2023)
+        self.history.upsert_file('d', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 10, 0])], year=2024)
+
+        self.assertEqual(self.history.years(), [2023, 2024])
+        self.assertEqual(self.history.sheets(), ['Hoja1'])
+        self.assertEqual(self.history.titles('Hoja1'), ['INGRESOS', 'EGRESOS', 'Columna 4'])
+
+        series = self.history.series('Hoja1', 'INGRESOS')
+        self.assertEqual(series.values.tolist(), [[2023, 'Primer Trimestre', 5.0], [2023, 'Segundo Trimestre', 7.0],
+                                                  [2024, 'Primer Trimestre', 10.0]])
+
+        comparison = self.history.compare('Hoja1', 'INGRESOS')
+        self.assertEqual(list(comparison.index), ['Primer Trimestre', 'Segundo Trimestre'])
+        self.assertEqual(comparison.loc['Primer Trimestre', 2024], 10.0)
+
+    def test_upsert_is_idempotent_and_replaces_old_versions(self):
+        self.assertEqual(self.history.upsert_file('a', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 2, 1])],
+                                                  year=2024, origin='juzgado1'), 3)
+        self.history.upsert_file('a', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 2, 1])],
+                                 year=2024, origin='juzgado1')
+        self.history.upsert_file('b', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 5, 1])],
+                                 year=2024, origin='juzgado2')
+        self.assertEqual(self.history.series('Hoja1', 'INGRESOS')['valor'].tolist(), [7.0])
+
+        # Una versión corregida del mismo archivo reemplaza a la anterior
+        self.history.upsert_file('c', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 4, 1])],
+                                 year=2024, origin='juzgado1')
+        self.assertEqual(self.history.series('Hoja1', 'INGRESOS')['valor'].tolist(), [9.0])
+        self.assertFalse(self.history.has_file('a'))
+        self.assertTrue(self.history.has_file('c'))
+
+    def test_reopen_keeps_data(self):
+        self.history.upsert_file('a', 'Tercer Trimestre.xls', [('Hoja1', self.titles, ['Total', 2, 1])], year=2024)
+        self.history.close()
+        self.history = HistoryStore(self.path)
+        self.assertEqual(self.history.series('Hoja1', 'EGRESOS')['periodo'].tolist(), ['Tercer Trimestre'])
+
+    def test_memory_stores_are_independent(self):
+        # Así funciona el historial de cada sesión de la aplicación web
+        with HistoryStore(MEMORY) as first, HistoryStore(MEMORY) as second:
+            first.upsert_file('a', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 2, 1])], year=2024)
+            second.upsert_file('b', 'Primer Trimestre.xls', [('Hoja1', self.titles, ['Total', 5, 1])], year=2024)
+            self.assertEqual(first.series('Hoja1', 'INGRESOS')['valor'].tolist(), [2.0])
+            self.assertEqual(second.series('Hoja1', 'INGRESOS')['valor'].tolist(), [5.0])
+        self.assertFalse(os.path.exists(MEMORY))
+
+    def test_year_from_path(self):
+        self.assertEqual(year_from_path(os.path.join('datos', 'Juzgado 01', '2024', 'Primer Trimestre.xls')), 2024)
+        self.assertEqual(year_from_path(os.path.join('datos', 'Primer Trimestre 2023.xls')), 2023)
+        self.assertIsNone(year_from_path(os.path.join('datos', 'Primer Trimestre_12345.xls')))
+
+if __name__ == '__main__':
+    unittest.main()
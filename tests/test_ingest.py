@@ -0,0 +1,77 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from ingest import SheetResult, WorkbookResult, ordered_map, stream_workbooks
+from parse_cache import ParseCache
+from sierju_generator import generate_quarterly_files
+
+def square(value):
+    if value < 0:
+        raise ValueError("negativo")
+    return value * value
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        paths = generate_quarterly_files(os.path.join(self.temp_dir.name, 'datos'), sheets=2, columns=3,
+                                         detail_rows=2)
+        self.sources = [(os.path.basename(path), path) for path in paths]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def kinds(self, results):
+        return [(type(result).__name__, result.file, getattr(result, 'sheet', None)) for result in results]
+
+    def test_stream_yields_sheets_then_workbook_in_order(self):
+        sources = self.sources[:2] + [('Cuarto Trimestre.xlsx', b'no es un libro')]
+        results = list(stream_workbooks(sources))
+        self.assertEqual(self.kinds(results), [
+            ('SheetResult', 'Primer Trimestre.xlsx', 'Hoja 1'), ('SheetResult', 'Primer Trimestre.xlsx', 'Hoja 2'),
+            ('WorkbookResult', 'Primer Trimestre.xlsx', None),
+            ('SheetResult', 'Segundo Trimestre.xlsx', 'Hoja 1'), ('SheetResult', 'Segundo Trimestre.xlsx', 'Hoja 2'),
+            ('WorkbookResult', 'Segundo Trimestre.xlsx', None),
+            ('WorkbookResult', 'Cuarto Trimestre.xlsx', None),
+        ])
+        self.assertEqual(results[0].extract.total_row_values[0], 'Total')
+        self.assertIsNone(results[2].error)
+        self.assertEqual(len(results[2].sheet_results), 2)
+        self.assertTrue(results[-1].error)
+
+    def test_parallel_stream_matches_serial(self):
+        cache = ParseCache(os.path.join(self.temp_dir.name, 'cache'))
+        serial = list(stream_workbooks(self.sources, cache=cache))
+        parallel = list(stream_workbooks(self.sources, workers=2, cache=cache))
+        self.assertEqual(self.kinds(parallel), self.kinds(serial))
+        self.assertEqual([result.extract for result in parallel if isinstance(result, SheetResult)],
+                         [result.extract for result in serial if isinstance(result, SheetResult)])
+        self.assertTrue(all(result.cache_hit for result in parallel if isinstance(result, WorkbookResult)))
+
+    def test_cancel_stops_the_stream(self):
+        cancel = threading.Event()
+        results = []
+        for result in stream_workbooks(self.sources, cancel=cancel):
+            results.append(result)
+            if len(results) == 3:
+                cancel.set()
+        self.assertEqual(len(results), 3)
+
+        # Cerrar el generador también detiene la lectura
+        stream = stream_workbooks(self.sources, workers=2)
+        next(stream)
+        stream.close()
+
+    def test_ordered_map(self):
+        results = list(ordered_map(square, [3, -1, 2, 5], workers=2, window=2))
+        self.assertEqual([(item, result) for item, result, _ in results], [(3, 9), (-1, None), (2, 4), (5, 25)])
+        self.assertIsInstance(results[1][2], ValueError)
+        self.assertEqual([result for _, result, _ in ordered_map(square, range(4))], [0, 1, 4, 9])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import streamlit as st
+import main
+from run_report import RunReport, MemoryBudget
+from sierju_generator import write_workbook
+
+class TestProcessUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # La caché de la prueba no comparte la carpeta del usuario
+        self.cache_dir = main.PARSE_CACHE_DIR
+        main.PARSE_CACHE_DIR = os.path.join(self.temp_dir.name, 'cache')
+        for key in list(st.session_state):
+            del st.session_state[key]
+        st.session_state.all_sheets_data = None
+        st.session_state.file_hashes = None
+        st.session_state.history_year = None
+
+    def tearDown(self):
+        main.PARSE_CACHE_DIR = self.cache_dir
+        self.temp_dir.cleanup()
+
+    def upload(self, quarter, seed=0):
+        path = write_workbook(os.path.join(self.temp_dir.name, f"{quarter}.xlsx"), quarter,
+                              sheets=2, columns=4, detail_rows=3, seed=seed)
+        with open(path, 'rb') as f:
+            return f"{quarter}.xlsx", f.read()
+
+    def test_low_memory_second_upload_matches_full_processing(self):
+        first = [self.upload('Primer Trimestre'), self.upload('Tercer Trimestre')]
+        main.process_uploads(first, RunReport(), budget=MemoryBudget(None), low_memory=True)
+        self.assertEqual(str(st.session_state.all_sheets_data['Hoja 1'].labels['archivo'].dtype), 'category')
+
+        # El segundo procesamiento agrega un archivo intermedio a los datos ya compactados
+        second = [first[0], self.upload('Segundo Trimestre'), first[1]]
+        changed = main.process_uploads(second, RunReport(), budget=MemoryBudget(None), low_memory=True)
+        incremental = st.session_state.all_sheets_data
+
+        self.assertEqual(changed, {'Hoja 1', 'Hoja 2'})
+        self.assertEqual(incremental['Hoja 1'].labels['archivo'].tolist(), [name for name, _ in second])
+        st.session_state.file_hashes = None
+        main.process_uploads(second, RunReport())
+        self.assertEqual(incremental, st.session_state.all_sheets_data)
+
+if __name__ == '__main__':
+    unittest.main()
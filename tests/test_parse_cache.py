@@ -0,0 +1,102 @@
+import unittest
+import os
+import sys
+import stat
+import tempfile
+import time
+from datetime import datetime, time as day_time
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from excel_reader import SheetExtract
+from parse_cache import ParseCache, file_digest, cached_extract_workbook
+from templates import TemplateRegistry
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = ParseCache(os.path.join(self.temp_dir.name, 'cache'))
+        self.sheet_results = [
+            ('Hoja1', SheetExtract([['Encabezado']], ['', 'INGRESOS'], ['Total', 5]), None),
+            ('Hoja2', None, None),
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_file_digest(self):
+        path = os.path.join(self.temp_dir.name, 'Primer Trimestre.xls')
+        with open(path, 'wb') as f:
+            f.write(b'contenido')
+        self.assertEqual(file_digest(path), file_digest(b'contenido'))
+        self.assertNotEqual(file_digest(path), file_digest(b'otro contenido'))
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get('abc'))
+        self.cache.put('abc', self.sheet_results)
+        self.assertEqual(self.cache.get('abc'), self.sheet_results)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_entries_keep_types_and_shared_rows(self):
+        templates = TemplateRegistry()
+        header = [['Fecha de corte:', datetime(2024, 3, 31)], ['Hora:', day_time(8, 30)], [1, 1.5, True, None]]
+        first = templates.intern(header, ['', 'INGRESOS'])
+        second = templates.intern(header[:2] + [['otra']], ['', 'INGRESOS'])
+        sheet_results = [('Hoja1', SheetExtract(first.header_rows, first.titles, ['Total', 5, 0.5]), None),
+                         ('Hoja2', SheetExtract(second.header_rows, second.titles, ['Total', None, 'x']), None),
+                         ('Hoja3', SheetExtract(None, ['', 'A'], ['Total', 1]), None),
+                         ('Hoja4', None, 'error de lectura')]
+        self.cache.put('abc', sheet_results)
+
+        loaded = self.cache.get('abc')
+        self.assertEqual(loaded, sheet_results)
+        self.assertEqual([type(value) for value in loaded[0][1].header_rows[2]], [int, float, bool, type(None)])
+        self.assertIs(loaded[0][1].header_rows[0], loaded[1][1].header_rows[0])
+        self.assertIs(loaded[0][1].row_20_titles, loaded[1][1].row_20_titles)
+
+    def test_entries_are_not_executable(self):
+        self.cache.put('abc', self.sheet_results)
+        with open(self.cache._entry_path('abc'), 'wb') as f:
+            f.write(b'\x80\x04\x95no es JSON')
+        self.assertIsNone(self.cache.get('abc'))
+
+    @unittest.skipUnless(os.name == 'posix', "Permisos POSIX")
+    def test_directory_is_private(self):
+        self.cache.put('abc', self.sheet_results)
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache.directory).st_mode) & 0o077, 0)
+
+        os.chmod(self.cache.directory, 0o777)
+        self.assertIsNone(self.cache.get('abc'))
+        with self.assertRaises(PermissionError):
+            self.cache.put('abc', self.sheet_results)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('a', self.sheet_results)
+        self.cache.put('b', self.sheet_results)
+        entry_size = os.path.getsize(self.cache._entry_path('a'))
+        # 'a' se usa después de 'b', por lo que 'b' es la entrada menos reciente
+        old = time.time() - 60
+        os.utime(self.cache._entry_path('b'), (old, old))
+        self.cache.get('a')
+
+        self.cache.max_bytes = entry_size * 2
+        self.cache.put('c', self.sheet_results)
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    @patch('parse_cache.extract_workbook')
+    def test_cached_extract_workbook(self, mock_extract_workbook):
+        mock_extract_workbook.return_value = self.sheet_results
+
+        first = cached_extract_workbook(b'contenido', 'Primer Trimestre.xls', self.cache)
+        second = cached_extract_workbook(b'contenido', 'Primer Trimestre.xls', self.cache)
+
+        self.assertEqual(first, (self.sheet_results, False))
+        self.assertEqual(second, (self.sheet_results, True))
+        mock_extract_workbook.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from run_log import start_logging, stop_logging, log_message, log_queue, init_worker_logging
+
+def log_from_worker(sheet):
+    log_message(f"Procesando hoja: {sheet}", file='Primer Trimestre.xls', sheet=sheet, stage="hojas")
+    return os.getpid()
+
+class TestRunLog(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, 'log.txt')
+
+    def tearDown(self):
+        stop_logging()
+        self.temp_dir.cleanup()
+
+    def read_entries(self, path=None):
+        with open(path or self.path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_writes_json_lines_on_stop(self):
+        start_logging(self.path)
+        log_message("Procesando hoja: Hoja1", file='Primer Trimestre.xls', sheet='Hoja1', stage="hojas")
+        log_message("Error al leer la hoja", logging.ERROR)
+        stop_logging()
+
+        entries = self.read_entries()
+        self.assertEqual([entry['message'] for entry in entries], ["Procesando hoja: Hoja1", "Error al leer la hoja"])
+        self.assertEqual(entries[0]['file'], 'Primer Trimestre.xls')
+        self.assertEqual(entries[0]['sheet'], 'Hoja1')
+        self.assertEqual(entries[0]['stage'], 'hojas')
+        self.assertEqual(entries[1]['level'], 'ERROR')
+        self.assertNotIn('sheet', entries[1])
+
+    def test_flushes_idle_entries_after_interval(self):
+        start_logging(self.path, flush_interval=0.05)
+        log_message("Procesando hoja: Hoja1")
+        # Sin más entradas ni detener el registro, la línea se escribe al pasar el intervalo
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual([entry['message'] for entry in self.read_entries()], ["Procesando hoja: Hoja1"])
+
+    def test_start_logging_is_idempotent(self):
+        queue = start_logging(self.path)
+        self.assertIs(start_logging(self.path), queue)
+        self.assertIs(log_queue(), queue)
+        stop_logging()
+        self.assertIsNone(log_queue())
+
+    def test_rotates_by_size(self):
+        start_logging(self.path, max_bytes=2000, backup_count=2, batch_size=5)
+        for i in range(100):
+            log_message(f"Entrada {i}")
+        stop_logging()
+
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        for path in [self.path, self.path + '.1', self.path + '.2']:
+            self.assertLessEqual(os.path.getsize(path), 2000)
+        self.assertEqual(self.read_entries()[-1]['message'], "Entrada 99")
+
+    def test_worker_processes_log_through_queue(self):
+        start_logging(self.path)
+        with ProcessPoolExecutor(max_workers=2, initializer=init_worker_logging,
+                                 initargs=(log_queue(),)) as executor:
+            pids = set(executor.map(log_from_worker, ['Hoja1', 'Hoja2', 'Hoja3']))
+        stop_logging()
+
+        entries = self.read_entries()
+        self.assertEqual(sorted(entry['sheet'] for entry in entries), ['Hoja1', 'Hoja2', 'Hoja3'])
+        self.assertEqual({entry['pid'] for entry in entries}, pids)
+
+if __name__ == '__main__':
+    unittest.main()
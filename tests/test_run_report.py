@@ -0,0 +1,100 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from run_report import (RunReport, MemoryBudget, MemoryBudgetExceeded, current_rss_bytes, peak_rss_bytes,
+                        timed_call)
+
+class TestRunReport(unittest.TestCase):
+
+    def test_summary_groups_by_stage_and_file(self):
+        report = RunReport()
+        with report.stage("extraccion", file='Primer Trimestre.xls', sheet='Hoja1') as timing:
+            timing['rows'] = 21
+        report.record("extraccion", 0.5, file='Primer Trimestre.xls', sheet='Hoja2', rows=21)
+        report.record("extraccion", 0.5, file='Segundo Trimestre.xls', sheet='Hoja1', rows=21)
+        report.record("guardado_consolidado", 0.25)
+
+        summary = report.summary()
+
+        self.assertEqual(summary['files'], 2)
+        self.assertEqual(summary['sheets'], 3)
+        self.assertEqual(summary['rows'], 63)
+        self.assertEqual(summary['stages']['extraccion']['count'], 3)
+        self.assertEqual(summary['stages']['guardado_consolidado'], {'seconds': 0.25, 'count': 1})
+        self.assertGreater(summary['rows_per_second'], 60)
+        self.assertAlmostEqual(summary['per_file']['Segundo Trimestre.xls']['extraccion'], 0.5)
+        self.assertEqual(len(summary['timings']), 4)
+
+    def test_stage_is_recorded_when_it_fails(self):
+        report = RunReport()
+        with self.assertRaises(ValueError):
+            with report.stage("apertura", file='Primer Trimestre.xls'):
+                raise ValueError("archivo dañado")
+        self.assertEqual(report.timings[0]['stage'], "apertura")
+        self.assertIn('seconds', report.timings[0])
+
+    def test_save_writes_json(self):
+        report = RunReport()
+        report.record("extraccion", 1.0, file='Primer Trimestre.xls', sheet='Hoja1', rows=21)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path, summary = report.save(temp_dir)
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+        self.assertEqual(os.path.basename(path), 'run_report.json')
+        self.assertEqual(saved['rows'], 21)
+        self.assertEqual(saved['rows_per_second'], 21)
+        self.assertEqual(saved['stages'], summary['stages'])
+
+    def test_peak_rss_bytes(self):
+        peak = peak_rss_bytes()
+        if peak is not None:
+            self.assertGreater(peak, 1024 * 1024)
+
+    def test_timed_call(self):
+        result, seconds = timed_call(sum, [1, 2, 3])
+        self.assertEqual(result, 6)
+        self.assertGreaterEqual(seconds, 0)
+
+    def test_memory_budget(self):
+        if current_rss_bytes() is None:
+            self.skipTest("No se puede medir la memoria en esta plataforma")
+        budget = MemoryBudget(None)
+        budget.reserve(1024 ** 4)
+        self.assertGreater(budget.peak_bytes, 1024 * 1024)
+
+        # Lo liberado por `relieve` se descuenta aunque el RSS no baje
+        rss = current_rss_bytes()
+        budget = MemoryBudget(rss + 1024 ** 3)
+        budget.reserve(1024 ** 2)
+        self.assertEqual(budget.exceeded_count, 0)
+        budget.reserve(2 * 1024 ** 3, lambda: 2 * 1024 ** 3)
+        self.assertEqual(budget.exceeded_count, 1)
+
+        relieved = []
+        budget = MemoryBudget(1024)
+        with self.assertRaises(MemoryBudgetExceeded):
+            budget.reserve(0, lambda: relieved.append(True))
+        self.assertEqual(relieved, [True])
+        self.assertEqual(budget.exceeded_count, 1)
+
+        report = RunReport()
+        report.memory = budget
+        self.assertEqual(report.summary()['memory_budget'], {'limit_bytes': 1024, 'peak_bytes': budget.peak_bytes,
+                                                             'exceeded': 1})
+
+    def test_memory_budget_guard_checks_before_each_item(self):
+        if current_rss_bytes() is None:
+            self.skipTest("No se puede medir la memoria en esta plataforma")
+        budget = MemoryBudget(current_rss_bytes() + 1024 ** 3)
+        items = budget.guard([1, 1024 ** 4], lambda size: size)
+        self.assertEqual(next(items), 1)
+        # El segundo elemento se rechaza antes de entregarlo
+        with self.assertRaises(MemoryBudgetExceeded):
+            next(items)
+
+if __name__ == '__main__':
+    unittest.main()
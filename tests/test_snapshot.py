@@ -0,0 +1,67 @@
+import unittest
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime, time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import SheetData, consolidation_rows
+from snapshot import snapshot_available, save_snapshot, load_snapshot, snapshot_table
+
+@unittest.skipUnless(snapshot_available(), "pyarrow no está instalado")
+class TestSnapshot(unittest.TestCase):
+
+    def build_dataset(self):
+        header = [['Encabezado', None], ['Periodo:', 2024], ['Corte:', datetime(2024, 3, 31), time(8, 30)]]
+        sheet_data = SheetData(['', 'INGRESOS', 'EGRESOS', 'OBSERVACIONES'], header)
+        sheet_data.add(['Total', 5, 1.5, 'texto'], 'Segundo Trimestre.xls')
+        sheet_data.add(['Total', 3, None, 7], 'Primer Trimestre_2.xls')
+        sheet_data.add(['Total', 2, 0.5], 'Resumen.xls')
+        other = SheetData(['', 'AUDIENCIAS'])
+        other.add(['Total', None], 'Primer Trimestre.xls')
+        return {'Hoja1': sheet_data, 'Hoja2': other, 'Vacía': SheetData(['', 'A'])}
+
+    def assert_same_dataset(self, loaded, expected):
+        self.assertEqual(list(loaded), list(expected))
+        for sheet in expected:
+            self.assertEqual(loaded[sheet], expected[sheet])
+            self.assertEqual(list(loaded[sheet].values.dtypes), list(expected[sheet].values.dtypes))
+            self.assertEqual(list(loaded[sheet].labels['periodo']), list(expected[sheet].labels['periodo']))
+            self.assertEqual(list(loaded[sheet].labels['parte']), list(expected[sheet].labels['parte']))
+
+    def test_round_trip_file(self):
+        all_sheets_data = self.build_dataset()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'Consolidado.arrow')
+            save_snapshot(all_sheets_data, path)
+            loaded = load_snapshot(path)
+        self.assert_same_dataset(loaded, all_sheets_data)
+        self.assertEqual(loaded['Hoja1'].values[3].tolist(), ['texto', 7, None])
+        # Las fechas y horas del encabezado conservan su tipo
+        self.assertEqual(loaded['Hoja1'].header_rows[2], ['Corte:', datetime(2024, 3, 31), time(8, 30)])
+        self.assertEqual(consolidation_rows(loaded['Hoja1']), consolidation_rows(all_sheets_data['Hoja1']))
+
+    def test_round_trip_bytes(self):
+        all_sheets_data = self.build_dataset()
+        buffer = io.BytesIO()
+        save_snapshot(all_sheets_data, buffer)
+        self.assert_same_dataset(load_snapshot(buffer.getvalue()), all_sheets_data)
+
+    def test_table_is_tidy(self):
+        table = snapshot_table(self.build_dataset())
+        self.assertEqual(table.column_names[:5], ['hoja', 'fila', 'columna', 'valor', 'texto'])
+        self.assertEqual(table.num_rows, 3 * 3 + 1)
+
+    def test_rejects_other_versions(self):
+        import pyarrow as pa
+        table = snapshot_table(self.build_dataset())
+        table = table.replace_schema_metadata({**table.schema.metadata, b'version': b'0'})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        with self.assertRaises(ValueError):
+            load_snapshot(sink.getvalue())
+
+if __name__ == '__main__':
+    unittest.main()
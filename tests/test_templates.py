@@ -0,0 +1,45 @@
+import unittest
+import os
+import pickle
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from templates import TemplateRegistry, template_key
+
+class TestTemplateRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.header = [['CONSEJO SUPERIOR DE LA JUDICATURA'], [None], ['Periodo:', 'Primer Trimestre']]
+        self.titles = ['', 'INGRESOS', 'EGRESOS']
+
+    def test_same_template_is_stored_once(self):
+        templates = TemplateRegistry()
+        first = templates.intern(self.header, self.titles)
+        second = templates.intern([list(row) for row in self.header], list(self.titles))
+        self.assertIs(first, second)
+        self.assertEqual(len(templates), 1)
+        self.assertEqual(first.key, template_key(self.header, self.titles))
+        self.assertEqual(templates.to_dict(), {first.key: {'titulos': self.titles, 'encabezado': self.header}})
+
+    def test_rows_are_shared_between_templates(self):
+        templates = TemplateRegistry()
+        first = templates.intern(self.header, self.titles)
+        other = templates.intern(self.header[:2] + [['Periodo:', 'Segundo Trimestre']], self.titles)
+        self.assertNotEqual(first.key, other.key)
+        self.assertIs(first.header_rows[0], other.header_rows[0])
+        self.assertIs(first.titles, other.titles)
+
+        # pickle serializa una sola vez las filas compartidas
+        shared = len(pickle.dumps([first, other]))
+        copied = len(pickle.dumps([first, other._replace(header_rows=[list(row) for row in other.header_rows])]))
+        self.assertLess(shared, copied)
+
+    def test_types_and_missing_header_are_distinguished(self):
+        templates = TemplateRegistry()
+        self.assertIsNot(templates.intern([[1]], self.titles), templates.intern([[True]], self.titles))
+        without_header = templates.intern(None, self.titles)
+        self.assertIsNone(without_header.header_rows)
+        self.assertNotEqual(without_header.key, templates.intern([], self.titles).key)
+
+if __name__ == '__main__':
+    unittest.main()
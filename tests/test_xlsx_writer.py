@@ -0,0 +1,37 @@
+import unittest
+import os
+import sys
+import tempfile
+from openpyxl import load_workbook
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from xlsx_writer import create_workbook, merge_ranges, write_sheet, CENTERED_STYLE
+
+class TestXlsxWriter(unittest.TestCase):
+
+    def test_merge_ranges(self):
+        self.assertEqual(merge_ranges(['A', 'B', 'B', 'C', None, None]), [(2, 3), (5, 6)])
+        self.assertEqual(merge_ranges(['A', 'A', 'A']), [(1, 3)])
+        self.assertEqual(merge_ranges(['A', 'B']), [])
+
+    def test_write_sheet(self):
+        workbook = create_workbook()
+        rows = [['Encabezado'], ['', 'GRUPO', 'GRUPO', 'OTRO'], ['Total', 1, 2]]
+        write_sheet(workbook, 'Hoja', rows, style=CENTERED_STYLE, style_from_row=2, merge_row=2)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'resultado.xlsx')
+            workbook.save(path)
+            ws = load_workbook(path)['Hoja']
+
+            self.assertEqual([str(r) for r in ws.merged_cells.ranges], ['B2:C2'])
+            self.assertEqual(ws['B2'].value, 'GRUPO')
+            self.assertEqual(ws['C3'].value, 2)
+            self.assertIsNone(ws['A1'].border.left.style)
+            # Las filas con estilo se completan hasta el ancho de la fila más larga
+            self.assertEqual(ws['D3'].border.left.style, 'thin')
+            self.assertTrue(ws['D3'].alignment.wrap_text)
+            self.assertEqual(ws['A3'].alignment.horizontal, 'center')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, NamedStyle, Side
+from openpyxl.worksheet.cell_range import CellRange
+
+THIN_BORDER = Border(left=Side(style='thin'),
+                     right=Side(style='thin'),
+                     top=Side(style='thin'),
+                     bottom=Side(style='thin'))
+
+# Estilos con nombre: se definen una sola vez por libro y cada celda solo los referencia
+CENTERED_STYLE = 'centrado_con_borde'
+WRAPPED_STYLE = 'ajustado_con_borde'
+
+NAMED_STYLES = [
+    NamedStyle(name=CENTERED_STYLE, border=THIN_BORDER,
+               alignment=Alignment(horizontal="center", vertical="center", wrap_text=True)),
+    NamedStyle(name=WRAPPED_STYLE, border=THIN_BORDER, alignment=Alignment(wrap_text=True)),
+]
+
+
+def create_workbook():
+    """
+    Función que crea un libro en modo de solo escritura: cada fila se envía al archivo al
+    agregarla, por lo que la memoria no crece con el número de filas y hojas.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    for style in NAMED_STYLES:
+        workbook.add_named_style(style)
+    return workbook
+
+
+def merge_ranges(values):
+    """
+    Función que calcula los rangos (columna inicial, columna final) de celdas contiguas
+    con el mismo valor en una fila. Las columnas empiezan en 1.
+    """
+    ranges = []
+    start = 1
+    for column in range(2, len(values) + 2):
+        if column > len(values) or values[column - 1] != values[start - 1]:
+            if column - 1 > start:
+                ranges.append((start, column - 1))
+            start = column
+    return ranges
+
+
+def write_sheet(workbook, title, rows, style=None, style_from_row=1, merge_row=None):
+    """
+    Función que escribe una hoja completa en un libro de solo escritura.
+
+    Las celdas de las filas desde `style_from_row` (empezando en 1) reciben el estilo con
+    nombre `style` y se completan hasta el ancho de la fila más larga. Si se indica
+    `merge_row`, las celdas contiguas con el mismo valor de esa fila se combinan; los
+    rangos se calculan antes de escribir. El estilo debe estar registrado en el libro
+    (ver `create_workbook`); si no lo está, las filas se escriben sin estilo.
+    """
+    if style is not None and style not in workbook.named_styles:
+        style = None
+    width = max((len(row) for row in rows), default=0)
+    merges = []
+    if merge_row is not None and len(rows) >= merge_row:
+        merge_values = list(rows[merge_row - 1]) + [None] * (width - len(rows[merge_row - 1]))
+        merges = merge_ranges(merge_values)
+
+    ws = workbook.create_sheet(title=title)
+    for row_index, row in enumerate(rows, start=1):
+        if style is None or row_index < style_from_row:
+            ws.append(row)
+            continue
+
+        values = list(row) + [None] * (width - len(row))
+        if row_index == merge_row:
+            # Como al combinar en openpyxl, solo la primera celda de cada rango conserva su valor
+            for start, end in merges:
+                for column in range(start + 1, end + 1):
+                    values[column - 1] = None
+
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.style = style
+            cells.append(cell)
+        ws.append(cells)
+
+    for start, end in merges:
+        ws.merged_cells.add(CellRange(min_col=start, min_row=merge_row, max_col=end, max_row=merge_row))
+    return ws